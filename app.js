@@ -4,51 +4,153 @@ const path = require('path');
 const http = require('http');
 const { Server } = require('socket.io');
 const fs = require('fs').promises;
+const readline = require('readline');
 
 const app = express();
 const server = http.createServer(app);
 const io = new Server(server);
 const port = 3000;
 
-// Queue for managing crawler requests
-class RequestQueue {
+// Long-lived Python crawler service (crawler_service.py). Jobs are sent to
+// its stdin and progress events come back on stdout, one JSON object per line.
+class CrawlerService {
     constructor() {
-        this.queue = [];
-        this.isProcessing = false;
+        this.process = null;
+        this.jobs = new Map();
+        this.nextJobId = 1;
     }
 
-    async add(socket, urls, rateLimit, proxyFile) {
-        this.queue.push({ socket, urls, rateLimit, proxyFile });
-        if (!this.isProcessing) {
-            await this.processNext();
-        }
+    start() {
+        this.process = spawn('python', ['crawler_service.py']);
+
+        readline.createInterface({ input: this.process.stdout }).on('line', (line) => {
+            let event;
+            try {
+                event = JSON.parse(line);
+            } catch (error) {
+                console.error('Error parsing crawler service output:', line);
+                return;
+            }
+            this.handleEvent(event);
+        });
+
+        readline.createInterface({ input: this.process.stderr }).on('line', (line) => {
+            console.error(`Python: ${line}`);
+        });
+
+        this.process.on('close', (code) => {
+            console.error(`Crawler service exited with code ${code}, restarting`);
+            for (const job of this.jobs.values()) {
+                if (job.socket) {
+                    job.socket.emit('crawlError', {
+                        message: 'Crawler service stopped unexpectedly',
+                        type: 'process'
+                    });
+                }
+                job.reject(new Error('Crawler service stopped'));
+            }
+            this.jobs.clear();
+            this.process = null;
+            setTimeout(() => this.start(), 1000);
+        });
     }
 
-    async processNext() {
-        if (this.queue.length === 0) {
-            this.isProcessing = false;
-            return;
+    send(message) {
+        if (!this.process) {
+            throw new Error('Crawler service is not running');
         }
+        this.process.stdin.write(JSON.stringify(message) + '\n');
+    }
 
-        this.isProcessing = true;
-        const { socket, urls, rateLimit, proxyFile } = this.queue[0];
+    crawl(socket, urls, rateLimit, proxyFile) {
+        const id = `${socket.id}-${this.nextJobId++}`;
+        return new Promise((resolve, reject) => {
+            this.jobs.set(id, { socket, resolve, reject });
+            try {
+                this.send({ type: 'crawl', id, urls, rate_limit: rateLimit, proxy_file: proxyFile });
+            } catch (error) {
+                this.jobs.delete(id);
+                reject(error);
+            }
+        });
+    }
 
-        try {
-            await processUrls(socket, urls, rateLimit, proxyFile);
-        } catch (error) {
-            console.error('Error processing URLs:', error);
-            socket.emit('crawlError', {
-                message: 'Internal server error',
-                type: 'error'
-            });
+    // Write the crawled lyrics to `output` as a dataset (see exporter.py)
+    exportDataset(output, format = 'csv') {
+        const id = `export-${this.nextJobId++}`;
+        return new Promise((resolve, reject) => {
+            this.jobs.set(id, { socket: null, resolve, reject });
+            try {
+                this.send({ type: 'export', id, format, output });
+            } catch (error) {
+                this.jobs.delete(id);
+                reject(error);
+            }
+        });
+    }
+
+    cancelSocketJobs(socket) {
+        for (const [id, job] of this.jobs) {
+            if (job.socket === socket) {
+                this.send({ type: 'cancel', id });
+            }
         }
+    }
 
-        this.queue.shift();
-        await this.processNext();
+    handleEvent(event) {
+        const job = this.jobs.get(event.job);
+        if (!job) {
+            return;
+        }
+        const { socket } = job;
+        if (!socket) {
+            // Export requests only get a final event
+            this.jobs.delete(event.job);
+            if (event.status === 'exported') {
+                job.resolve(event.data);
+            } else {
+                job.reject(new Error(event.message));
+            }
+            return;
+        }
+        switch (event.status) {
+            case 'warning':
+            case 'error':
+                socket.emit('crawlError', { message: event.message, type: event.status });
+                if (event.message.includes('Missing metadata')) {
+                    socket.emit('statusUpdate', { status: 'metadata_warning', message: event.message });
+                }
+                break;
+            case 'rejected':
+            case 'failed':
+                this.jobs.delete(event.job);
+                socket.emit('crawlError', { message: event.message, type: 'process' });
+                job.reject(new Error(event.message));
+                break;
+            case 'complete':
+            case 'cancelled':
+                this.jobs.delete(event.job);
+                socket.emit('statusUpdate', { status: 'update', data: event.data });
+                socket.emit('crawlComplete', {
+                    message: event.status === 'complete' ? 'Crawling completed successfully' : 'Crawling cancelled',
+                    type: 'success'
+                });
+                job.resolve();
+                break;
+            default:
+                if (event.error_details) {
+                    socket.emit('crawlError', { message: event.error_details, type: 'crawl' });
+                }
+                socket.emit('statusUpdate', event);
+                if (event.status === 'update') {
+                    saveProgress(socket.id, event.data);
+                }
+        }
     }
 }
 
-const requestQueue = new RequestQueue();
+const crawlerService = new CrawlerService();
+crawlerService.start();
 
 // Progress persistence
 const PROGRESS_FILE = 'crawler_progress.json';
@@ -96,74 +198,13 @@ function validateUrls(urls) {
     return { validUrls, invalidUrls };
 }
 
-// Process URLs with Python script
+// Run a crawl job on the crawler service
 async function processUrls(socket, urls, rateLimit = 5.0, proxyFile) {
-    let args = ['crawl_lyrics.py', '--rate-limit', rateLimit.toString()];
-    if (proxyFile) {
-        args.push('--proxy-file', proxyFile);
+    try {
+        await crawlerService.crawl(socket, urls, rateLimit, proxyFile);
+    } catch (error) {
+        console.error('Error processing URLs:', error);
     }
-    urls.forEach(url => args.push(url));
-    const pythonProcess = spawn('python', args);
-
-    pythonProcess.stdout.on('data', async (data) => {
-        try {
-            const statusUpdate = JSON.parse(data.toString());
-            if (statusUpdate.error_details) {
-                socket.emit('crawlError', {
-                    message: statusUpdate.error_details,
-                    type: 'crawl'
-                });
-            }
-            
-            // Save progress
-            if (statusUpdate.status === 'update') {
-                await saveProgress(socket.id, statusUpdate.data);
-            }
-            
-            socket.emit('statusUpdate', statusUpdate);
-        } catch (error) {
-            console.error('Error parsing Python output:', error);
-        }
-    });
-
-    pythonProcess.stderr.on('data', (data) => {
-        const errorMsg = data.toString().trim();
-        console.error(`Python Error: ${errorMsg}`);
-        
-        // Parse error message and handle metadata warnings
-        const errorType = errorMsg.startsWith('WARNING:') ? 'warning' : 'error';
-        const message = errorMsg.replace(/^(ERROR|WARNING): /, '');
-        
-        socket.emit('crawlError', {
-            message,
-            type: errorType
-        });
-
-        if (message.includes('Missing metadata')) {
-            socket.emit('statusUpdate', {
-                status: 'metadata_warning',
-                message: message
-            });
-        }
-    });
-
-    return new Promise((resolve, reject) => {
-        pythonProcess.on('close', (code) => {
-            if (code !== 0) {
-                socket.emit('crawlError', {
-                    message: 'Crawler script failed',
-                    type: 'process'
-                });
-                reject(new Error('Crawler process failed'));
-            } else {
-                socket.emit('crawlComplete', {
-                    message: 'Crawling completed successfully',
-                    type: 'success'
-                });
-                resolve();
-            }
-        });
-    });
 }
 
 // Serve static files from 'public' directory
@@ -175,9 +216,14 @@ app.get('/', (req, res) => {
     res.sendFile(path.join(__dirname, 'public', 'index.html'));
 });
 
-// Download route for CSV file
-app.get('/download', (req, res) => {
+// Download route for CSV file, exported from the latest crawl results
+app.get('/download', async (req, res) => {
     const file = 'song_lyrics.csv';
+    try {
+        await crawlerService.exportDataset(file);
+    } catch (error) {
+        console.error('Export failed:', error.message);
+    }
     res.download(file, (err) => {
         if (err) {
             res.status(404).send('File not found');
@@ -229,10 +275,8 @@ io.on('connection', async (socket) => {
             return;
         }
 
-        // Add request to queue
-        requestQueue.add(socket, validUrls, rateLimit, proxyFile).catch(error => {
-            console.error('Queue processing error:', error);
-        });
+        // Jobs run side by side; the crawler service limits how many crawl at once
+        processUrls(socket, validUrls, rateLimit, proxyFile);
 
         // Send initial status
         socket.emit('statusUpdate', { 
@@ -248,6 +292,7 @@ io.on('connection', async (socket) => {
 
     socket.on('disconnect', () => {
         console.log('Client disconnected:', socket.id);
+        crawlerService.cancelSocketJobs(socket);
     });
 });
 
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from http_request import FetchResult
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 16
+
+class AsyncFetcher:
+    """Concurrent front end for HTTPRequest.get.
+
+    Requests run on a thread pool so the existing proxy rotation and retry
+    logic in HTTPRequest is reused unchanged. A global semaphore bounds the
+    total number of requests in flight and a per-domain semaphore keeps the
+    traffic to any single site polite. When a DomainRateLimiter is given,
+    each request also waits for its domain's token bucket.
+    """
+
+    def __init__(self, http_request, config, rate_limiter=None):
+        self.http_request = http_request
+        self.rate_limiter = rate_limiter
+        self.config = config
+        self.max_concurrency = int(config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY))
+        self.per_domain_concurrency = int(config.get('per_domain_concurrency', 1))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        self._global_semaphore = None
+        self._domain_semaphores = {}
+        self._loop = None
+        self.in_flight = 0
+
+    def _bind_loop(self):
+        # Semaphores belong to the loop they were first used on, and main.py
+        # runs each batch under a fresh asyncio.run().
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._global_semaphore = None
+            self._domain_semaphores = {}
+
+    def _get_global_semaphore(self):
+        if self._global_semaphore is None:
+            self._global_semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._global_semaphore
+
+    def _get_domain_semaphore(self, domain):
+        semaphore = self._domain_semaphores.get(domain)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.per_domain_concurrency)
+            self._domain_semaphores[domain] = semaphore
+        return semaphore
+
+    async def _call(self, func, url, render_js, default, queue=None):
+        self._bind_loop()
+        domain = urlparse(url).netloc
+        # Take the domain slot first so a request queued behind a busy site
+        # never holds one of the global slots.
+        async with self._get_domain_semaphore(domain):
+            if self.rate_limiter:
+                await self.rate_limiter.wait(domain)
+            async with self._get_global_semaphore():
+                self.in_flight += 1
+                try:
+                    loop = asyncio.get_running_loop()
+                    result = await loop.run_in_executor(self._executor, func, url, render_js)
+                except Exception as e:
+                    logger.error(f"Async request failed for {url}: {e}")
+                    result = default
+                finally:
+                    self.in_flight -= 1
+                if queue is not None:
+                    # Still holding the global slot: a full queue pauses fetching
+                    await queue.put((url, result))
+                return result
+
+    async def get(self, url, render_js=False):
+        """Fetch a single URL, waiting for a free global and per-domain slot."""
+        return await self._call(self.http_request.get, url, render_js, None)
+
+    async def fetch(self, url, render_js=False):
+        """Like get, but return HTTPRequest.fetch's FetchResult."""
+        return await self._call(self.http_request.fetch, url, render_js, FetchResult(None, False))
+
+    async def fetch_into(self, url, queue, render_js=False):
+        """Fetch a URL and put (url, FetchResult) on an asyncio queue.
+
+        The global slot is held until the queue accepts the page, so a slow
+        consumer limits how many fetched pages can pile up in memory.
+        """
+        return await self._call(self.http_request.fetch, url, render_js, FetchResult(None, False), queue)
+
+    async def _get_pair(self, url, render_js):
+        return url, await self.get(url, render_js=render_js)
+
+    async def _fetch_pair(self, url, render_js):
+        return url, await self.fetch(url, render_js=render_js)
+
+    async def _as_completed(self, coroutines):
+        tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def fetch_all(self, urls, render_js=False):
+        """Fetch all URLs concurrently, yielding (url, html) as each completes."""
+        async for pair in self._as_completed(self._get_pair(url, render_js) for url in urls):
+            yield pair
+
+    async def fetch_results(self, urls, render_js=False):
+        """Fetch all URLs concurrently, yielding (url, FetchResult) as each completes."""
+        async for pair in self._as_completed(self._fetch_pair(url, render_js) for url in urls):
+            yield pair
+
+    def close(self):
+        self._executor.shutdown(wait=False)
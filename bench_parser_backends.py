@@ -0,0 +1,82 @@
+"""Benchmark the HTML parser backends and check that they agree.
+
+Usage: python bench_parser_backends.py [--iterations N] [--padding N] [--prefilter on|off|auto]
+
+Every installed backend extracts title, artist and lyrics from the test
+fixtures (plus copies padded with ads and inline scripts to the size of a
+real lyrics page). Results must match the html.parser backend exactly;
+the script prints timings as JSON and exits non-zero on any mismatch.
+"""
+import argparse
+import json
+import sys
+import time
+
+from html_parser import HTMLParser
+from parser_backends import available_backends
+from parser_fixtures import FIXTURES, SELECTORS
+
+AD_BLOCK = """
+<div class="ad-slot"><script>window.ads = window.ads || []; ads.push({slot: %d});</script>
+<iframe src="/ads/%d"></iframe><ul class="related">%s</ul></div>
+"""
+
+STATE_SCRIPT = '<script>window.__PRELOADED_STATE__ = JSON.parse(\'[%s]\');</script>'
+
+def pad_page(html, padding):
+    """Add `padding` ad blocks and a preloaded-state script of similar size."""
+    related = ''.join(f'<li><a href="/song/{i}">Related song {i}</a></li>' for i in range(20))
+    ads = ''.join(AD_BLOCK % (i, i, related) for i in range(padding))
+    state = STATE_SCRIPT % ','.join('{"id": %d, "type": "referent"}' % i for i in range(padding * 40))
+    return html.replace('</head>', state + '</head>').replace('</body>', ads + '</body>')
+
+def run_benchmark(iterations=50, padding=200, prefilter='auto'):
+    pages = FIXTURES + [(pad_page(html, padding), url) for html, url in FIXTURES]
+    # The reference never prefilters, so the check also covers the prefilter
+    reference = HTMLParser({'SELECTORS': SELECTORS, 'parser_backend': 'html.parser', 'prefilter': False})
+    expected = [reference.extract(html, url) for html, url in pages]
+
+    results = {
+        'iterations': iterations,
+        'pages': len(pages),
+        'bytes': sum(len(html) for html, _ in pages),
+        'prefilter': prefilter,
+        'backends': {}
+    }
+    for name in available_backends():
+        parser = HTMLParser({'SELECTORS': SELECTORS, 'parser_backend': name, 'prefilter': prefilter})
+        mismatches = [url for (html, url), want in zip(pages, expected)
+                      if parser.extract(html, url) != want]
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for html, url in pages:
+                parser.extract(html, url)
+        elapsed = time.perf_counter() - start
+        results['backends'][name] = {
+            'seconds': round(elapsed, 4),
+            'pages_per_second': round(iterations * len(pages) / elapsed, 1),
+            'matches_html_parser': not mismatches,
+            'mismatches': mismatches
+        }
+
+    baseline = results['backends']['html.parser']['seconds']
+    for stats in results['backends'].values():
+        stats['speedup'] = round(baseline / stats['seconds'], 2)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HTML parser backends.')
+    parser.add_argument('--iterations', type=int, default=50, help='Passes over the fixture pages')
+    parser.add_argument('--padding', type=int, default=200, help='Ad blocks added to the padded pages')
+    parser.add_argument('--prefilter', choices=['on', 'off', 'auto'], default='auto',
+                        help='Strip scripts, styles and comments before parsing')
+    args = parser.parse_args()
+
+    prefilter = {'on': True, 'off': False, 'auto': 'auto'}[args.prefilter]
+    results = run_benchmark(args.iterations, args.padding, prefilter=prefilter)
+    print(json.dumps(results, indent=2))
+    if not all(stats['matches_html_parser'] for stats in results['backends'].values()):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
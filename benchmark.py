@@ -0,0 +1,379 @@
+"""Offline crawler benchmarks against a local fixture site.
+
+Usage: python benchmark.py [--scenarios parser,save_data,pipeline,lyrics_crawler,startup]
+                           [--pages N] [--page-kb N] [--latency SECONDS] [--jitter FRACTION]
+                           [--concurrency N] [--parse-workers N] [--iterations N]
+                           [--records N] [--saves N] [--output FILE] [--compare FILE]
+
+Two FixtureSite servers, one with genius-like pages and one with the
+default layout, serve `--pages` pages each. Every scenario runs in a fresh
+process so its memory high-water mark is its own:
+
+- `pipeline`: main.py's fetch/parse/persist pipeline over both sites,
+- `lyrics_crawler`: LyricsCrawler.save_to_store over both sites,
+- `parser`: HTMLParser.extract alone on the same pages, no network,
+- `save_data`: Persistence.save_data rewriting `--records` records,
+- `startup`: short command-line runs, `main.py --once --check-updates` on
+  an up-to-date page, each in a new interpreter; `imports_ms` adds the
+  time a new interpreter takes to import each entry point module.
+
+Each result has the same keys: `count` items of `unit` processed in
+`seconds`, `per_second`, per-item `latency_ms` percentiles (page fetch
+for `pipeline`, whole page for `lyrics_crawler`, extract for `parser`,
+one save for `save_data`, one run for `startup`) and `max_rss_mb`. The results are printed as
+JSON; with `--compare` every scenario also gets the ratio of its
+`per_second` and median latency to those in an earlier results file.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from fixture_site import FixtureSite, build_page
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SCENARIOS = ['pipeline', 'lyrics_crawler', 'parser', 'save_data', 'startup']
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Entry points whose import time the startup scenario reports
+ENTRY_POINTS = ['main', 'crawl_lyrics', 'crawler_service']
+
+# Lets the benchmark run without any rate limiting getting in the way
+UNTHROTTLED = {'default': {'delay': 0.0001, 'burst': 1000}}
+
+def percentiles(samples):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {'p50': pick(0.5), 'p95': pick(0.95), 'max': round(ordered[-1] * 1000, 3)}
+
+def max_rss_mb(who=None):
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who is None else who)
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(usage.ru_maxrss / scale, 1)
+
+def result(count, unit, seconds, latencies=None, **extra):
+    return {
+        'count': count,
+        'unit': unit,
+        'seconds': round(seconds, 4),
+        'per_second': round(count / seconds, 2) if seconds else None,
+        'latency_ms': percentiles(latencies or []),
+        **extra
+    }
+
+def crawl_config(settings, work_dir):
+    """config.json settings for crawling the fixture sites from `work_dir`."""
+    config = dict(settings['config'])
+    selectors = dict(config.get('SELECTORS') or {})
+    if 'genius.com' in selectors:
+        # The genius fixture is served from a local address
+        selectors[settings['sites']['genius']] = selectors['genius.com']
+    config.update({
+        'SELECTORS': selectors,
+        'RATE_LIMITS': UNTHROTTLED,
+        'rate_limit': 0.0001,
+        'proxies': [],
+        'http_cache': False,
+        'max_concurrency': settings['concurrency'],
+        'per_domain_concurrency': settings['concurrency'],
+        'parse_workers': settings['parse_workers'],
+        'frontier_db': os.path.join(work_dir, 'frontier.db'),
+        'error_db': os.path.join(work_dir, 'errors.db'),
+        'temp_dir': os.path.join(work_dir, 'temp'),
+        'output_file': os.path.join(work_dir, 'song_lyrics.jsonl')
+    })
+    config.pop('proxy_file', None)
+    return config
+
+def bench_pipeline(settings, work_dir):
+    from error_logger import ErrorLogger
+    from frontier import Frontier
+    from main import build_crawler, close_crawler
+    from persistence import Persistence
+    from record_index import RecordIndex
+
+    config = crawl_config(settings, work_dir)
+    frontier = Frontier(config['frontier_db'])
+    frontier.add_urls(settings['urls'], seed=True)
+    store = Persistence(config).open_store(config['output_file'])
+    index = RecordIndex(store)
+    error_logger = ErrorLogger(config)
+    crawler = build_crawler(config, frontier, index, error_logger)
+
+    latencies = []
+    fetch = crawler.strategy.fetch
+
+    def timed_fetch(url, render_js=False):
+        start = time.perf_counter()
+        try:
+            return fetch(url, render_js)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    crawler.strategy.fetch = timed_fetch
+    batch_size = int(config.get('batch_size', crawler.fetcher.max_concurrency * 4))
+    start = time.perf_counter()
+    while True:
+        batch = frontier.dequeue(batch_size)
+        if not batch:
+            break
+        asyncio.run(crawler.pipeline.run(batch))
+    elapsed = time.perf_counter() - start
+    saved = len(index)
+    close_crawler(crawler)
+    frontier.close()
+    index.close()
+    store.close()
+    error_logger.close()
+    return result(len(settings['urls']), 'pages', elapsed, latencies, saved=saved,
+                  children_max_rss_mb=max_rss_mb(resource.RUSAGE_CHILDREN) if resource else None)
+
+def bench_lyrics_crawler(settings, work_dir):
+    from crawl_lyrics import LyricsCrawler
+    from persistence import JSONLStore
+    from error_logger import get_error_logger
+
+    config = crawl_config(settings, work_dir)
+    error_logger = get_error_logger(config)
+    output_file = os.path.join(work_dir, 'song_lyrics.jsonl')
+    crawler = LyricsCrawler(settings['urls'], config)
+    genius = settings['sites']['genius']
+    crawler.SELECTORS = {**LyricsCrawler.SELECTORS, genius: LyricsCrawler.SELECTORS['genius.com']}
+
+    latencies = []
+    extract = crawler.extract_lyrics
+
+    def timed_extract(url, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return extract(url, *args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    crawler.extract_lyrics = timed_extract
+    # LyricsCrawler reports progress to the web interface on stdout and stderr
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), \
+            contextlib.redirect_stderr(devnull):
+        start = time.perf_counter()
+        crawler.save_to_store(output_file)
+        elapsed = time.perf_counter() - start
+    saved = sum(1 for _ in JSONLStore(output_file).iter_records())
+    error_logger.close()
+    return result(len(settings['urls']), 'pages', elapsed, latencies, saved=saved)
+
+def bench_parser(settings, work_dir):
+    from html_parser import HTMLParser
+
+    parser = HTMLParser(settings['config'])
+    pages = [(build_page(layout, n, settings['page_kb']), f"http://{host}/songs/{n}")
+             for layout, host in (('genius', 'genius.com'), ('default', 'example.com'))
+             for n in range(settings['pages'])]
+    latencies = []
+    found = 0
+    start = time.perf_counter()
+    for _ in range(settings['iterations']):
+        for html, url in pages:
+            page_start = time.perf_counter()
+            fields = parser.extract(html, url)
+            latencies.append(time.perf_counter() - page_start)
+            found += bool(fields[2])
+    elapsed = time.perf_counter() - start
+    return result(len(latencies), 'pages', elapsed, latencies,
+                  lyrics_found=found, backend=parser.backend.name)
+
+def bench_save_data(settings, work_dir):
+    from data_formatter import DataFormatter
+    from fixture_site import song
+    from persistence import Persistence
+
+    formatter = DataFormatter()
+    records = []
+    for n in range(settings['records']):
+        title, artist, lines = song(n)
+        records.append(formatter.format_data(title, artist, '\n'.join(lines), f"http://example.com/songs/{n}"))
+    persistence = Persistence({'temp_dir': os.path.join(work_dir, 'temp')})
+    output_file = os.path.join(work_dir, 'song_lyrics.json')
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(settings['saves']):
+        save_start = time.perf_counter()
+        persistence.save_data(records, output_file)
+        latencies.append(time.perf_counter() - save_start)
+    elapsed = time.perf_counter() - start
+    return result(len(records) * settings['saves'], 'records', elapsed, latencies,
+                  saves=settings['saves'], file_bytes=os.path.getsize(output_file))
+
+def import_time_ms(module):
+    """Milliseconds a new interpreter spends importing `module`, from -X importtime."""
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             capture_output=True, text=True, cwd=HERE, check=True)
+    for line in reversed(process.stderr.splitlines()):
+        # "import time: self [us] | cumulative | imported package"
+        parts = [part.strip() for part in line.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            return round(int(parts[1]) / 1000, 1)
+    return None
+
+def bench_startup(settings, work_dir):
+    config = crawl_config(settings, work_dir)
+    config_file = os.path.join(work_dir, 'config.json')
+    with open(config_file, 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+    url = settings['urls'][0]
+    command = [sys.executable, os.path.join(HERE, 'main.py'), '--config', config_file, '--once']
+    # Crawl the page once so the timed runs find nothing stale
+    subprocess.run(command + [url], cwd=work_dir, capture_output=True, check=True)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(settings['iterations']):
+        run_start = time.perf_counter()
+        subprocess.run(command + ['--check-updates', url], cwd=work_dir, capture_output=True, check=True)
+        latencies.append(time.perf_counter() - run_start)
+    elapsed = time.perf_counter() - start
+    imports = {module: sorted(import_time_ms(module) for _ in range(settings['iterations']))
+               for module in ENTRY_POINTS}
+    return result(len(latencies), 'runs', elapsed, latencies,
+                  imports_ms={module: times[len(times) // 2] for module, times in imports.items()})
+
+def run_scenario(name, settings):
+    """Run one scenario in the current process, in a scratch directory."""
+    # Before main.py is imported, so its logging setup does not apply
+    logging.basicConfig(level=settings['log_level'],
+                        format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    work_dir = tempfile.mkdtemp(prefix=f'bench-{name}-')
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        stats = globals()[f'bench_{name}'](settings, work_dir)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work_dir, ignore_errors=True)
+    stats['max_rss_mb'] = max_rss_mb()
+    return stats
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=HERE).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'commit': commit
+    }
+
+def compare(results, baseline):
+    """Ratio of throughput (higher is better) and median latency (lower is better) to `baseline`."""
+    comparison = {}
+    for name, stats in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before:
+            continue
+        entry = {}
+        if stats.get('per_second') and before.get('per_second'):
+            entry['throughput_ratio'] = round(stats['per_second'] / before['per_second'], 3)
+        latency, before_latency = stats.get('latency_ms'), before.get('latency_ms')
+        if latency and before_latency and before_latency['p50']:
+            entry['latency_p50_ratio'] = round(latency['p50'] / before_latency['p50'], 3)
+        comparison[name] = entry
+    return comparison
+
+def run_benchmark(scenarios, settings):
+    sites = [FixtureSite(layout, settings['pages'], settings['page_kb'], settings['latency'],
+                         settings['jitter']).start() for layout in ('genius', 'default')]
+    try:
+        settings = {
+            **settings,
+            'sites': {site.layout: site.netloc for site in sites},
+            'urls': [url for pair in zip(*(site.urls() for site in sites)) for url in pair]
+        }
+        results = {'environment': environment(),
+                   'settings': {key: value for key, value in settings.items()
+                                if key not in ('config', 'urls', 'sites', 'log_level')},
+                   'scenarios': {}}
+        for name in scenarios:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+                results['scenarios'][name] = executor.submit(run_scenario, name, settings).result()
+    finally:
+        for site in sites:
+            site.stop()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the crawler against a local fixture site.')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated scenarios to run ({', '.join(SCENARIOS)})")
+    parser.add_argument('--config', default='config.json', help='Configuration whose selectors are used')
+    parser.add_argument('--pages', type=int, default=100, help='Pages per fixture site')
+    parser.add_argument('--page-kb', type=int, default=50, help='Approximate size of each page')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds the fixture site waits per response')
+    parser.add_argument('--jitter', type=float, default=0.5, help='Random latency variation, as a fraction')
+    parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight in the pipeline')
+    parser.add_argument('--parse-workers', type=int, default=os.cpu_count() or 1,
+                        help='Parse processes in the pipeline (0 parses in process)')
+    parser.add_argument('--iterations', type=int, default=5,
+                        help='Passes over the pages in the parser scenario, runs in the startup scenario')
+    parser.add_argument('--records', type=int, default=1000, help='Records written by save_data')
+    parser.add_argument('--saves', type=int, default=20, help='Calls to save_data')
+    parser.add_argument('--output', help='Also write the results to this file')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    parser.add_argument('--log-level', default='WARNING', help='Log level inside the scenarios')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    from config_manager import ConfigManager
+    settings = {
+        'config': ConfigManager(args.config).config,
+        'pages': args.pages,
+        'page_kb': args.page_kb,
+        'latency': args.latency,
+        'jitter': args.jitter,
+        'concurrency': args.concurrency,
+        'parse_workers': args.parse_workers,
+        'iterations': args.iterations,
+        'records': args.records,
+        'saves': args.saves,
+        'log_level': args.log_level.upper()
+    }
+    results = run_benchmark(scenarios, settings)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            results['comparison'] = compare(results, json.load(f))
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+
+if __name__ == '__main__':
+    main()
@@ -22,7 +22,8 @@ class ConfigManager:
     def get(self, key, default=None):
         return self.config.get(key, default)
 
-    def load_proxies_from_file(self, proxy_file_path):
+    @staticmethod
+    def load_proxies_from_file(proxy_file_path):
         """Load proxies from a text file, one proxy per line."""
         proxies = []
         try:
@@ -0,0 +1,125 @@
+import logging
+import threading
+
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from requests.utils import prepend_scheme_if_needed, select_proxy
+
+logger = logging.getLogger(__name__)
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter with per-host and per-proxy connection pool sizes and pool stats.
+
+    The stock adapter keeps at most 10 connections per host, so with more
+    concurrent fetches than that connections are opened and thrown away on
+    every request, losing keep-alive and TLS session reuse. Here the pool
+    for each host holds `POOL_SIZES[host]` connections (falling back to
+    `POOL_SIZES["default"]`, then `max_concurrency`), and pools reached
+    through a proxy hold `proxy_pool_size`.
+
+    Every pool the adapter hands out is remembered so `stats` can report,
+    per host, how many requests reused a kept-alive connection and how many
+    opened a new one (for HTTPS, each new connection is a TLS handshake).
+    When urllib3 evicts a pool (more than `pool_connections` hosts), its
+    counts are added to a running total and the pool is let go.
+    """
+
+    def __init__(self, config):
+        self.max_concurrency = int(config.get('max_concurrency', 16))
+        self.pool_sizes = dict(config.get('POOL_SIZES', {}))
+        self.pool_sizes.setdefault('default', self.max_concurrency)
+        self.proxy_pool_size = int(config.get('proxy_pool_size', self.max_concurrency))
+        self._local = threading.local()
+        self._pools = {}
+        self._evicted = {}
+        self._pools_lock = threading.Lock()
+        super().__init__(pool_connections=int(config.get('pool_connections', 100)),
+                         pool_maxsize=int(self.pool_sizes['default']),
+                         pool_block=bool(config.get('pool_block', False)))
+
+    def pool_size(self, host, proxy=None):
+        if proxy:
+            return self.proxy_pool_size
+        return int(self.pool_sizes.get(host, self.pool_sizes['default']))
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        pool_kwargs['maxsize'] = self.pool_size(host_params['host'], getattr(self._local, 'proxy', None))
+        return host_params, pool_kwargs
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self._watch_evictions(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        new = proxy not in self.proxy_manager
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        if new:
+            self._watch_evictions(manager)
+        return manager
+
+    def _watch_evictions(self, manager):
+        dispose = manager.pools.dispose_func
+
+        def evicted(pool):
+            self._forget(pool)
+            if dispose is not None:
+                dispose(pool)
+
+        manager.pools.dispose_func = evicted
+
+    def get_connection(self, url, proxies=None):
+        # Used by requests before 2.32.2, which has no get_connection_with_tls_context
+        proxy = select_proxy(url, proxies)
+        if proxy:
+            manager = self.proxy_manager_for(prepend_scheme_if_needed(proxy, 'http'))
+        else:
+            manager = self.poolmanager
+        pool = manager.connection_from_url(url, pool_kwargs={'maxsize': self.pool_size(urlparse(url).hostname,
+                                                                                         proxy)})
+        self._register(pool, proxy)
+        return pool
+
+    def get_connection_with_tls_context(self, request, verify, proxies=None, cert=None):
+        proxy = select_proxy(request.url, proxies)
+        self._local.proxy = proxy
+        try:
+            pool = super().get_connection_with_tls_context(request, verify, proxies, cert)
+        finally:
+            self._local.proxy = None
+        self._register(pool, proxy)
+        return pool
+
+    def _register(self, pool, proxy):
+        key = id(pool)
+        if key not in self._pools:
+            with self._pools_lock:
+                self._pools.setdefault(key, (pool, proxy))
+
+    def _forget(self, pool):
+        with self._pools_lock:
+            entry = self._pools.pop(id(pool), None)
+            if entry is not None:
+                _add_counts(self._evicted, *entry)
+
+    def stats(self):
+        """Return {host: {requests, new_connections, reused_connections, tls_handshakes}}."""
+        with self._pools_lock:
+            pools = list(self._pools.values())
+            result = {label: dict(entry) for label, entry in self._evicted.items()}
+        for pool, proxy in pools:
+            _add_counts(result, pool, proxy)
+        return result
+
+def _add_counts(result, pool, proxy):
+    label = pool.host if not proxy else f"{pool.host} via {proxy}"
+    entry = result.setdefault(label, {'requests': 0, 'new_connections': 0,
+                                      'reused_connections': 0, 'tls_handshakes': 0,
+                                      'maxsize': 0})
+    entry['requests'] += pool.num_requests
+    entry['new_connections'] += pool.num_connections
+    entry['reused_connections'] += max(0, pool.num_requests - pool.num_connections)
+    if pool.scheme == 'https':
+        entry['tls_handshakes'] += pool.num_connections
+    entry['maxsize'] = max(entry['maxsize'], pool.pool.maxsize if pool.pool else 0)
@@ -0,0 +1,333 @@
+import json
+import logging
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from dedup import open_dedup
+from error_logger import ErrorLogger
+from frontier import Frontier, IN_PROGRESS
+from link_discovery import open_discovery
+from persistence import Persistence
+from rate_limiter import DomainRateLimiter
+from recrawl_scheduler import open_scheduler
+from record_index import RecordIndex
+
+logger = logging.getLogger(__name__)
+
+class Lease:
+    __slots__ = ('lease_id', 'worker', 'domain', 'urls', 'expires_at')
+
+    def __init__(self, lease_id, worker, domain, urls, expires_at):
+        self.lease_id = lease_id
+        self.worker = worker
+        self.domain = domain
+        self.urls = urls
+        self.expires_at = expires_at
+
+    def to_dict(self):
+        return {'lease_id': self.lease_id, 'worker': self.worker, 'domain': self.domain,
+                'urls': self.urls, 'expires_at': self.expires_at}
+
+class LeaseManager:
+    """Hands out frontier URLs to crawl workers in leases of a single domain.
+
+    A domain is leased to at most one worker at a time, so each site is only
+    ever crawled by one node and that node's rate limiter keeps it polite.
+    After a lease ends the domain is held back for its `RATE_LIMITS` delay
+    before another worker may lease it, so a handover never produces two
+    requests in quick succession either.
+
+    Leases expire `lease_ttl` seconds after they were granted or last
+    renewed by a heartbeat; the URLs of an expired lease go back to the
+    frontier and results reported for it later are ignored. Completed
+    results are written to the shared store and index, and checked for
+    near-duplicates when a `dedup` index is given, and errors reported by
+    workers go to the shared error log. With a `scheduler`, crawled URLs
+    are revisited when their RecrawlScheduler visit time comes, and with
+    `discovery`, the links workers found on their pages are queued.
+    """
+
+    # Seconds between checks for crawled URLs that are due for a revisit
+    requeue_interval = 60
+
+    def __init__(self, frontier, index, config, error_logger=None, rate_limiter=None, clock=time.time,
+                 dedup=None, scheduler=None, discovery=None):
+        self.frontier = frontier
+        self.index = index
+        self.dedup = dedup
+        self.scheduler = scheduler
+        self.discovery = discovery
+        self._next_requeue = 0
+        self.error_logger = error_logger
+        self.rate_limiter = rate_limiter or DomainRateLimiter(config)
+        self.clock = clock
+        self.lease_size = int(config.get('lease_size', 20))
+        self.lease_ttl = float(config.get('lease_ttl', 60))
+        self.poll_interval = float(config.get('worker_poll_interval', 5))
+        self.leases = {}
+        self.leased_domains = {}
+        self.released = {}
+        self.stats = {'granted': 0, 'completed': 0, 'expired': 0, 'stale_results': 0}
+
+    def _holdback(self, now):
+        """Domains that are leased or were released too recently to lease again."""
+        held = set(self.leased_domains)
+        for domain, released_at in list(self.released.items()):
+            if now < released_at + self.rate_limiter.min_interval(domain):
+                held.add(domain)
+            else:
+                del self.released[domain]
+        return held
+
+    def _release(self, lease, now):
+        del self.leases[lease.lease_id]
+        self.leased_domains.pop(lease.domain, None)
+        self.released[lease.domain] = now
+
+    def lease(self, worker, max_urls):
+        """Grant `worker` leases covering up to `max_urls` URLs, one domain per lease."""
+        now = self.clock()
+        self.expire(now)
+        if self.scheduler is not None and now >= self._next_requeue:
+            self.frontier.requeue_due(now, failed_after=self.scheduler.initial_interval)
+            self._next_requeue = now + self.requeue_interval
+        held = self._holdback(now)
+        granted = []
+        remaining = max_urls
+        while remaining > 0:
+            domain, urls = self.frontier.dequeue_domain(min(self.lease_size, remaining), held, now)
+            if domain is None:
+                break
+            lease = Lease(uuid.uuid4().hex, worker, domain, urls, now + self.lease_ttl)
+            self.leases[lease.lease_id] = lease
+            self.leased_domains[domain] = lease.lease_id
+            held.add(domain)
+            granted.append(lease)
+            remaining -= len(urls)
+        if granted:
+            self.stats['granted'] += len(granted)
+            logger.info(f"Leased {max_urls - remaining} URLs from {len(granted)} domains to {worker}")
+        return granted
+
+    def heartbeat(self, worker, lease_ids):
+        """Extend the worker's leases. Returns (renewed, lost) lease ids."""
+        now = self.clock()
+        self.expire(now)
+        renewed, lost = [], []
+        for lease_id in lease_ids:
+            lease = self.leases.get(lease_id)
+            if lease is None or lease.worker != worker:
+                lost.append(lease_id)
+                continue
+            lease.expires_at = now + self.lease_ttl
+            renewed.append(lease_id)
+        return renewed, lost
+
+    def complete(self, worker, lease_id, results, errors=()):
+        """Record a lease's results and end it. Returns False if the lease was lost.
+
+        `results` maps each URL to {"status": "done" | "not_modified" |
+        "failed", "record": {...}, "links": [...]}; URLs without a result
+        are put back in the frontier. `errors` are (error_type, url, message, details)
+        rows for the shared error log.
+        """
+        now = self.clock()
+        self.expire(now)
+        if self.error_logger is not None:
+            for error in errors:
+                self.error_logger.log_to_db(*error)
+        lease = self.leases.get(lease_id)
+        if lease is None or lease.worker != worker:
+            self.stats['stale_results'] += 1
+            logger.warning(f"Ignoring results for lost lease {lease_id} from {worker}")
+            return False
+
+        unfinished = []
+        for url in lease.urls:
+            result = results.get(url)
+            if result is None:
+                unfinished.append(url)
+                continue
+            status = result.get('status')
+            if status == 'not_modified':
+                if self.index.touch(url):
+                    self.frontier.mark_done(url, self._next_visit(url, None, now))
+                else:
+                    self.frontier.mark_failed(url)
+                    if self.error_logger is not None:
+                        self.error_logger.log_to_db('WARNING', url, "Not modified but no stored record",
+                                                    f"Reported by {worker}")
+            elif status == 'done':
+                record = result.get('record')
+                if record:
+                    self.index.append(record)
+                    if self.dedup is not None:
+                        self.dedup.add(record)
+                self.frontier.mark_done(url, self._next_visit(url, record, now))
+                if self.discovery is not None and result.get('links'):
+                    self.discovery.add_links(result['links'])
+            else:
+                self.frontier.mark_failed(url)
+        if unfinished:
+            self.frontier.requeue(unfinished, states=(IN_PROGRESS,), now=now)
+        self.index.flush()
+        if self.dedup is not None:
+            self.dedup.flush()
+        self._release(lease, now)
+        self.stats['completed'] += 1
+        return True
+
+    def _next_visit(self, url, record, now):
+        if self.scheduler is None:
+            return 0
+        return self.scheduler.record_visit(url, record, now)
+
+    def expire(self, now=None):
+        """Return the URLs of leases whose worker stopped heartbeating to the frontier."""
+        now = self.clock() if now is None else now
+        expired = [lease for lease in self.leases.values() if lease.expires_at <= now]
+        for lease in expired:
+            logger.warning(f"Lease {lease.lease_id} of {lease.domain} held by {lease.worker} expired, "
+                           f"requeueing {len(lease.urls)} URLs")
+            self.frontier.requeue(lease.urls, states=(IN_PROGRESS,), now=now)
+            self._release(lease, now)
+            self.stats['expired'] += 1
+        return len(expired)
+
+    def is_done(self):
+        """Whether no URLs are pending or leased."""
+        return not self.leases and self.frontier.next_eligible_time() is None
+
+    def retry_after(self):
+        """Seconds a worker that got no lease should wait before asking again."""
+        next_eligible = self.frontier.next_eligible_time()
+        if next_eligible is None:
+            return self.poll_interval
+        return min(max(self.poll_interval, next_eligible - self.clock()), 300)
+
+    def status(self):
+        return {
+            'frontier': self.frontier.counts(),
+            'leases': [lease.to_dict() for lease in self.leases.values()],
+            'stats': dict(self.stats),
+            'done': self.is_done()
+        }
+
+class CoordinatorHandler(BaseHTTPRequestHandler):
+    """JSON API used by crawl workers: POST /lease, /heartbeat and /complete, GET /status."""
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _authorized(self):
+        token = self.server.token
+        if token and self.headers.get('Authorization') != f"Bearer {token}":
+            self._send_json(401, {'error': 'unauthorized'})
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        if self.path == '/status':
+            self._send_json(200, self.server.manager.status())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            worker = request['worker']
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {'error': f"bad request: {e}"})
+            return
+
+        manager = self.server.manager
+        try:
+            if self.path == '/lease':
+                leases = manager.lease(worker, int(request.get('max_urls', manager.lease_size)))
+                self._send_json(200, {
+                    'leases': [lease.to_dict() for lease in leases],
+                    'lease_ttl': manager.lease_ttl,
+                    'retry_after': None if leases else manager.retry_after(),
+                    'done': not leases and manager.is_done()
+                })
+            elif self.path == '/heartbeat':
+                renewed, lost = manager.heartbeat(worker, request.get('lease_ids', []))
+                self._send_json(200, {'renewed': renewed, 'lost': lost})
+            elif self.path == '/complete':
+                accepted = manager.complete(worker, request['lease_id'], request.get('results', {}),
+                                            request.get('errors', []))
+                self._send_json(200, {'accepted': accepted})
+            else:
+                self._send_json(404, {'error': 'not found'})
+        except Exception as e:
+            logger.error(f"Coordinator failed to handle {self.path} from {worker}: {e}")
+            self._send_json(500, {'error': str(e)})
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+class CoordinatorServer(HTTPServer):
+    """Single-threaded HTTP server around a LeaseManager.
+
+    Requests are handled one at a time on the thread that owns the SQLite
+    connections; every request is small, and expired leases are reaped
+    between requests.
+    """
+
+    def __init__(self, address, manager, token=None):
+        super().__init__(address, CoordinatorHandler)
+        self.manager = manager
+        self.token = token
+
+    def service_actions(self):
+        self.manager.expire()
+
+def run_coordinator(config, urls=(), seed_file=None, host='127.0.0.1', port=8700):
+    """Serve the shared frontier, store and error log to crawl workers until interrupted."""
+    frontier = Frontier(config.get('frontier_db', 'crawler_frontier.db'))
+    frontier.recover()
+    added = frontier.add_urls(urls, seed=True)
+    if seed_file:
+        added += frontier.add_seed_file(seed_file)
+    logger.info(f"Added {added} new URLs to the frontier: {frontier.counts()}")
+
+    persistence = Persistence(config)
+    store = persistence.open_store(config.get('output_file', 'song_lyrics.jsonl'))
+    index = RecordIndex(store)
+    persistence.import_legacy_json(config.get('legacy_output_file', 'song_lyrics.json'), store, index)
+    error_logger = ErrorLogger(config)
+    dedup = open_dedup(config)
+    scheduler = open_scheduler(config)
+    discovery = open_discovery(config, frontier)
+
+    manager = LeaseManager(frontier, index, config, error_logger, dedup=dedup, scheduler=scheduler,
+                           discovery=discovery)
+    server = CoordinatorServer((host, port), manager, config.get('coordinator_token'))
+    logger.info(f"Coordinator listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever(poll_interval=1.0)
+    except KeyboardInterrupt:
+        logger.info("Coordinator stopped by user")
+    finally:
+        server.server_close()
+        frontier.close()
+        index.close()
+        store.close()
+        if dedup is not None:
+            dedup.close()
+        if scheduler is not None:
+            scheduler.close()
+        if discovery is not None:
+            discovery.close()
+        error_logger.close()
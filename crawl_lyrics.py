@@ -1,24 +1,28 @@
-import requests
-from bs4 import BeautifulSoup
-from requests_html import HTMLSession
 from datetime import datetime, timedelta
-import random
-import csv
 import logging
-import sqlite3
-from pathlib import Path
 import sys
 import json
-import time
 from urllib.parse import urlparse, unquote
 from typing import List, Dict, Set, Optional, Tuple
-import socket
 import os
-from functools import wraps
 import tempfile
 import re
-import main
+import threading
+from functools import cached_property
 import http_request
+from rate_limiter import DomainRateLimiter, RateLimitedQueue
+from config_manager import ConfigManager
+from data_formatter import DataFormatter
+from persistence import Persistence
+from record_index import RecordIndex
+from recrawl_scheduler import open_scheduler
+from http_cache import open_cache
+from fetch_strategy import FetchStrategy
+from render_pool import RenderPool
+from parser_backends import get_backend
+from html_prefilter import HTMLPrefilter, prefilter_settings
+from selector_plan import SelectorPlan
+from error_logger import get_error_logger
 
 # Configure logging
 logging.basicConfig(
@@ -27,48 +31,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def init_error_db():
-    """Initialize the SQLite database for error logging."""
-    db_path = Path('crawler_errors.db')
-    conn = sqlite3.connect(str(db_path))
-    c = conn.cursor()
-    
-    # Create table for error logging if it doesn't exist
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS error_logs (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            error_type TEXT NOT NULL,
-            url TEXT,
-            message TEXT NOT NULL,
-            details TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-    return db_path
-
 def log_to_db(error_type: str, url: str, message: str, details: str = None):
-    """Log an error to the SQLite database."""
-    try:
-        conn = sqlite3.connect('crawler_errors.db')
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO error_logs (timestamp, error_type, url, message, details)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
-            datetime.now().isoformat(),
-            error_type,
-            url,
-            message,
-            details
-        ))
-        conn.commit()
-    except Exception as e:
-        logger.error(f"Failed to log to database: {e}")
-    finally:
-        if 'conn' in locals():
-            conn.close()
+    """Log an error to the SQLite database through the shared background writer."""
+    get_error_logger().log_to_db(error_type, url, message, details)
+
+def print_event(event: Dict):
+    """Report an event to the web interface.
+
+    Warnings and errors go to stderr as "WARNING: ..." / "ERROR: ..." lines,
+    everything else to stdout as one JSON object per line.
+    """
+    if event.get('status') in ('warning', 'error'):
+        sys.stderr.write(f"{event['status'].upper()}: {event['message']}\n")
+    else:
+        print(json.dumps(event), flush=True)
 
 class LyricsCrawler:
     SELECTORS = {
@@ -122,24 +98,46 @@ class LyricsCrawler:
         }
     }
 
-    def __init__(self, urls: List[str]):  # Increased default rate limit
-        self.config_manager = main.config_manager
-        self.config = self.config_manager.config
+    # Serializes writes to the JSONL output store and its index between crawlers
+    _output_lock = threading.Lock()
+
+    def __init__(self, urls: List[str], config: Optional[Dict] = None, report=None,
+                 http_client=None, renderer=None, rate_limiter=None):
+        """Crawl `urls`, reporting progress through `report` (print_event by default).
+
+        A long-running process can pass in a shared `http_client`
+        (HTTPRequest), `renderer` and `rate_limiter` to reuse connections,
+        checked proxies and browsers across crawls; the crawler leaves
+        those open when it cleans up.
+        """
+        self.config = config if config is not None else ConfigManager('config.json').config
         self.rate_limit = self.config.get('rate_limit', 5.0)  # Get rate limit from config
         self.urls = urls
-        self.last_request_time = 0.0
+        self.report = report or print_event
+        self.rate_limiter = rate_limiter or DomainRateLimiter({**self.config, 'rate_limit': self.rate_limit})
         self.allowed_domains = self._extract_domains(urls)
         self.temp_dir = tempfile.mkdtemp()
-        self.http_request = http_request.HTTPRequest(self.config)
+        self.stopped = threading.Event()
+        self._owns_http_client = http_client is None
+        if http_client is None:
+            http_client = http_request.HTTPRequest({'rotate_user_agent': True, **self.config},
+                                                   cache=open_cache(self.config))
+        self.http_request = http_client
+        self.http_cache = http_client.cache
+        self.prefilters = {}
+        self.selector_plans = {}
+        self.data_formatter = DataFormatter()
         
-        try:
-            self.js_session = HTMLSession()
-            self.js_session.headers.update(self.http_request.headers)
-            if self.http_request.current_proxy:
-                self.js_session.proxies = self.http_request.session.proxies
-        except Exception as e:
-            logger.warning(f"Failed to initialize JavaScript session: {e}")
-            self.js_session = None
+        # Pages are fetched statically first; the render pool only starts
+        # browsers for pages whose lyrics are missing from the plain HTML.
+        self._owns_renderer = renderer is None
+        self.renderer = renderer or RenderPool(
+            self.config,
+            self.http_request.headers,
+            lambda: self.http_request.current_proxy
+        )
+        self.fetch_strategy = FetchStrategy(self.http_request, self._extract_page, self.renderer,
+                                            self.config, has_content=lambda page: bool(page[1]))
         
         self.stats = {
             'total_urls': len(urls),
@@ -149,16 +147,14 @@ class LyricsCrawler:
             'retries': 0,
             'js_rendered': 0,
             'proxy_failures': 0,
-            'urls_updated': 0
+            'urls_updated': 0,
+            'urls_not_modified': 0
         }
 
     def cleanup(self):
         """Clean up resources."""
-        try:
-            if hasattr(self, 'js_session') and self.js_session:
-                self.js_session.close()
-        except Exception as e:
-            logger.debug(f"Error closing JavaScript session: {e}")
+        if hasattr(self, 'renderer') and self._owns_renderer:
+            self.renderer.close()
         
         try:
             if os.path.exists(self.temp_dir):
@@ -168,7 +164,20 @@ class LyricsCrawler:
         except Exception as e:
             logger.debug(f"Error cleaning up temporary directory: {e}")
         
-        self.http_request.session.close()
+        if self._owns_http_client:
+            self.http_request.session.close()
+            if self.http_cache is not None:
+                self.http_cache.close()
+
+    @cached_property
+    def parser_backend(self):
+        """The HTML parser backend, loaded when the first page is parsed."""
+        return get_backend(self.config.get('parser_backend', 'html.parser'))
+
+    @cached_property
+    def _prefilter_settings(self):
+        """(enabled, hollow tags) of the prefilter, as HTMLParser reads them from the config."""
+        return prefilter_settings(self.config, self.parser_backend)
 
     def __enter__(self):
         return self
@@ -176,38 +185,27 @@ class LyricsCrawler:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.cleanup()
 
+    def stop(self):
+        """Stop crawling after the current URL; results so far are still saved."""
+        self.stopped.set()
+
     def _update_request_settings(self):
-        """Update request settings with new proxy and User-Agent."""
-        # Rotate User-Agent
-        new_user_agent = self.http_request.get_random_user_agent()
-        self.http_request.headers['User-Agent'] = new_user_agent
-        self.http_request.session.headers.update(self.http_request.headers)
-        
-        if self.js_session:
-            self.js_session.headers.update(self.http_request.headers)
-
-    def _rate_limit(self):
-        """Implement rate limiting between requests."""
-        now = time.time()
-        time_since_last = now - self.last_request_time
-        if time_since_last < self.rate_limit:
-            time.sleep(self.rate_limit - time_since_last)
-        self.last_request_time = time.time()
-
-    def _render_javascript(self, url: str) -> Optional[str]:
-        """Render JavaScript content for a given URL."""
-        if not self.js_session:
-            return None
-            
-        try:
-            response = self.js_session.get(url, timeout=30)
-            response.raise_for_status()
-            response.html.render(timeout=30)
-            self.stats['js_rendered'] += 1
-            return response.html.html
-        except Exception as e:
-            logger.warning(f"Failed to render JavaScript content for {url}: {e}")
-            return None
+        """Rotate the User-Agent of the JavaScript renderer.
+
+        Plain requests get a fresh User-Agent per request from HTTPRequest
+        (rotate_user_agent), without touching the shared session headers.
+        """
+        self.renderer.update_headers({'User-Agent': http_request.get_random_user_agent()})
+
+    def _rate_limit(self, url: str):
+        """Wait for the per-domain token bucket of the given URL."""
+        self.rate_limiter.acquire(urlparse(url).netloc)
+
+    def _extract_page(self, html_content: str, url: str):
+        """Parse a page and run its lyrics selectors, returning (soup, lyrics)."""
+        soup = self._parse(url, html_content)
+        selectors = self._get_selectors(urlparse(url).netloc)
+        return soup, self._extract_text_from_selector(soup, selectors['lyrics'])
 
     def _extract_domains(self, urls: List[str]) -> Set[str]:
         domains = set()
@@ -230,7 +228,19 @@ class LyricsCrawler:
     def _get_selectors(self, domain: str) -> Dict[str, List[str]]:
         return self.SELECTORS.get(domain, self.SELECTORS['default'])
 
-    def _extract_metadata(self, url: str, soup: BeautifulSoup) -> Tuple[Optional[str], Optional[str]]:
+    def _parse(self, url: str, html_content: str):
+        """Parse a page after dropping content the domain's selectors never use."""
+        enabled, hollow_tags = self._prefilter_settings
+        if enabled:
+            domain = urlparse(url).netloc
+            prefilter = self.prefilters.get(domain)
+            if prefilter is None:
+                prefilter = self.prefilters[domain] = HTMLPrefilter(self._get_selectors(domain),
+                                                                    hollow_tags=hollow_tags)
+            html_content = prefilter.apply(html_content)
+        return self.parser_backend.parse(html_content)
+
+    def _extract_metadata(self, url: str, soup) -> Tuple[Optional[str], Optional[str]]:
         title = None
         artist = None
         try:
@@ -243,9 +253,6 @@ class LyricsCrawler:
             if not artist:
                 artist = self._extract_artist_from_url(url)
             
-            if not artist:
-                artist = self._extract_artist_from_domain(domain)
-            
             if title:
                 title = self._clean_text(title)
             if artist:
@@ -255,21 +262,19 @@ class LyricsCrawler:
         
         return title, artist
 
-    def _extract_text_from_selector(self, soup: BeautifulSoup, selectors: List[str]) -> Optional[str]:
-        for selector in selectors:
-            try:
-                if selector.startswith('meta['):
-                    element = soup.select_one(selector)
-                    if element and element.get('content'):
-                        return element['content']
-                else:
-                    elements = soup.select(selector)
-                    if elements:
-                        return '\n'.join(element.get_text(strip=True, separator='\n') 
-                                       for element in elements)
-            except Exception as e:
-                logger.debug(f"Error with selector {selector}: {str(e)}")
-        return None
+    def _extract_artist_from_url(self, url: str) -> Optional[str]:
+        """Take the artist from paths like /artist/<name>/... or /artists/<name>."""
+        match = re.search(r'/artists?/([^/?#]+)', urlparse(url).path)
+        if not match:
+            return None
+        return unquote(match.group(1)).replace('-', ' ').replace('_', ' ').strip() or None
+
+    def _extract_text_from_selector(self, soup, selectors: List[str]) -> Optional[str]:
+        key = tuple(selectors)
+        plan = self.selector_plans.get(key)
+        if plan is None:
+            plan = self.selector_plans[key] = SelectorPlan(selectors, self.parser_backend)
+        return plan.run(soup)
 
     def _clean_text(self, text: str) -> str:
         if not text:
@@ -281,43 +286,49 @@ class LyricsCrawler:
         return text.strip()
 
     
-    def extract_lyrics(self, url: str) -> Dict[str, str]:
-        """Extract lyrics and metadata from a given URL."""
+    def extract_lyrics(self, url: str, skip_rate_limit: bool = False,
+                       fetched=None) -> Dict[str, str]:
+        """Extract lyrics and metadata from a given URL.
+
+        Pass skip_rate_limit=True when the caller already took the domain's
+        rate-limit token, e.g. when the URL came from a RateLimitedQueue.
+        A FetchResult from an earlier call to the fetch strategy can be passed
+        as fetched and is used instead of fetching the page again.
+        """
         if not self._is_allowed_domain(url):
             error_msg = f"Domain not in allowed list: {urlparse(url).netloc}"
             logger.error(error_msg)
             log_to_db('ERROR', url, error_msg, 'Domain validation failed')
-            sys.stderr.write(f"ERROR: {error_msg}\n")
+            self.report({'status': 'error', 'message': error_msg, 'url': url})
             return None
 
         try:
-            self._rate_limit()
+            if not skip_rate_limit:
+                self._rate_limit(url)
             
             # Update request settings before making request
             self._update_request_settings()
-            print(json.dumps({'status': 'crawling', 'url': url}), flush=True)
+            self.report({'status': 'crawling', 'url': url})
             
-            # Try JavaScript rendering first
-            html_content = self._render_javascript(url)
-            if html_content:
-                soup = BeautifulSoup(html_content, 'html.parser')
+            # Plain HTTP first, rendering JavaScript only if the lyrics are missing
+            if fetched is None:
+                fetched = self.fetch_strategy.fetch(url)
+            if fetched.html is None:
+                return None
+            if fetched.rendered:
+                self.stats['js_rendered'] += 1
                 logger.info(f"Using JavaScript-rendered content for {url}")
+            if fetched.extracted is None:
+                soup, lyrics = self._extract_page(fetched.html, url)
             else:
-                # Fall back to regular requests if JS rendering fails
-                logger.info(f"Falling back to regular scraping for {url}")
-                html_content = self.http_request.get(url)
-                if html_content is None:
-                    return None
-                soup = BeautifulSoup(html_content, 'html.parser')
+                soup, lyrics = fetched.extracted
             
             # Test if content was actually loaded
-            if not soup.find('body'):
+            if self.parser_backend.select_one(soup, 'body') is None:
                 error_msg = f"No content found after scraping {url}"
                 logger.error(error_msg)
                 return None
             
-            domain = urlparse(url).netloc
-            selectors = self._get_selectors(domain)
             title, artist = self._extract_metadata(url, soup)
             
             if not title or not artist:
@@ -328,33 +339,15 @@ class LyricsCrawler:
                 if not artist:
                     missing.append('artist')
                 warning_msg = f"Missing metadata ({', '.join(missing)}) for {url}"
-                sys.stderr.write(f"WARNING: {warning_msg}\n")
+                self.report({'status': 'warning', 'message': warning_msg, 'url': url})
             
-            try:
-                lyrics = self._extract_text_from_selector(soup, selectors['lyrics'])
-                if not lyrics:
-                    error_msg = f"No lyrics found at {url}"
-                    logger.warning(error_msg)
-                    sys.stderr.write(f"WARNING: {error_msg}\n")
-                    return None
-                
-            except Exception as e:
-                error_msg = f"HTML parsing error at {url}: {str(e)}"
-                logger.error(error_msg)
-                log_to_db('ERROR', url, error_msg, f"Parser error: {str(e)}")
-                sys.stderr.write(f"ERROR: {error_msg}\n")
-                self.stats['errors'] += 1
-                self.print_status(error_msg)
+            if not lyrics:
+                error_msg = f"No lyrics found at {url}"
+                logger.warning(error_msg)
+                self.report({'status': 'warning', 'message': error_msg, 'url': url})
                 return None
 
-            return {
-                'title': title or 'Unknown Title',
-                'artist': artist or 'Unknown Artist',
-                'prompt': self._format_prompt(title, artist),
-                'completion': lyrics,
-                'url': url,
-                'last_crawled': datetime.now().isoformat()
-            }
+            return self.data_formatter.format_data(title, artist, lyrics, url)
 
         except Exception as e:
             error_msg = f"Unexpected error crawling {url}: {str(e)}"
@@ -363,152 +356,138 @@ class LyricsCrawler:
             self.print_status(error_msg)
             return None
 
-    def _load_existing_data(self, output_file: str) -> List[Dict[str, str]]:
-        """Load existing data from JSON file if it exists."""
-        try:
-            if os.path.exists(output_file):
-                with open(output_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-        except Exception as e:
-            logger.warning(f"Could not load existing data: {e}")
-        return []
-
-    def _needs_update(self, data: Dict[str, str]) -> bool:
-        """Check if the URL needs to be updated (older than 24 hours)."""
-        if 'last_crawled' not in data:
-            return True
-
-        try:
-            last_crawled = datetime.fromisoformat(data['last_crawled'])
-            return datetime.now() - last_crawled > timedelta(hours=24)
-        except (ValueError, TypeError):
-            return True
+    def print_status(self, error: str = None):
+        """Report progress to the web interface."""
+        status = {'status': 'update', 'data': dict(self.stats)}
+        if error:
+            status['error_details'] = error
+        self.report(status)
+
+    def _open_output(self, output_file: str):
+        """Open the JSONL output store and its URL index, merging in the legacy JSON output."""
+        persistence = Persistence(self.config)
+        store = persistence.open_store(output_file)
+        index = RecordIndex(store)
+        persistence.import_legacy_json(self.config.get('legacy_output_file', 'song_lyrics.json'), store, index)
+        return store, index
 
     def check_and_update(self, output_file: str):
-        """Check for URLs that need updating and update them."""
-        existing_data = self._load_existing_data(output_file)
-        updated = False
-
-        logger.info("Checking for URLs that need updating...")
-        for url in self.urls:
-            domain = urlparse(url).netloc
-            logger.info(f"Checking URL from {domain}: {url}")
-            
-            # Find existing data for this URL
-            existing_entry = next((item for item in existing_data if item.get('url') == url), None)
-            
-            if not existing_entry or self._needs_update(existing_entry):
-                logger.info(f"Updating {url}")
-                result = self.extract_lyrics(url)
+        """Check for URLs that need updating and update them.
+
+        A URL is due when its RecrawlScheduler visit time has come, which
+        depends on how often the page has changed, or with `recrawl_schedule`
+        off, 24 hours after it was last crawled. Crawl times are looked up in
+        the URL index of the JSONL output store, so only the due URLs are
+        fetched and nothing is loaded into memory. The store is held for the
+        whole pass, so crawls finishing meanwhile wait to save their results.
+        """
+        with self._output_lock:
+            self._check_and_update(output_file)
+
+    def _check_and_update(self, output_file: str):
+        store, index = self._open_output(output_file)
+        scheduler = open_scheduler(self.config)
+        try:
+            logger.info("Checking for URLs that need updating...")
+            if scheduler is not None:
+                stale_urls = scheduler.due_urls(self.urls, index.last_crawled_many(self.urls))
+            else:
+                stale_urls = index.stale_urls(self.urls, max_age=timedelta(hours=24))
+            skipped = len(self.urls) - len(stale_urls)
+            if skipped:
+                logger.info(f"Skipping {skipped} URLs that are not due for a revisit")
+            if not stale_urls:
+                logger.info("No updates needed")
+                return
+
+            queue = RateLimitedQueue(self.rate_limiter, stale_urls)
+            while not self.stopped.is_set():
+                url = queue.get()
+                if url is None:
+                    break
+                domain = urlparse(url).netloc
+                fetched = None
+                if self.http_cache is not None and url in index and url in self.http_cache:
+                    # Revalidate the cached copy before downloading and parsing
+                    fetched = self.fetch_strategy.fetch(url)
+                    if fetched.not_modified and index.touch(url):
+                        if scheduler is not None:
+                            scheduler.record_visit(url)
+                        self.stats['urls_not_modified'] += 1
+                        logger.info(f"Not modified since last crawl: {url}")
+                        continue
+                logger.info(f"Updating {url} from {domain}")
+                result = self.extract_lyrics(url, skip_rate_limit=True, fetched=fetched)
                 if result:
-                    if not existing_entry:
-                        existing_data.append(result)
-                    else:
-                        existing_entry.update(result)
-                    updated = True
+                    index.append(result)
+                    if scheduler is not None:
+                        scheduler.record_visit(url, result)
                     self.stats['urls_updated'] += 1
                     self.print_status()
                 else:
                     logger.warning(f"Failed to update {url}")
-            else:
-                logger.info(f"Skipping {url} - last crawled: {existing_entry['last_crawled']}")
-
-        if updated:
-            temp_file = os.path.join(self.temp_dir, 'temp_lyrics.json')
-            try:
-                with open(temp_file, 'w', encoding='utf-8') as f:
-                    json.dump(existing_data, f, indent=2, ensure_ascii=False)
-                os.replace(temp_file, output_file)
-                logger.info("Successfully updated lyrics database")
-            except Exception as e:
-                error_msg = f"Failed to save updated JSON file: {str(e)}"
-                logger.error(f"{error_msg} for file: {output_file}")
-                raise
-        else:
-            logger.info("No updates needed")
-
-    def save_to_json(self, output_file: str):
-        """Save extracted lyrics to a JSON file."""
-        temp_file = os.path.join(self.temp_dir, 'temp_lyrics.json')
-        lyrics_data = self._load_existing_data(output_file)
+                    if scheduler is not None:
+                        scheduler.record_failure(url)
+            logger.info("Successfully updated lyrics database")
+        except Exception as e:
+            error_msg = f"Failed to update lyrics store: {str(e)}"
+            logger.error(f"{error_msg} for file: {output_file}")
+            raise
+        finally:
+            index.close()
+            store.close()
+            if scheduler is not None:
+                scheduler.close()
+
+    def save_to_store(self, output_file: str):
+        """Crawl the URLs and append the extracted lyrics to the JSONL output store.
+
+        Results are appended only once crawling is done, under a lock, so
+        crawlers running side by side never write to the store at the same
+        time.
+        """
+        results = []
         
         try:
-            for url in self.urls:
+            # Hand out URLs as their domain's bucket allows, so a slow site
+            # does not hold up the others.
+            queue = RateLimitedQueue(self.rate_limiter, self.urls)
+            while not self.stopped.is_set():
+                url = queue.get()
+                if url is None:
+                    break
                 domain = urlparse(url).netloc
                 logger.info(f"Processing URL from {domain}: {url}")
                 
-                result = self.extract_lyrics(url)
+                result = self.extract_lyrics(url, skip_rate_limit=True)
                 if result:
                     result['url'] = url
                     result['last_crawled'] = datetime.now().isoformat()
-                    lyrics_data.append(result)
+                    results.append(result)
                     self.stats['urls_crawled'] += 1
                     self.print_status()
                 else:
                     logger.warning(f"Skipping URL from {domain} due to extraction error: {url}")
             
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(lyrics_data, f, indent=2, ensure_ascii=False)
-            os.replace(temp_file, output_file)
+            with self._output_lock:
+                store, index = self._open_output(output_file)
+                try:
+                    for result in results:
+                        index.append(result)
+                finally:
+                    index.close()
+                    store.close()
             
         except Exception as e:
-            error_msg = f"Failed to save JSON file: {str(e)}"
+            error_msg = f"Failed to save results: {str(e)}"
             logger.error(f"{error_msg} for file: {output_file}")
             log_to_db('ERROR', None, error_msg, f"File operation error: {output_file}, Details: {str(e)}")
             raise
         finally:
             self.cleanup()
 
-import argparse
-
-def main():
-    parser = argparse.ArgumentParser(description='Crawl lyrics from specified URLs.')
-    parser.add_argument('urls', nargs='*', help='List of URLs to crawl')
-    parser.add_argument('--rate-limit', type=float, default=5.0, help='Rate limit in seconds between requests')
-    parser.add_argument('--check-updates', action='store_true', help='Check and update existing URLs')
-    args = parser.parse_args()
-
-    if not args.urls:
-        error_msg = "No URLs provided. Usage: python crawl_lyrics.py [--check-updates] URL1 URL2 ..."
-        logger.error(error_msg)
-        log_to_db('ERROR', None, error_msg, 'Command line argument validation')
-        sys.stderr.write(f"ERROR: {error_msg}\n")
-        sys.exit(1)
-    
-    # Initialize error logging database
-    init_error_db()
-    
-    logger.info("Starting continuous crawling process...")
-    while True:
-        try:
-            with LyricsCrawler(args.urls) as crawler:
-                if args.check_updates:
-                    crawler.check_and_update('song_lyrics.json')
-                    logger.info("Update check complete")
-                else:
-                    crawler.save_to_json('song_lyrics.json')
-                    logger.info("Successfully saved lyrics to song_lyrics.json")
-                    logger.info("To check for updates later, run: python crawl_lyrics.py --check-updates URL1 URL2 ...")
-
-        # Wait for 24 hours before next iteration
-            logger.info("Waiting 24 hours before next check...")
-            time.sleep(24 * 3600)  # 24 hours in seconds
-
-        except KeyboardInterrupt:
-            logger.info("Crawling process stopped by user")
-            break
-
-        except Exception as e:
-            error_msg = f"Failed to complete crawling process: {str(e)}"
-            logger.error(error_msg)
-            log_to_db('EXCEPTION', None, error_msg, str(e))
-            sys.stderr.write(f"ERROR: {error_msg}\n")
-
-        # Wait for 5 minutes before retrying after an error
-        logger.info("Waiting 5 minutes before retrying...")
-        time.sleep(300)  # 5 minutes in seconds
-
-import main
-
 if __name__ == "__main__":
+    # The command line is main.py's; imported here so that importing this
+    # module does not load the whole crawl pipeline
+    import main
     main.main()
\ No newline at end of file
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import os
+import socket
+import threading
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+class CoordinatorClient:
+    """JSON client for the coordinator's lease API."""
+
+    def __init__(self, url, worker_id=None, token=None, timeout=30, session=None):
+        self.url = url.rstrip('/')
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        if token:
+            self.session.headers['Authorization'] = f"Bearer {token}"
+
+    def _post(self, path, payload):
+        try:
+            response = self.session.post(f"{self.url}{path}", json={'worker': self.worker_id, **payload},
+                                         timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Coordinator request {path} failed: {e}")
+            return None
+
+    def lease(self, max_urls):
+        return self._post('/lease', {'max_urls': max_urls})
+
+    def heartbeat(self, lease_ids):
+        return self._post('/heartbeat', {'lease_ids': lease_ids})
+
+    def complete(self, lease_id, results, errors=()):
+        response = self._post('/complete', {'lease_id': lease_id, 'results': results,
+                                            'errors': list(errors)})
+        return bool(response and response.get('accepted'))
+
+class LeaseResults:
+    """Collects page outcomes on a worker until they are reported to the coordinator.
+
+    Stands in for the frontier, record index, error logger and link
+    discovery that `main.persist_page` writes to, so a worker persists
+    pages through the same code as a standalone crawl. With an `extractor`,
+    the links found on each page are reported with its result.
+    """
+
+    def __init__(self, extractor=None):
+        self.extractor = extractor
+        self._lock = threading.Lock()
+        self.results = {}
+        self.errors = []
+        self._not_modified = set()
+
+    # Frontier
+    def mark_done(self, url, next_eligible=0):
+        with self._lock:
+            status = 'not_modified' if url in self._not_modified else 'done'
+            self.results.setdefault(url, {})['status'] = status
+
+    def mark_failed(self, url, retry_delay=None):
+        with self._lock:
+            self.results[url] = {'status': 'failed'}
+
+    # RecordIndex
+    def touch(self, url, now=None):
+        # The coordinator refreshes the shared record
+        with self._lock:
+            self._not_modified.add(url)
+        return True
+
+    def append(self, record):
+        with self._lock:
+            self.results.setdefault(record['url'], {'status': 'done'})['record'] = record
+
+    # LinkDiscovery
+    def discover(self, url, html_content):
+        # The coordinator filters out known URLs and queues the rest
+        if self.extractor is None:
+            return 0
+        links = self.extractor.extract(html_content, url)
+        with self._lock:
+            self.results.setdefault(url, {'status': 'done'})['links'] = links
+        return len(links)
+
+    # ErrorLogger
+    def log_to_db(self, error_type, url, message, details=None):
+        with self._lock:
+            self.errors.append((error_type, url, message, details))
+
+    def take(self, urls):
+        """Remove and return the results for `urls` and every error logged so far."""
+        with self._lock:
+            results = {url: self.results.pop(url) for url in urls if url in self.results}
+            self._not_modified.difference_update(urls)
+            errors, self.errors = self.errors, []
+        return results, errors
+
+class CrawlWorker:
+    """Leases URLs from a coordinator, crawls them and reports the results.
+
+    Each round asks for up to `batch_size` URLs, runs them through the
+    crawl pipeline and completes every lease. A heartbeat thread renews the
+    leases every third of their lifetime while the pipeline runs, so a
+    worker only loses its URLs to another node if it stops responding.
+    """
+
+    def __init__(self, client, pipeline, results, config):
+        self.client = client
+        self.pipeline = pipeline
+        self.results = results
+        self.batch_size = int(config.get('batch_size', int(config.get('max_concurrency', 16)) * 4))
+        self.lease_ttl = float(config.get('lease_ttl', 60))
+        self.poll_interval = float(config.get('worker_poll_interval', 5))
+        self._active = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat_thread = None
+        self.stats = {'leases': 0, 'urls': 0, 'lost': 0}
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.lease_ttl / 3):
+            with self._lock:
+                lease_ids = list(self._active)
+            if not lease_ids:
+                continue
+            response = self.client.heartbeat(lease_ids)
+            for lease_id in (response or {}).get('lost', []):
+                logger.warning(f"Lost lease {lease_id}; its results will be discarded")
+
+    def _start_heartbeat(self):
+        if self._heartbeat_thread is None:
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat_loop,
+                                                      name='lease-heartbeat', daemon=True)
+            self._heartbeat_thread.start()
+
+    def run_once(self):
+        """Crawl one round of leases.
+
+        Returns the number of URLs crawled, 0 if there was nothing to lease
+        yet and None once the coordinator reports the crawl finished.
+        """
+        response = self.client.lease(self.batch_size)
+        if response is None:
+            self._stop.wait(self.poll_interval)
+            return 0
+        leases = response.get('leases', [])
+        if not leases:
+            if response.get('done'):
+                return None
+            self._stop.wait(response.get('retry_after') or self.poll_interval)
+            return 0
+
+        self.lease_ttl = float(response.get('lease_ttl', self.lease_ttl))
+        with self._lock:
+            self._active = {lease['lease_id']: lease for lease in leases}
+        self._start_heartbeat()
+        urls = [url for lease in leases for url in lease['urls']]
+        logger.info(f"Crawling {len(urls)} leased URLs from {len(leases)} domains")
+        try:
+            asyncio.run(self.pipeline.run(urls))
+        finally:
+            with self._lock:
+                self._active = {}
+            for lease in leases:
+                results, errors = self.results.take(lease['urls'])
+                if not self.client.complete(lease['lease_id'], results, errors):
+                    self.stats['lost'] += 1
+        self.stats['leases'] += len(leases)
+        self.stats['urls'] += len(urls)
+        return len(urls)
+
+    def run(self, exit_when_done=False):
+        """Keep crawling leases until interrupted, or until the crawl is done."""
+        try:
+            while not self._stop.is_set():
+                if self.run_once() is None:
+                    if exit_when_done:
+                        logger.info("Coordinator reports the crawl is done")
+                        break
+                    self._stop.wait(self.poll_interval)
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stop.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
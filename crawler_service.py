@@ -0,0 +1,347 @@
+"""Long-running crawler service for the web interface.
+
+Usage: python crawler_service.py [--config config.json] [--listen HOST:PORT] [--max-jobs N]
+
+Jobs arrive as newline-delimited JSON, on stdin or, with --listen, over TCP
+connections, and progress comes back the same way, one JSON event per line.
+Imports, the configuration, proxy health checks, connection pools and
+browsers are set up once and shared by every job, and up to
+`service_max_jobs` jobs (default 2) crawl at the same time.
+
+Requests:
+
+    {"type": "crawl", "id": "job1", "urls": ["https://..."], "rate_limit": 5.0,
+     "proxy_file": "proxies.txt", "check_updates": false}
+    {"type": "cancel", "id": "job1"}
+    {"type": "export", "id": "export1", "format": "csv", "output": "song_lyrics.csv"}
+    {"type": "ping"}
+    {"type": "shutdown"}
+
+Every event about a job carries its `job` id and a `status`: `queued`,
+`started`, `crawling`, `update`, `warning`, `error`, then one of `complete`,
+`cancelled` or `failed`. `started`, `update` and the final event include the
+crawl stats under `data`. Bad requests are answered with `rejected`. The
+service announces itself with `{"status": "ready"}` and answers pings with
+`pong`.
+
+Crawls and update checks append to the JSONL output store
+(`service_output_file`, by default the crawler's `output_file`). An export
+writes that store (or the given `source`) as a dataset through exporter.py
+and answers with `exported`, its manifest under `data`, or `failed`.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import socketserver
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from config_manager import ConfigManager
+from crawl_lyrics import LyricsCrawler
+from error_logger import get_error_logger
+from exporter import Exporter, WRITERS
+from http_cache import open_cache
+from http_request import HTTPRequest
+from rate_limiter import DomainRateLimiter
+from render_pool import RenderPool
+
+logger = logging.getLogger(__name__)
+
+class EventWriter:
+    """Writes events to a text stream as JSON lines, one thread at a time."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        line = json.dumps(event, ensure_ascii=False) + '\n'
+        try:
+            with self._lock:
+                self.stream.write(line)
+                self.stream.flush()
+        except (OSError, ValueError) as e:
+            # The client went away; its jobs are cancelled by the caller
+            logger.debug(f"Dropping event, output is closed: {e}")
+
+class CrawlJob:
+    def __init__(self, job_id, urls, emit, rate_limit=None, proxy_file=None, check_updates=False):
+        self.id = job_id
+        self.urls = urls
+        self.emit = emit
+        self.rate_limit = rate_limit
+        self.proxy_file = proxy_file
+        self.check_updates = check_updates
+        self.cancelled = threading.Event()
+        self.crawler = None
+
+    def report(self, event):
+        self.emit({'job': self.id, **event})
+
+    def cancel(self):
+        self.cancelled.set()
+        crawler = self.crawler
+        if crawler is not None:
+            crawler.stop()
+
+class CrawlerService:
+    """Runs crawl jobs on a thread pool, sharing clients between them.
+
+    One HTTPRequest (with its proxy pool and HTTP cache) and one render pool
+    are kept per proxy file, and one DomainRateLimiter per rate limit, so
+    jobs crawling the same sites at the same rate share its token buckets.
+    Crawls and update checks (`check_updates`) append to the same JSONL
+    store, and update checks run one at a time.
+    """
+
+    def __init__(self, config, max_jobs=None):
+        self.config = config
+        self.max_jobs = int(max_jobs or config.get('service_max_jobs', 2))
+        self.output_file = config.get('service_output_file') or config.get('output_file', 'song_lyrics.jsonl')
+        self.jobs = {}
+        self._clients = {}
+        self._rate_limiters = {}
+        self._lock = threading.Lock()
+        # Creating a client probes its proxies, which should not hold up other requests
+        self._client_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_jobs, thread_name_prefix='crawl-job')
+        self.error_logger = get_error_logger(config)
+
+    def start(self):
+        """Set up the clients for the configured proxies before the first job."""
+        self._client(self.config.get('proxy_file'))
+        return self
+
+    def _job_config(self, rate_limit, proxy_file):
+        config = dict(self.config)
+        if rate_limit is not None:
+            config['rate_limit'] = rate_limit
+            rate_limits = dict(config.get('RATE_LIMITS') or {})
+            rate_limits['default'] = {**rate_limits.get('default', {}), 'delay': rate_limit}
+            config['RATE_LIMITS'] = rate_limits
+        if proxy_file:
+            config['proxy_file'] = proxy_file
+        return config
+
+    def _client(self, proxy_file):
+        """(HTTPRequest, RenderPool) for a proxy file, created on first use."""
+        with self._client_lock:
+            client = self._clients.get(proxy_file)
+            if client is None:
+                config = {'rotate_user_agent': True, **self.config}
+                if proxy_file:
+                    config['proxies'] = ConfigManager.load_proxies_from_file(proxy_file)
+                http_client = HTTPRequest(config, cache=open_cache(config))
+                # A long-lived service probes its proxies up front rather than on the first request
+                http_client.proxy_pool
+                renderer = RenderPool(config, http_client.headers, lambda: http_client.current_proxy)
+                client = self._clients[proxy_file] = (http_client, renderer)
+            return client
+
+    def _rate_limiter(self, config):
+        key = config.get('rate_limit')
+        with self._lock:
+            limiter = self._rate_limiters.get(key)
+            if limiter is None:
+                limiter = self._rate_limiters[key] = DomainRateLimiter(config)
+            return limiter
+
+    def handle(self, message, emit):
+        """Act on one request. Returns False once the service should stop."""
+        kind = message.get('type')
+        if kind == 'crawl':
+            self.submit(message, emit)
+        elif kind == 'cancel':
+            if not self.cancel(message.get('id')):
+                emit({'job': message.get('id'), 'status': 'rejected', 'message': 'Unknown job'})
+        elif kind == 'export':
+            self.export(message, emit)
+        elif kind == 'ping':
+            emit({'status': 'pong', 'jobs': sorted(self.jobs)})
+        elif kind == 'shutdown':
+            return False
+        else:
+            emit({'status': 'rejected', 'message': f"Unknown request type: {kind}"})
+        return True
+
+    def submit(self, message, emit):
+        job_id = str(message.get('id') or uuid.uuid4().hex)
+        urls = message.get('urls')
+        if not isinstance(urls, list) or not urls or not all(isinstance(url, str) for url in urls):
+            emit({'job': job_id, 'status': 'rejected', 'message': 'urls must be a non-empty list of URLs'})
+            return None
+        rate_limit = message.get('rate_limit')
+        if rate_limit is not None:
+            try:
+                rate_limit = float(rate_limit)
+            except (TypeError, ValueError):
+                emit({'job': job_id, 'status': 'rejected', 'message': 'rate_limit must be a number'})
+                return None
+        job = CrawlJob(job_id, urls, emit, rate_limit, message.get('proxy_file'),
+                       bool(message.get('check_updates')))
+        with self._lock:
+            if job_id in self.jobs:
+                emit({'job': job_id, 'status': 'rejected', 'message': 'A job with this id is running'})
+                return None
+            self.jobs[job_id] = job
+        job.report({'status': 'queued', 'total_urls': len(urls)})
+        self._executor.submit(self._run, job)
+        return job
+
+    def export(self, message, emit):
+        job_id = str(message.get('id') or uuid.uuid4().hex)
+        fmt = message.get('format', 'csv')
+        if fmt not in WRITERS:
+            emit({'job': job_id, 'status': 'rejected', 'message': f"Unknown export format: {fmt}"})
+            return
+        self._executor.submit(self._export, job_id, message.get('source') or self.output_file, fmt,
+                              message.get('output'), bool(message.get('incremental')), emit)
+
+    def _export(self, job_id, source, fmt, output, incremental, emit):
+        try:
+            if not os.path.exists(source):
+                raise FileNotFoundError(f"Nothing to export: {source} does not exist")
+            manifest = Exporter(self.config).export(source, fmt, incremental, output)
+            emit({'job': job_id, 'status': 'exported', 'data': manifest})
+        except Exception as e:
+            logger.error(f"Export {job_id} failed: {e}")
+            emit({'job': job_id, 'status': 'failed', 'message': str(e)})
+
+    def cancel(self, job_id):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return False
+        job.cancel()
+        return True
+
+    def cancel_all(self, emit=None):
+        """Cancel every job, or only those reporting to `emit`."""
+        for job in list(self.jobs.values()):
+            if emit is None or job.emit is emit:
+                job.cancel()
+
+    def _run(self, job):
+        try:
+            if job.cancelled.is_set():
+                job.report({'status': 'cancelled'})
+                return
+            config = self._job_config(job.rate_limit, job.proxy_file)
+            http_client, renderer = self._client(job.proxy_file or self.config.get('proxy_file'))
+            crawler = LyricsCrawler(job.urls, config, report=job.report, http_client=http_client,
+                                    renderer=renderer, rate_limiter=self._rate_limiter(config))
+            job.crawler = crawler
+            if job.cancelled.is_set():
+                crawler.stop()
+            job.report({'status': 'started', 'data': dict(crawler.stats)})
+            try:
+                if job.check_updates:
+                    with self._update_lock:
+                        crawler.check_and_update(self.output_file)
+                else:
+                    crawler.save_to_store(self.output_file)
+            finally:
+                crawler.cleanup()
+            job.report({'status': 'cancelled' if job.cancelled.is_set() else 'complete',
+                        'data': dict(crawler.stats)})
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            self.error_logger.log_to_db('EXCEPTION', None, f"Crawl job {job.id} failed", str(e))
+            job.report({'status': 'failed', 'message': str(e)})
+        finally:
+            with self._lock:
+                self.jobs.pop(job.id, None)
+
+    def close(self):
+        self.cancel_all()
+        self._executor.shutdown(wait=True)
+        for http_client, renderer in self._clients.values():
+            renderer.close()
+            http_client.session.close()
+            if http_client.cache is not None:
+                http_client.cache.close()
+        self._clients = {}
+
+def read_requests(lines, service, emit):
+    """Feed newline-delimited JSON requests to the service until EOF or shutdown.
+
+    Returns False if a shutdown was requested.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            message = json.loads(line)
+            if not isinstance(message, dict):
+                raise ValueError('request must be a JSON object')
+        except ValueError as e:
+            emit({'status': 'rejected', 'message': f"Invalid request: {e}"})
+            continue
+        if not service.handle(message, emit):
+            return False
+    return True
+
+def serve_stdio(service, stdin=None, stdout=None):
+    """Take requests on stdin and write events to stdout.
+
+    Anything else printed to stdout is sent to stderr so it cannot break the
+    framing. Jobs are cancelled when stdin closes.
+    """
+    stdin = stdin or sys.stdin
+    emit = EventWriter(stdout or sys.stdout)
+    sys.stdout = sys.stderr
+    emit({'status': 'ready'})
+    read_requests(stdin, service, emit)
+
+class ServiceHandler(socketserver.StreamRequestHandler):
+    """One client connection; its jobs are cancelled when it disconnects."""
+
+    def handle(self):
+        emit = EventWriter(io.TextIOWrapper(self.wfile, encoding='utf-8', write_through=True))
+        emit({'status': 'ready'})
+        try:
+            if not read_requests(io.TextIOWrapper(self.rfile, encoding='utf-8'), self.server.service, emit):
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+        except (OSError, UnicodeDecodeError) as e:
+            logger.info(f"Client connection closed: {e}")
+        finally:
+            self.server.service.cancel_all(emit)
+
+class ServiceServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, service):
+        self.service = service
+        super().__init__(address, ServiceHandler)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run crawl jobs sent as JSON lines.')
+    parser.add_argument('--config', type=str, default='config.json', help='Path to configuration file')
+    parser.add_argument('--listen', type=str, metavar='HOST:PORT',
+                        help='Accept jobs over TCP instead of stdin')
+    parser.add_argument('--max-jobs', type=int, help='Number of jobs crawled at the same time')
+    args = parser.parse_args()
+
+    config = ConfigManager(args.config).config
+    service = CrawlerService(config, args.max_jobs).start()
+    try:
+        if args.listen:
+            host, _, port = args.listen.rpartition(':')
+            with ServiceServer((host or '127.0.0.1', int(port)), service) as server:
+                logger.info(f"Crawler service listening on {host or '127.0.0.1'}:{server.server_address[1]}")
+                server.serve_forever()
+        else:
+            serve_stdio(service)
+    except KeyboardInterrupt:
+        logger.info("Crawler service stopped by user")
+    finally:
+        service.close()
+
+if __name__ == '__main__':
+    main()
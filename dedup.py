@@ -0,0 +1,447 @@
+"""Near-duplicate lyrics detection with MinHash and LSH.
+
+Usage: python dedup.py [--config config.json] [--source song_lyrics.jsonl]
+                       [--rebuild] [--list]
+
+Every record's `completion` is reduced to a MinHash signature over its
+word shingles, and signatures are banded into a locality-sensitive hash
+index kept in SQLite (`dedup_db`, default `<output_file>.dedup`), so a new
+record is only compared with the few records sharing a band with it.
+Records whose estimated Jaccard similarity reaches `dedup_threshold`
+(default 0.8) join the same cluster, and one copy per cluster is kept
+according to the `dedup_keep` rules. Nothing is removed from the output
+store; the exporter leaves out the copies that are not kept.
+
+main.py and the coordinator add records as they are stored. Running this
+module does a batch pass over the store, which picks up records stored
+with `dedup` disabled or by crawl_lyrics.py. Hashing uses numpy when it is
+installed and falls back to pure Python, with identical signatures.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import struct
+import sys
+import uuid
+import zlib
+from urllib.parse import urlparse
+
+from config_manager import ConfigManager
+from persistence import JSONLStore
+from record_index import iter_latest_records
+
+logger = logging.getLogger(__name__)
+
+# Signatures use universal hashing modulo a Mersenne prime small enough that
+# a * hash + b fits in 64 bits
+PRIME = (1 << 31) - 1
+
+# Tie-breakers for which copy of a cluster is kept, applied in order
+KEEP_RULES = ('site_priority', 'first', 'latest', 'longest', 'shortest')
+DEFAULT_KEEP = ['site_priority', 'longest', 'first']
+
+WORD_RE = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+
+def shingles(text, size=3):
+    """The set of `size`-word shingles of `text`, case and punctuation ignored."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+def choose_bands(num_perm, threshold, false_positive_weight=0.5):
+    """(bands, rows) for an LSH index whose S-curve best separates pairs around `threshold`."""
+    def integrate(f, a, b, steps=100):
+        width = (b - a) / steps
+        return sum(f(a + (i + 0.5) * width) for i in range(steps)) * width
+
+    best, best_error = (1, num_perm), None
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        false_positives = integrate(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+        false_negatives = integrate(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+        error = false_positive_weight * false_positives + (1 - false_positive_weight) * false_negatives
+        if best_error is None or error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+class MinHasher:
+    """MinHash signatures of `num_perm` values over word shingles.
+
+    All permutations are applied to all shingle hashes at once with numpy
+    when it is available.
+    """
+
+    def __init__(self, num_perm=128, shingle_size=3, seed=1, use_numpy=True):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        # A small LCG keeps the permutations identical with and without numpy
+        state = seed
+        params = []
+        for _ in range(2 * num_perm):
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            params.append(state >> 33)
+        self.a = [1 + p % (PRIME - 1) for p in params[:num_perm]]
+        self.b = [p % PRIME for p in params[num_perm:]]
+        self._np = None
+        if use_numpy:
+            try:
+                import numpy
+            except ImportError:
+                logger.info("numpy is not installed, computing MinHash signatures in pure Python")
+            else:
+                self._np = numpy
+                self._a = numpy.array(self.a, dtype=numpy.uint64)
+                self._b = numpy.array(self.b, dtype=numpy.uint64)
+
+    def signature(self, text):
+        """Tuple of `num_perm` ints, or None when the text has no words."""
+        hashes = [zlib.crc32(shingle.encode('utf-8')) % PRIME for shingle in shingles(text or '', self.shingle_size)]
+        if not hashes:
+            return None
+        if self._np is None:
+            return tuple(min((a * h + b) % PRIME for h in hashes) for a, b in zip(self.a, self.b))
+        np = self._np
+        signature = np.full(self.num_perm, PRIME, dtype=np.uint64)
+        values = np.array(hashes, dtype=np.uint64)
+        # Chunks bound the (shingles x permutations) matrix for very long texts
+        for start in range(0, len(values), 2048):
+            chunk = values[start:start + 2048, None]
+            np.minimum(signature, ((chunk * self._a + self._b) % PRIME).min(axis=0), out=signature)
+        return tuple(signature.tolist())
+
+def similarity(first, second):
+    """Estimated Jaccard similarity of two signatures."""
+    return sum(x == y for x, y in zip(first, second)) / len(first)
+
+class DedupIndex:
+    """SQLite-backed LSH index over record signatures, grouping near-duplicates into clusters.
+
+    Matching is transitive: a record similar to members of two clusters
+    merges them, and when a member's lyrics change the rest of its cluster
+    is split again into the groups still linked by similar lyrics. Each
+    cluster gets a fresh id. Each cluster's kept copy is chosen by the `dedup_keep`
+    rules, tried in order:
+
+    - `site_priority`: the earliest site in `dedup_site_priority`
+    - `first`: the copy indexed first
+    - `latest`: the most recently crawled copy
+    - `longest` / `shortest`: by length of the lyrics
+    """
+
+    def __init__(self, config, db_path=None, read_only=False, commit_every=100):
+        self.db_path = str(db_path or config.get('dedup_db') or
+                           config.get('output_file', 'song_lyrics.jsonl') + '.dedup')
+        self.threshold = float(config.get('dedup_threshold', 0.8))
+        self.hasher = MinHasher(int(config.get('dedup_num_perm', 128)),
+                                int(config.get('dedup_shingle_size', 3)),
+                                int(config.get('dedup_seed', 1)))
+        self.bands, self.rows = choose_bands(self.hasher.num_perm, self.threshold)
+        self.site_priority = [site.lower() for site in config.get('dedup_site_priority', [])]
+        self.keep_rules = []
+        for rule in config.get('dedup_keep', DEFAULT_KEEP):
+            if rule in KEEP_RULES:
+                self.keep_rules.append(rule)
+            else:
+                logger.warning(f"Ignoring unknown dedup_keep rule: {rule}")
+        self.read_only = read_only
+        self.commit_every = commit_every
+        self._uncommitted = 0
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+            return
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_db()
+        self._check_settings()
+
+    def _init_db(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS signatures (
+                    url TEXT PRIMARY KEY,
+                    signature BLOB NOT NULL,
+                    cluster TEXT NOT NULL,
+                    length INTEGER NOT NULL,
+                    last_crawled TEXT,
+                    seq INTEGER NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_signatures_cluster ON signatures (cluster)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_signatures_seq ON signatures (seq)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    band INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    url TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets ON buckets (band, bucket)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets_url ON buckets (url)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS clusters (
+                    cluster TEXT PRIMARY KEY,
+                    keep TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+
+    def _check_settings(self):
+        """Clear the index if it was built with other signature settings, and re-pick kept copies if the rules changed."""
+        settings = {'num_perm': self.hasher.num_perm, 'shingle_size': self.hasher.shingle_size,
+                    'seed': self.hasher.seed, 'bands': self.bands, 'rows': self.rows,
+                    'threshold': self.threshold}
+        keep = {'rules': self.keep_rules, 'site_priority': self.site_priority}
+        stored = dict(self.conn.execute("SELECT key, value FROM meta"))
+        with self.conn:
+            if stored.get('settings') not in (None, json.dumps(settings)):
+                logger.warning(f"Dedup settings changed, clearing {self.db_path}; "
+                               f"run `python dedup.py` to index the stored records again")
+                self.conn.execute("DELETE FROM signatures")
+                self.conn.execute("DELETE FROM buckets")
+                self.conn.execute("DELETE FROM clusters")
+            elif stored.get('keep') not in (None, json.dumps(keep)):
+                logger.info("Dedup keep rules changed, choosing the kept copies again")
+                for (cluster,) in self.conn.execute("SELECT cluster FROM clusters").fetchall():
+                    self._choose_keep(cluster)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('settings', ?)",
+                              (json.dumps(settings),))
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('keep', ?)", (json.dumps(keep),))
+
+    def close(self):
+        if not self.read_only:
+            self.flush()
+        self.conn.close()
+
+    def flush(self):
+        self.conn.commit()
+        self._uncommitted = 0
+
+    def _band_buckets(self, signature):
+        for band in range(self.bands):
+            values = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(struct.pack(f'<{len(values)}I', *values), digest_size=8).digest()
+            yield band, int.from_bytes(digest, 'big', signed=True)
+
+    def _rank(self, member, latest):
+        url, length, last_crawled, seq = member
+        key = []
+        for rule in self.keep_rules:
+            if rule == 'site_priority':
+                host = (urlparse(url).hostname or '').lower()
+                key.append(next((i for i, site in enumerate(self.site_priority)
+                                 if host == site or host.endswith('.' + site)), len(self.site_priority)))
+            elif rule == 'first':
+                key.append(seq)
+            elif rule == 'latest':
+                key.append(latest[url])
+            elif rule == 'longest':
+                key.append(-length)
+            elif rule == 'shortest':
+                key.append(length)
+        key.append(seq)
+        return key
+
+    def _choose_keep(self, cluster):
+        members = self.conn.execute("SELECT url, length, last_crawled, seq FROM signatures WHERE cluster = ?",
+                                    (cluster,)).fetchall()
+        if not members:
+            self.conn.execute("DELETE FROM clusters WHERE cluster = ?", (cluster,))
+            return None
+        by_latest = sorted(members, key=lambda member: member[2] or '', reverse=True)
+        latest = {member[0]: i for i, member in enumerate(by_latest)}
+        keep = min(members, key=lambda member: self._rank(member, latest))[0]
+        self.conn.execute("INSERT OR REPLACE INTO clusters (cluster, keep) VALUES (?, ?)", (cluster, keep))
+        return keep
+
+    def _split(self, cluster):
+        """Split a cluster into the groups of members still linked by similar lyrics.
+
+        The first group keeps the cluster id, the others get fresh ones.
+        """
+        members = {url: struct.unpack(f'<{len(signature) // 4}I', signature)
+                   for url, signature in self.conn.execute(
+                       "SELECT url, signature FROM signatures WHERE cluster = ? ORDER BY seq", (cluster,))}
+        remaining = list(members)
+        first = True
+        while remaining:
+            group = [remaining.pop(0)]
+            for member in group:
+                near = [other for other in remaining
+                        if similarity(members[member], members[other]) >= self.threshold]
+                remaining = [other for other in remaining if other not in near]
+                group.extend(near)
+            if first:
+                first = False
+                continue
+            new_cluster = uuid.uuid4().hex
+            self.conn.executemany("UPDATE signatures SET cluster = ? WHERE url = ?",
+                                  [(new_cluster, member) for member in group])
+            self._choose_keep(new_cluster)
+        self._choose_keep(cluster)
+
+    def _remove(self, url):
+        row = self.conn.execute("SELECT cluster FROM signatures WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return
+        self.conn.execute("DELETE FROM signatures WHERE url = ?", (url,))
+        self.conn.execute("DELETE FROM buckets WHERE url = ?", (url,))
+        self._split(row[0])
+
+    def add(self, record):
+        """Index a stored record and return the url kept in its place, or None if it is kept itself."""
+        url = record.get('url')
+        if not url:
+            return None
+        text = record.get('completion') or ''
+        row = self.conn.execute("SELECT signature, cluster, seq, last_crawled FROM signatures WHERE url = ?",
+                                (url,)).fetchone()
+        if row is not None and row[3] == record.get('last_crawled') and row[3] is not None:
+            # Already indexed from this very record
+            keep = self.keep_url(url)
+            return keep if keep != url else None
+        signature = self.hasher.signature(text)
+        if signature is None:
+            self._remove(url)
+            self._committed()
+            return None
+        packed = struct.pack(f'<{len(signature)}I', *signature)
+        if row is not None and row[0] == packed:
+            # Recrawled with the same lyrics: refresh what the keep rules look at
+            self.conn.execute("UPDATE signatures SET length = ?, last_crawled = ? WHERE url = ?",
+                              (len(text), record.get('last_crawled'), url))
+            keep = self._choose_keep(row[1])
+            self._committed()
+            return keep if keep != url else None
+
+        if row is not None:
+            seq = row[2]
+            self._remove(url)
+        else:
+            seq = self.conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM signatures").fetchone()[0]
+        buckets = list(self._band_buckets(signature))
+        condition = ' OR '.join(['(band = ? AND bucket = ?)'] * len(buckets))
+        candidates = self.conn.execute(f"""
+            SELECT url, signature, cluster FROM signatures WHERE url IN (
+                SELECT url FROM buckets WHERE {condition}
+            )
+        """, [value for bucket in buckets for value in bucket]).fetchall()
+
+        scores = {}
+        for other_url, other_signature, cluster in candidates:
+            score = similarity(signature, struct.unpack(f'<{len(signature)}I', other_signature))
+            if score >= self.threshold:
+                scores[cluster] = max(score, scores.get(cluster, 0.0))
+        # The cluster of the closest match absorbs any others
+        clusters = sorted(scores, key=scores.get, reverse=True)
+        cluster = clusters[0] if clusters else uuid.uuid4().hex
+        for other in clusters[1:]:
+            self.conn.execute("UPDATE signatures SET cluster = ? WHERE cluster = ?", (cluster, other))
+            self.conn.execute("DELETE FROM clusters WHERE cluster = ?", (other,))
+        self.conn.execute("""
+            INSERT INTO signatures (url, signature, cluster, length, last_crawled, seq)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (url, packed, cluster, len(text), record.get('last_crawled'), seq))
+        self.conn.executemany("INSERT INTO buckets (band, bucket, url) VALUES (?, ?, ?)",
+                              [(band, bucket, url) for band, bucket in buckets])
+        keep = self._choose_keep(cluster)
+        self._committed()
+        return keep if keep != url else None
+
+    def _committed(self):
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.flush()
+
+    def keep_url(self, url):
+        """The url kept for `url`'s cluster; `url` itself if it is not a near-duplicate or not indexed."""
+        row = self.conn.execute("""
+            SELECT c.keep FROM signatures s JOIN clusters c ON c.cluster = s.cluster WHERE s.url = ?
+        """, (url,)).fetchone()
+        return row[0] if row else url
+
+    def is_duplicate(self, url):
+        return self.keep_url(url) != url
+
+    def duplicates(self):
+        """Yield (url, kept url) for every copy that is not kept."""
+        yield from self.conn.execute("""
+            SELECT s.url, c.keep FROM signatures s JOIN clusters c ON c.cluster = s.cluster
+            WHERE s.url != c.keep ORDER BY c.keep, s.seq
+        """)
+
+    def stats(self):
+        records = self.conn.execute("SELECT COUNT(*) FROM signatures").fetchone()[0]
+        clusters = self.conn.execute("""
+            SELECT COUNT(*) FROM (SELECT cluster FROM signatures GROUP BY cluster HAVING COUNT(*) > 1)
+        """).fetchone()[0]
+        duplicates = self.conn.execute("""
+            SELECT COUNT(*) FROM signatures s JOIN clusters c ON c.cluster = s.cluster WHERE s.url != c.keep
+        """).fetchone()[0]
+        return {'records': records, 'clusters': clusters, 'duplicates': duplicates}
+
+    def clear(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM signatures")
+            self.conn.execute("DELETE FROM buckets")
+            self.conn.execute("DELETE FROM clusters")
+
+    def index_store(self, store, rebuild=False):
+        """Batch pass: add the latest record of every url in a JSONLStore. Returns the number of records."""
+        if rebuild:
+            self.clear()
+        count = 0
+        for record in iter_latest_records(store):
+            self.add(record)
+            count += 1
+        self.flush()
+        return count
+
+def open_dedup(config):
+    """Create the DedupIndex described by the config, or None if it is disabled."""
+    if not config.get('dedup', True):
+        return None
+    try:
+        return DedupIndex(config)
+    except sqlite3.Error as e:
+        logger.error(f"Failed to open dedup index: {e}")
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Find near-duplicate lyrics in the output store.')
+    parser.add_argument('--config', type=str, default='config.json', help='Path to configuration file')
+    parser.add_argument('--source', type=str, help='JSONL store to index (default: output_file)')
+    parser.add_argument('--rebuild', action='store_true', help='Discard the index and build it again')
+    parser.add_argument('--list', action='store_true', help='Print every duplicate and the copy kept instead')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    config = ConfigManager(args.config).config
+    if args.source:
+        config['output_file'] = args.source
+    source = config.get('output_file', 'song_lyrics.jsonl')
+    if not source.endswith('.jsonl'):
+        logger.error(f"Deduplication needs a JSONL store, not {source}")
+        sys.exit(1)
+    dedup = DedupIndex(config)
+    try:
+        count = dedup.index_store(JSONLStore(source), rebuild=args.rebuild)
+        logger.info(f"Indexed {count} records: {dedup.stats()}")
+        if args.list:
+            for url, keep in dedup.duplicates():
+                print(f"{url}\t{keep}")
+    finally:
+        dedup.close()
+
+if __name__ == '__main__':
+    main()
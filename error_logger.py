@@ -1,52 +1,134 @@
+import atexit
+import queue
 import sqlite3
 import logging
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
 class ErrorLogger:
+    """SQLite error log written in batches by a background thread.
+
+    `log_to_db` only puts the row on a queue, so logging an error never
+    waits for the disk. A writer thread owns the one long-lived connection
+    (in WAL mode) and inserts queued rows in a single transaction once
+    `error_batch_size` rows are waiting or `error_flush_interval` seconds
+    have passed. `flush` waits until everything logged so far is written;
+    `close` flushes and stops the writer, and runs automatically at exit.
+    """
+
     def __init__(self, config):
         self.config = config
-        self.db_path = Path('crawler_errors.db')
+        self.db_path = Path(config.get('error_db', 'crawler_errors.db'))
+        self.batch_size = int(config.get('error_batch_size', 100))
+        self.flush_interval = float(config.get('error_flush_interval', 1.0))
+        self.conn = None
+        self._queue = queue.Queue()
+        self._closed = False
         self._init_error_db()
+        self._writer = threading.Thread(target=self._write_loop, name='error-log-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
 
     def _init_error_db(self):
         try:
-            conn = sqlite3.connect(str(self.db_path))
-            c = conn.cursor()
-            c.execute("""
-                CREATE TABLE IF NOT EXISTS error_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    error_type TEXT NOT NULL,
-                    url TEXT,
-                    message TEXT NOT NULL,
-                    details TEXT
-                )
-            """)
-            conn.commit()
-            conn.close()
+            self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            with self.conn:
+                self.conn.execute("""
+                    CREATE TABLE IF NOT EXISTS error_logs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        timestamp TEXT NOT NULL,
+                        error_type TEXT NOT NULL,
+                        url TEXT,
+                        message TEXT NOT NULL,
+                        details TEXT
+                    )
+                """)
+                self.conn.execute("CREATE INDEX IF NOT EXISTS idx_error_logs_url ON error_logs (url)")
+                self.conn.execute("CREATE INDEX IF NOT EXISTS idx_error_logs_error_type ON error_logs (error_type)")
+                self.conn.execute("CREATE INDEX IF NOT EXISTS idx_error_logs_timestamp ON error_logs (timestamp)")
         except Exception as e:
             logger.error(f"Failed to initialize database: {e}")
 
     def log_to_db(self, error_type, url, message, details=None):
+        if self._closed:
+            logger.error(f"Error log is closed, dropping: {error_type} {url} {message}")
+            return
+        self._queue.put((datetime.now().isoformat(), error_type, url, message, details))
+
+    def _write(self, rows):
+        if not rows or self.conn is None:
+            return
         try:
-            conn = sqlite3.connect(str(self.db_path))
-            c = conn.cursor()
-            c.execute("""
-                INSERT INTO error_logs (timestamp, error_type, url, message, details)
-                VALUES (?, ?, ?, ?, ?)
-            """, (
-                datetime.now().isoformat(),
-                error_type,
-                url,
-                message,
-                details
-            ))
-            conn.commit()
+            with self.conn:
+                self.conn.executemany("""
+                    INSERT INTO error_logs (timestamp, error_type, url, message, details)
+                    VALUES (?, ?, ?, ?, ?)
+                """, rows)
         except Exception as e:
-            logger.error(f"Failed to log to database: {e}")
-        finally:
-            if 'conn' in locals():
-                conn.close()
\ No newline at end of file
+            logger.error(f"Failed to log {len(rows)} errors to database: {e}")
+        rows.clear()
+
+    def _write_loop(self):
+        rows = []
+        waiters = []
+        deadline = None
+        running = True
+        while running:
+            timeout = None if deadline is None else max(0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                running = False
+            elif isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item:
+                rows.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            # Write when the batch is full, the oldest row is due, or someone waits
+            if (not running or waiters or len(rows) >= self.batch_size
+                    or (deadline is not None and time.monotonic() >= deadline)):
+                self._write(rows)
+                deadline = None
+                for waiter in waiters:
+                    waiter.set()
+                waiters.clear()
+
+    def flush(self, timeout=None):
+        """Block until every error logged so far has been written."""
+        if self._closed or not self._writer.is_alive():
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        atexit.unregister(self.close)
+
+_default_logger = None
+_default_lock = threading.Lock()
+
+def get_error_logger(config=None):
+    """Return the process-wide ErrorLogger, creating it on first use."""
+    global _default_logger
+    with _default_lock:
+        if _default_logger is None or _default_logger._closed:
+            _default_logger = ErrorLogger(config or {})
+        return _default_logger
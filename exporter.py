@@ -0,0 +1,354 @@
+"""Export the crawled lyrics as tuning datasets.
+
+Usage: python exporter.py [--config config.json] [--source song_lyrics.jsonl]
+                          [--format csv|jsonl|parquet] [--incremental]
+                          [--output FILE] [--shard-mb N] [--export-dir DIR]
+                          [--keep-duplicates]
+
+Records are streamed from the JSONL output store through its URL index,
+one at a time and in file order, so memory use does not grow with the
+corpus, even while a crawl is appending to the store. Only the latest record of each URL is exported, with the
+`export_fields` columns (default `title, artist, prompt, completion`, the
+layout of DataFormatter.format_data); records without lyrics are skipped,
+and so are near-duplicates flagged in the source's dedup index (see
+dedup.py) unless `export_dedup` is false or `--keep-duplicates` is given.
+
+Output goes to `export_dir` (default `exports`) as shards of at most
+`export_shard_mb` megabytes (default 100), named
+`<name>-<timestamp>-00000.<format>`, plus a `.manifest.json` listing the
+shards. `--output` writes one unsharded file instead, through a temporary
+file that replaces it once the export is complete. Parquet needs
+pyarrow and is written in row groups of `export_row_group_size` rows.
+
+`--incremental` exports only records crawled since the previous export of
+the same source and format; the high-water mark of `last_crawled` is kept
+in `export_state_file` (default `<export_dir>/export_state.json`). Pages
+that were recrawled unchanged count as changed. A legacy JSON array source
+(`song_lyrics.json`) is supported but is loaded into memory.
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+from config_manager import ConfigManager
+from dedup import DedupIndex
+from persistence import JSONLStore, Persistence
+from record_index import iter_latest_records
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ['title', 'artist', 'prompt', 'completion']
+
+class CSVShardWriter:
+    extension = 'csv'
+
+    def __init__(self, path, fields, config=None):
+        self.path = path
+        self.fields = fields
+        self._file = open(path, 'wb')
+        self._buffer = io.StringIO()
+        self._csv = csv.writer(self._buffer)
+        self.bytes = 0
+        self._write_row(fields)
+
+    def _write_row(self, row):
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._csv.writerow(row)
+        data = self._buffer.getvalue().encode('utf-8')
+        self._file.write(data)
+        self.bytes += len(data)
+
+    def write(self, record):
+        self._write_row([record.get(field) for field in self.fields])
+
+    def close(self):
+        self._file.close()
+
+class JSONLShardWriter:
+    extension = 'jsonl'
+
+    def __init__(self, path, fields, config=None):
+        self.path = path
+        self.fields = fields
+        self._file = open(path, 'wb')
+        self.bytes = 0
+
+    def write(self, record):
+        line = json.dumps({field: record.get(field) for field in self.fields},
+                          ensure_ascii=False).encode('utf-8') + b'\n'
+        self._file.write(line)
+        self.bytes += len(line)
+
+    def close(self):
+        self._file.close()
+
+class ParquetShardWriter:
+    """Columnar output through pyarrow, buffering one row group at a time.
+
+    `bytes` is the size written so far plus the raw size of the buffered
+    rows, so shards may end up somewhat smaller than the cap after
+    compression.
+    """
+
+    extension = 'parquet'
+
+    def __init__(self, path, fields, config=None):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("pyarrow is required for Parquet export") from None
+        config = config or {}
+        self.path = path
+        self.fields = fields
+        self.row_group_size = int(config.get('export_row_group_size', 10000))
+        self._pa = pyarrow
+        schema = pyarrow.schema([(field, pyarrow.string()) for field in fields])
+        self._writer = pyarrow.parquet.ParquetWriter(path, schema,
+                                                     compression=config.get('export_compression', 'zstd'))
+        self._columns = {field: [] for field in fields}
+        self._rows = 0
+        self._pending_bytes = 0
+        self.bytes = 0
+
+    def write(self, record):
+        for field in self.fields:
+            value = record.get(field)
+            value = None if value is None else str(value)
+            self._columns[field].append(value)
+            self._pending_bytes += len(value) if value else 0
+        self._rows += 1
+        if self._rows >= self.row_group_size:
+            self._flush()
+        else:
+            self.bytes = self._written + self._pending_bytes
+
+    @property
+    def _written(self):
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(self._pa.table(self._columns))
+            self._columns = {field: [] for field in self.fields}
+            self._rows = 0
+            self._pending_bytes = 0
+        self.bytes = self._written
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+WRITERS = {
+    CSVShardWriter.extension: CSVShardWriter,
+    JSONLShardWriter.extension: JSONLShardWriter,
+    ParquetShardWriter.extension: ParquetShardWriter,
+}
+
+class ShardedOutput:
+    """Writes records to `<prefix>-00000.<ext>`, `-00001`, ... of at most `max_bytes` each.
+
+    With `path` set, everything goes to that one file instead. It is written
+    as `<path>.tmp` and moved into place on close, so a reader of `path`
+    (such as the web interface's download) never sees a partial export.
+    """
+
+    def __init__(self, writer_class, fields, prefix=None, max_bytes=None, path=None, config=None):
+        self.writer_class = writer_class
+        self.fields = fields
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.path = path
+        self.config = config
+        self.files = []
+        self._writer = None
+
+    def _next_path(self):
+        if self.path:
+            return f"{self.path}.tmp"
+        return f"{self.prefix}-{len(self.files):05d}.{self.writer_class.extension}"
+
+    def write(self, record):
+        if self._writer is None:
+            self._writer = self.writer_class(self._next_path(), self.fields, self.config)
+            self.files.append(self.path or self._writer.path)
+        self._writer.write(record)
+        if not self.path and self.max_bytes and self._writer.bytes >= self.max_bytes:
+            self._writer.close()
+            self._writer = None
+
+    def close(self, discard=False):
+        """Finish the output; with `discard`, a single output file is left as it was."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif not self.files and not discard:
+            # An empty export still produces a file with just the header/schema
+            writer = self.writer_class(self._next_path(), self.fields, self.config)
+            writer.close()
+            self.files.append(self.path or writer.path)
+        if self.path and os.path.exists(self._next_path()):
+            if discard:
+                os.remove(self._next_path())
+            else:
+                os.replace(self._next_path(), self.path)
+
+class Exporter:
+    def __init__(self, config):
+        self.config = config
+        self.export_dir = config.get('export_dir', 'exports')
+        self.fields = list(config.get('export_fields', FIELDS))
+        self.shard_mb = float(config.get('export_shard_mb', 100))
+        self.state_file = config.get('export_state_file') or os.path.join(self.export_dir, 'export_state.json')
+        self.dedup = config.get('export_dedup', True)
+
+    def load_state(self):
+        try:
+            with open(self.state_file, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable export state {self.state_file}: {e}")
+            return {}
+
+    def save_state(self, state):
+        directory = os.path.dirname(os.path.abspath(self.state_file))
+        os.makedirs(directory, exist_ok=True)
+        temp_file = f"{self.state_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2)
+        os.replace(temp_file, self.state_file)
+
+    def iter_source(self, source, since=None):
+        """Stream the latest record of each URL in `source`, crawled after `since` if given."""
+        if source.endswith('.jsonl'):
+            yield from iter_latest_records(JSONLStore(source), since)
+            return
+        # Legacy JSON array: loaded whole, later records of a URL replace earlier ones
+        latest = {}
+        for record in Persistence(self.config).iter_existing_data(source):
+            latest[record.get('url')] = record
+        for record in latest.values():
+            if since is None or (record.get('last_crawled') or '') > since:
+                yield record
+
+    def open_dedup(self, source):
+        """Read-only view of the dedup index built for `source`, or None if there is none."""
+        db_path = self.config.get('dedup_db') or f"{source}.dedup"
+        if not self.dedup or not source.endswith('.jsonl') or not os.path.exists(db_path):
+            return None
+        return DedupIndex(self.config, db_path, read_only=True)
+
+    def export(self, source, fmt='csv', incremental=False, output=None, name=None, records=None):
+        """Export `source` and return a manifest of what was written.
+
+        `records` can replace the records read from `source`, e.g. to export
+        a filtered stream; the watermark is still tracked per source.
+        """
+        writer_class = WRITERS.get(fmt)
+        if writer_class is None:
+            raise ValueError(f"Unknown export format: {fmt}")
+        key = f"{os.path.abspath(source)}:{fmt}"
+        state = self.load_state()
+        since = state.get(key) if incremental else None
+        started = datetime.now()
+        name = name or os.path.splitext(os.path.basename(source))[0]
+        prefix = os.path.join(self.export_dir, f"{name}-{started.strftime('%Y%m%dT%H%M%S')}")
+        if output:
+            directory = os.path.dirname(os.path.abspath(output))
+        else:
+            directory = self.export_dir
+        os.makedirs(directory, exist_ok=True)
+
+        out = ShardedOutput(writer_class, self.fields, prefix, int(self.shard_mb * 1024 * 1024),
+                            path=output, config=self.config)
+        exported = skipped = duplicates = 0
+        watermark = since
+        dedup = self.open_dedup(source)
+        try:
+            for record in (records if records is not None else self.iter_source(source, since)):
+                last_crawled = record.get('last_crawled')
+                if last_crawled and (watermark is None or last_crawled > watermark):
+                    watermark = last_crawled
+                if not record.get('completion'):
+                    skipped += 1
+                    continue
+                if dedup is not None and dedup.is_duplicate(record.get('url')):
+                    duplicates += 1
+                    continue
+                out.write(record)
+                exported += 1
+        except BaseException:
+            out.close(discard=True)
+            raise
+        else:
+            out.close()
+        finally:
+            if dedup is not None:
+                dedup.close()
+
+        manifest = {
+            'source': source,
+            'format': fmt,
+            'fields': self.fields,
+            'incremental': incremental,
+            'since': since,
+            'watermark': watermark,
+            'records': exported,
+            'skipped': skipped,
+            'duplicates': duplicates,
+            'files': out.files,
+            'exported_at': started.isoformat()
+        }
+        if not output:
+            with open(f"{prefix}.manifest.json", 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2)
+        if watermark is not None:
+            state[key] = watermark
+            self.save_state(state)
+        logger.info(f"Exported {exported} records from {source} to {len(out.files)} {fmt} file(s)"
+                    + (f" (changed since {since})" if since else ""))
+        return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description='Export crawled lyrics as CSV, JSONL or Parquet.')
+    parser.add_argument('--config', type=str, default='config.json', help='Path to configuration file')
+    parser.add_argument('--source', type=str, help='Output store to export (default: output_file)')
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv', help='Export format')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only export records crawled since the last export')
+    parser.add_argument('--output', type=str, help='Write a single file instead of shards in export_dir')
+    parser.add_argument('--shard-mb', type=float, help='Maximum shard size in megabytes')
+    parser.add_argument('--export-dir', type=str, help='Directory for the shards')
+    parser.add_argument('--keep-duplicates', action='store_true',
+                        help='Export near-duplicates flagged by dedup.py too')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(name)s - %(message)s')
+    config = ConfigManager(args.config).config
+    if args.shard_mb:
+        config['export_shard_mb'] = args.shard_mb
+    if args.export_dir:
+        config['export_dir'] = args.export_dir
+    if args.keep_duplicates:
+        config['export_dedup'] = False
+    source = args.source or config.get('output_file', 'song_lyrics.jsonl')
+    if not os.path.exists(source):
+        logger.error(f"Nothing to export: {source} does not exist")
+        sys.exit(1)
+    try:
+        manifest = Exporter(config).export(source, args.format, args.incremental, args.output)
+    except ImportError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    print(json.dumps(manifest, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+import logging
+import threading
+from urllib.parse import urlparse
+
+from http_request import FetchResult
+from metrics import time_stage
+
+logger = logging.getLogger(__name__)
+
+class FetchStrategy:
+    """Static-first fetching that escalates to JavaScript rendering on demand.
+
+    Every page is first fetched with a plain HTTP request and handed to
+    `extract(html, url)`. Only when `has_content` says the extraction missed
+    (typically because the lyrics selectors found nothing) is the page
+    rendered with the JS renderer. Once `js_escalation_threshold` pages of a
+    domain in a row needed rendering, the domain is marked as needing JS and
+    its pages are rendered straight away, skipping the wasted static fetch.
+    Every `js_recheck_every` pages such a domain is probed statically again
+    and goes back to static fetching if that works.
+
+    `fetch` has the same signature as HTTPRequest.fetch, so a strategy can
+    stand in for the HTTP request handler of an AsyncFetcher. Without an
+    `extract` function the strategy only picks static or rendered fetching
+    per domain and leaves the content check and escalation to the caller
+    (see CrawlPipeline), which reports back through `record_static_hit` and
+    `record_escalation`.
+    """
+
+    def __init__(self, http_request, extract=None, renderer=None, config=None, has_content=bool):
+        config = config or {}
+        self.http_request = http_request
+        self.extract = extract
+        self.renderer = renderer
+        self.has_content = has_content
+        self.escalation_threshold = int(config.get('js_escalation_threshold', 2))
+        self.recheck_every = int(config.get('js_recheck_every', 50))
+        self.js_domains = {}
+        self._escalations = {}
+        self._lock = threading.Lock()
+        self.stats = {'static': 0, 'escalated': 0, 'rendered_first': 0, 'not_modified': 0}
+
+    def needs_js(self, domain):
+        return domain in self.js_domains
+
+    def _render_first(self, domain):
+        with self._lock:
+            if domain not in self.js_domains:
+                return False
+            self.js_domains[domain] += 1
+            # Now and then try the cheap path again in case the site changed
+            return self.js_domains[domain] % self.recheck_every != 0
+
+    def record_static_hit(self, domain):
+        with self._lock:
+            self._escalations.pop(domain, None)
+            if self.js_domains.pop(domain, None) is not None:
+                logger.info(f"{domain} serves its content without JavaScript again")
+
+    def record_escalation(self, domain):
+        with self._lock:
+            count = self._escalations.get(domain, 0) + 1
+            self._escalations[domain] = count
+            if count >= self.escalation_threshold and domain not in self.js_domains:
+                self.js_domains[domain] = 0
+                logger.info(f"{domain} needs JavaScript rendering; rendering its pages directly")
+
+    def render(self, url):
+        """Render a page with the renderer, returning None if there is none."""
+        if self.renderer is None:
+            return None
+        with time_stage('render'):
+            return self.renderer.render(url)
+
+    def _render(self, url):
+        html = self.render(url)
+        if html is None or self.extract is None:
+            return html, None
+        return html, self.extract(html, url)
+
+    def get(self, url, render_js=False):
+        return self.fetch(url, render_js).html
+
+    def fetch(self, url, render_js=False):
+        """Fetch and extract a page, rendering it only if it has to be.
+
+        Returns a FetchResult whose `extracted` holds the return value of
+        `extract` for the HTML returned, and `rendered` tells whether that
+        HTML came from the renderer. Pages answered with 304 Not Modified
+        are returned without being extracted.
+        """
+        domain = urlparse(url).netloc
+        rendered_first = self.renderer is not None and (render_js or self._render_first(domain))
+        if rendered_first:
+            html, extracted = self._render(url)
+            if html is not None and (self.extract is None or self.has_content(extracted)):
+                self.stats['rendered_first'] += 1
+                return FetchResult(html, False, extracted, True)
+
+        result = self.http_request.fetch(url)
+        if result.not_modified:
+            self.stats['not_modified'] += 1
+            return result
+        if result.html is None or self.extract is None:
+            return result
+        extracted = self.extract(result.html, url)
+        if self.has_content(extracted):
+            self.stats['static'] += 1
+            self.record_static_hit(domain)
+            return FetchResult(result.html, False, extracted, False)
+
+        if rendered_first:
+            return FetchResult(result.html, False, extracted, False)
+        html, rendered_extracted = self._render(url)
+        if html is not None and self.has_content(rendered_extracted):
+            self.stats['escalated'] += 1
+            self.record_escalation(domain)
+            return FetchResult(html, False, rendered_extracted, True)
+        return FetchResult(result.html, False, extracted, False)
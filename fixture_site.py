@@ -0,0 +1,219 @@
+"""Local lyrics site serving synthetic pages for benchmarks and tests.
+
+Usage: python fixture_site.py [--layout genius|default] [--pages N] [--page-kb N]
+                              [--latency SECONDS] [--jitter FRACTION] [--port N]
+
+Pages come in two layouts: `genius` mimics genius.com markup (hashed
+styled-component class names, a large preloaded-state script, lyrics split
+over several containers) and `default` matches the `default` selectors of
+config.json. Each page is padded with ads and related-song lists to about
+`page_kb` kilobytes, and every response is delayed by `latency` seconds,
+varied by up to `jitter` times that. Pages are deterministic, carry an
+ETag and answer If-None-Match with 304 Not Modified.
+"""
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("love night heart fire dream road rain light dance blue gold city home "
+         "wild river shadow morning silver storm summer echo stone ocean").split()
+
+def _line(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 9))).capitalize()
+
+def _padding(rng, n):
+    related = ''.join(f'<li><a href="/song/{rng.randint(1, 10 ** 6)}">{_line(rng)}</a></li>' for _ in range(10))
+    return (f'<div class="ad-slot"><script>window.ads = window.ads || []; ads.push({{slot: {n}}});</script>'
+            f'<iframe src="/ads/{n}"></iframe><ul class="related">{related}</ul></div>')
+
+def song(n, seed=0):
+    """(title, artist, lyric lines) of page `n`."""
+    rng = random.Random(f"{seed}-{n}")
+    title = f"{_line(rng)} {n}"
+    artist = f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS).capitalize()}"
+    lines = [_line(rng) for _ in range(rng.randint(24, 48))]
+    return title, artist, lines
+
+def _genius_page(title, artist, lines):
+    half = len(lines) // 2
+    containers = ''.join(
+        f'<div data-lyrics-container="true" class="Lyrics__Container-sc-1ynbvzw-6 YYrds">'
+        f'[Verse {i + 1}]<br/>{"<br/>".join(part)}</div>'
+        for i, part in enumerate((lines[:half], lines[half:]))
+    )
+    return (
+        f'<!DOCTYPE html><html><head><title>{artist} - {title} Lyrics | Genius Lyrics</title>'
+        f'<meta property="og:title" content="{title}"/><meta property="og:site_name" content="Genius"/>'
+        f'<style>.SongHeader__Title{{font-size:2rem}}</style>{{state}}</head>'
+        f'<body><div id="application"><header class="Header__Container-sc-1xbz6yk-0">Genius</header>'
+        f'<div class="SongHeader__Container-sc-1b7aqpg-0">'
+        f'<h1 class="SongHeader__Title-sc-1b7aqpg-7 jQiTNQ"><span>{title}</span></h1>'
+        f'<a class="SongHeader__Artist-sc-1b7aqpg-9 hsyHYP" href="/artists/{artist.replace(" ", "-")}">{artist}</a>'
+        f'</div><div id="lyrics-root">{containers}</div>{{padding}}</div></body></html>'
+    )
+
+def _default_page(title, artist, lines):
+    return (
+        f'<!DOCTYPE html><html><head><title>{title} - {artist}</title>'
+        f'<meta property="og:title" content="{title}"/>{{state}}</head>'
+        f'<body><div class="song-header"><h1 class="song-title">{title}</h1>'
+        f'<h2 class="artist-name">{artist}</h2></div>'
+        f'<div class="lyrics">{"<br/>".join(lines)}</div>{{padding}}</body></html>'
+    )
+
+LAYOUTS = {'genius': _genius_page, 'default': _default_page}
+
+def build_page(layout, n, page_kb=50, seed=0):
+    """Return the HTML of page `n`, padded to roughly `page_kb` kilobytes."""
+    title, artist, lines = song(n, seed)
+    template = LAYOUTS[layout](title, artist, lines)
+    rng = random.Random(f"{seed}-{n}-padding")
+    target = page_kb * 1024
+    # Split the padding between a preloaded-state script and ad blocks
+    state_items = max(0, (target // 2 - len(template)) // 40)
+    state = ('<script>window.__PRELOADED_STATE__ = JSON.parse(\'['
+             + ','.join('{"id": %d, "type": "referent"}' % i for i in range(state_items))
+             + ']\');</script>')
+    blocks = []
+    size = len(template) + len(state)
+    while size < target:
+        block = _padding(rng, len(blocks))
+        blocks.append(block)
+        size += len(block)
+    return template.replace('{state}', state).replace('{padding}', ''.join(blocks))
+
+class FixtureSite:
+    """Threaded local HTTP server for one site of synthetic lyrics pages.
+
+    Page `n` is served at /songs/<n>; anything else is a 404.
+    """
+
+    def __init__(self, layout='default', pages=100, page_kb=50, latency=0.0, jitter=0.0,
+                 host='127.0.0.1', port=0, seed=0):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout: {layout}")
+        self.layout = layout
+        self.pages = pages
+        self.page_kb = page_kb
+        self.latency = latency
+        self.jitter = jitter
+        self.seed = seed
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self.requests = 0
+        self.not_modified = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def netloc(self):
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def url(self, n):
+        return f"http://{self.netloc}/songs/{n}"
+
+    def urls(self):
+        return [self.url(n) for n in range(self.pages)]
+
+    def page(self, n):
+        with self._lock:
+            body = self._cache.get(n)
+        if body is None:
+            body = build_page(self.layout, n, self.page_kb, self.seed).encode('utf-8')
+            with self._lock:
+                self._cache[n] = body
+        return body
+
+    def _delay(self):
+        if not self.latency:
+            return 0.0
+        with self._lock:
+            spread = self._rng.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency * (1 + spread))
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with site._lock:
+                    site.requests += 1
+                time.sleep(site._delay())
+                prefix, _, number = self.path.partition('/songs/')
+                if prefix or not number.isdigit() or int(number) >= site.pages:
+                    self._send(404, b'Not found')
+                    return
+                n = int(number)
+                etag = f'"{site.layout}-{site.seed}-{site.page_kb}-{n}"'
+                if self.headers.get('If-None-Match') == etag:
+                    with site._lock:
+                        site.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self._send(200, site.page(n), etag)
+
+            def _send(self, status, body, etag=None):
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05},
+                                            name=f'fixture-site-{self.layout}', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self.server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve synthetic lyrics pages.')
+    parser.add_argument('--layout', choices=sorted(LAYOUTS), default='default')
+    parser.add_argument('--pages', type=int, default=100, help='Number of pages')
+    parser.add_argument('--page-kb', type=int, default=50, help='Approximate size of each page')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds before each response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random latency variation, as a fraction')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    site = FixtureSite(args.layout, args.pages, args.page_kb, args.latency, args.jitter, port=args.port)
+    print(f"Serving {args.pages} {args.layout} pages at http://{site.netloc}/songs/0 .. /songs/{args.pages - 1}")
+    try:
+        site.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        site.server.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+import logging
+import sqlite3
+import time
+from itertools import islice
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+PENDING = 'pending'
+IN_PROGRESS = 'in_progress'
+DONE = 'done'
+FAILED = 'failed'
+
+class Frontier:
+    """Persistent crawl frontier backed by SQLite.
+
+    Every URL is stored once with its state, priority, domain and the time
+    it next becomes eligible for crawling. Selecting the next batch is an
+    indexed query rather than a scan, and because state lives on disk a
+    restarted crawl resumes where it stopped instead of starting over.
+    """
+
+    def __init__(self, db_path='crawler_frontier.db', max_attempts=3, retry_delay=300):
+        self.db_path = str(db_path)
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_db()
+        self.allowed_domains = self._load_domains()
+
+    def _init_db(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS frontier (
+                    url TEXT PRIMARY KEY,
+                    domain TEXT NOT NULL,
+                    state TEXT NOT NULL DEFAULT 'pending',
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    next_eligible REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL
+                )
+            """)
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_frontier_ready
+                ON frontier (state, priority DESC, next_eligible)
+            """)
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_frontier_domain
+                ON frontier (domain, state)
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS domains (
+                    domain TEXT PRIMARY KEY
+                )
+            """)
+
+    def _load_domains(self):
+        return {row[0] for row in self.conn.execute("SELECT domain FROM domains")}
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def add_domains(self, domains):
+        new_domains = set(domains) - self.allowed_domains
+        if new_domains:
+            with self.conn:
+                self.conn.executemany("INSERT OR IGNORE INTO domains (domain) VALUES (?)",
+                                      [(domain,) for domain in new_domains])
+            self.allowed_domains.update(new_domains)
+
+    def is_allowed_domain(self, url):
+        try:
+            return urlparse(url).netloc in self.allowed_domains
+        except Exception:
+            return False
+
+    def add_urls(self, urls, priority=0, seed=False, chunk_size=10000):
+        """Queue URLs that are not already known. Returns the number added.
+
+        `urls` may be any iterable, including a generator over a seed file
+        with millions of lines; it is consumed in chunks. Seed URLs also add
+        their domain to the allowed list, other URLs must already be on it.
+        """
+        added = 0
+        urls = iter(urls)
+        while True:
+            chunk = list(islice(urls, chunk_size))
+            if not chunk:
+                break
+            parsed = []
+            for url in chunk:
+                url = url.strip()
+                try:
+                    domain = urlparse(url).netloc
+                except Exception:
+                    domain = ''
+                if not domain:
+                    logger.error(f"Invalid URL format: {url}")
+                    continue
+                parsed.append((url, domain))
+            if seed:
+                self.add_domains(domain for _, domain in parsed)
+            rows = [(url, domain, priority) for url, domain in parsed
+                    if domain in self.allowed_domains]
+            with self.conn:
+                before = self.conn.total_changes
+                self.conn.executemany("""
+                    INSERT OR IGNORE INTO frontier (url, domain, priority)
+                    VALUES (?, ?, ?)
+                """, rows)
+                added += self.conn.total_changes - before
+        return added
+
+    def add_seed_file(self, path, priority=0):
+        """Stream a file of URLs, one per line, into the frontier."""
+        with open(path, 'r', encoding='utf-8') as f:
+            return self.add_urls((line for line in f if line.strip()), priority=priority, seed=True)
+
+    def dequeue(self, batch_size=1, now=None):
+        """Claim up to `batch_size` eligible URLs, highest priority first."""
+        now = time.time() if now is None else now
+        with self.conn:
+            # Take the write lock before selecting so that several processes
+            # sharing the database never claim the same URL.
+            self.conn.execute("BEGIN IMMEDIATE")
+            rows = self.conn.execute("""
+                SELECT url FROM frontier
+                WHERE state = ? AND next_eligible <= ?
+                ORDER BY priority DESC, next_eligible
+                LIMIT ?
+            """, (PENDING, now, batch_size)).fetchall()
+            urls = [row[0] for row in rows]
+            self.conn.executemany("""
+                UPDATE frontier SET state = ?, updated_at = ? WHERE url = ?
+            """, [(IN_PROGRESS, now, url) for url in urls])
+        return urls
+
+    def dequeue_domain(self, batch_size=1, exclude=(), now=None):
+        """Claim up to `batch_size` eligible URLs of a single domain.
+
+        The domain is the one holding the highest-priority eligible URL,
+        skipping the domains in `exclude`. Returns (domain, urls), or
+        (None, []) when no other domain has eligible URLs.
+        """
+        now = time.time() if now is None else now
+        exclude = list(exclude)
+        placeholders = ','.join('?' * len(exclude))
+        not_excluded = f"AND domain NOT IN ({placeholders})" if exclude else ""
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute(f"""
+                SELECT domain FROM frontier
+                WHERE state = ? AND next_eligible <= ? {not_excluded}
+                ORDER BY priority DESC, next_eligible
+                LIMIT 1
+            """, (PENDING, now, *exclude)).fetchone()
+            if row is None:
+                return None, []
+            domain = row[0]
+            rows = self.conn.execute("""
+                SELECT url FROM frontier
+                WHERE domain = ? AND state = ? AND next_eligible <= ?
+                ORDER BY priority DESC, next_eligible
+                LIMIT ?
+            """, (domain, PENDING, now, batch_size)).fetchall()
+            urls = [row[0] for row in rows]
+            self.conn.executemany("""
+                UPDATE frontier SET state = ?, updated_at = ? WHERE url = ?
+            """, [(IN_PROGRESS, now, url) for url in urls])
+        return domain, urls
+
+    def get_next_url(self):
+        urls = self.dequeue(1)
+        return urls[0] if urls else None
+
+    def mark_done(self, url, next_eligible=0):
+        """Mark a URL crawled; `next_eligible` is when requeue_due may revisit it."""
+        with self.conn:
+            self.conn.execute("""
+                UPDATE frontier SET state = ?, attempts = 0, next_eligible = ?, updated_at = ?
+                WHERE url = ?
+            """, (DONE, next_eligible, time.time(), url))
+
+    def mark_done_many(self, urls, next_eligible=0):
+        now = time.time()
+        with self.conn:
+            self.conn.executemany("""
+                UPDATE frontier SET state = ?, attempts = 0, next_eligible = ?, updated_at = ?
+                WHERE url = ?
+            """, [(DONE, next_eligible, now, url) for url in urls])
+
+    def schedule_many(self, visits):
+        """Mark (url, next visit time) pairs crawled, to be revisited by requeue_due."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany("""
+                UPDATE frontier SET state = ?, attempts = 0, next_eligible = ?, updated_at = ?
+                WHERE url = ?
+            """, [(DONE, next_eligible, now, url) for url, next_eligible in visits])
+
+    # URLManager compatibility
+    mark_crawled = mark_done
+
+    def mark_failed(self, url, retry_delay=None):
+        """Record a failed attempt; the URL is retried later until max_attempts."""
+        now = time.time()
+        retry_delay = self.retry_delay if retry_delay is None else retry_delay
+        with self.conn:
+            self.conn.execute("""
+                UPDATE frontier
+                SET attempts = attempts + 1,
+                    state = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END,
+                    next_eligible = ?,
+                    updated_at = ?
+                WHERE url = ?
+            """, (self.max_attempts, FAILED, PENDING, now + retry_delay, now, url))
+
+    def recover(self):
+        """Return URLs left in progress by a crashed run to the pending state."""
+        with self.conn:
+            cursor = self.conn.execute("UPDATE frontier SET state = ? WHERE state = ?",
+                                       (PENDING, IN_PROGRESS))
+        if cursor.rowcount:
+            logger.info(f"Recovered {cursor.rowcount} in-progress URLs from a previous run")
+        return cursor.rowcount
+
+    def requeue(self, urls=None, states=(DONE, FAILED), now=None):
+        """Make finished URLs pending again, either the given ones or all of them."""
+        now = time.time() if now is None else now
+        placeholders = ','.join('?' * len(states))
+        with self.conn:
+            if urls is None:
+                cursor = self.conn.execute(f"""
+                    UPDATE frontier SET state = ?, attempts = 0, next_eligible = ?
+                    WHERE state IN ({placeholders})
+                """, (PENDING, now, *states))
+                return cursor.rowcount
+            cursor = self.conn.executemany(f"""
+                UPDATE frontier SET state = ?, attempts = 0, next_eligible = ?
+                WHERE url = ? AND state IN ({placeholders})
+            """, [(PENDING, now, url, *states) for url in urls])
+            return cursor.rowcount
+
+    def requeue_due(self, now=None, failed_after=None):
+        """Make crawled URLs whose revisit time has come pending again.
+
+        With `failed_after` (seconds), URLs that failed for good at least
+        that long ago are retried as well.
+        """
+        now = time.time() if now is None else now
+        with self.conn:
+            cursor = self.conn.execute("""
+                UPDATE frontier SET state = ?, attempts = 0
+                WHERE state = ? AND next_eligible <= ?
+            """, (PENDING, DONE, now))
+            count = cursor.rowcount
+            if failed_after is not None:
+                cursor = self.conn.execute("""
+                    UPDATE frontier SET state = ?, attempts = 0, next_eligible = ?
+                    WHERE state = ? AND updated_at <= ?
+                """, (PENDING, now, FAILED, now - failed_after))
+                count += cursor.rowcount
+        if count:
+            logger.info(f"Requeued {count} URLs due for a revisit")
+        return count
+
+    def next_revisit_time(self):
+        """Earliest revisit time of a crawled URL, or None if nothing has been crawled."""
+        row = self.conn.execute("SELECT MIN(next_eligible) FROM frontier WHERE state = ?",
+                                (DONE,)).fetchone()
+        return row[0]
+
+    def next_eligible_time(self):
+        """Earliest time a pending URL becomes eligible, or None if none are pending."""
+        row = self.conn.execute("SELECT MIN(next_eligible) FROM frontier WHERE state = ?",
+                                (PENDING,)).fetchone()
+        return row[0]
+
+    def url_count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+
+    def iter_urls(self):
+        """Stream every URL in the frontier, whatever its state."""
+        for row in self.conn.execute("SELECT url FROM frontier"):
+            yield row[0]
+
+    def count(self, state):
+        """Number of URLs in `state`, counted on the state index without scanning the table."""
+        return self.conn.execute("SELECT COUNT(*) FROM frontier WHERE state = ?", (state,)).fetchone()[0]
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT state, COUNT(*) FROM frontier GROUP BY state"))
@@ -1,26 +1,108 @@
-from bs4 import BeautifulSoup
 import logging
 import re
+import time
 from urllib.parse import urlparse, unquote
 
+from parser_backends import get_backend
+from html_prefilter import HTMLPrefilter, prefilter_settings
+from selector_plan import SelectorPlan, dump_plan_stats
+from metrics import PAGES, observe_stage
+
 logger = logging.getLogger(__name__)
 
 class HTMLParser:
     def __init__(self, config):
         self.config = config
         self.SELECTORS = self.config.get('SELECTORS')
+        self.backend = get_backend(self.config.get('parser_backend', 'html.parser'))
+        self.prefilter_enabled, self.prefilter_tags = prefilter_settings(self.config, self.backend)
+        self._prefilters = {}
+        self.plan_settings = self.config.get('selector_plans', {})
+        self._plans = {}
 
     def _get_selectors(self, domain):
         return self.SELECTORS.get(domain, self.SELECTORS['default'])
 
+    def _get_plan(self, domain, field):
+        key = domain if domain in self.SELECTORS else 'default'
+        name = f"{key}:{field}"
+        plan = self._plans.get(name)
+        if plan is None:
+            plan = SelectorPlan(self.SELECTORS[key][field], self.backend, name=name, **self.plan_settings)
+            self._plans[name] = plan
+        return plan
+
+    def selector_stats(self):
+        """Per-selector hit, miss and latency stats keyed by 'domain:field'."""
+        return {name: plan.stats() for name, plan in self._plans.items()}
+
+    def dump_selector_stats(self, path):
+        return dump_plan_stats(self._plans, path)
+
+    def _get_prefilter(self, domain):
+        prefilter = self._prefilters.get(domain)
+        if prefilter is None:
+            prefilter = HTMLPrefilter(self._get_selectors(domain), hollow_tags=self.prefilter_tags)
+            self._prefilters[domain] = prefilter
+        return prefilter
+
+    def parse(self, html, url=None):
+        """Parse a page, first dropping content the URL's selectors can never use."""
+        if self.prefilter_enabled and url is not None:
+            html = self._get_prefilter(urlparse(url).netloc).apply(html)
+        return self.backend.parse(html)
+
+    def extract(self, html, url):
+        """Parse the page once and return (title, artist, lyrics) from that document."""
+        fields, result, timings = self.extract_page(html, url)
+        PAGES.labels(result=result).inc()
+        for stage, seconds in timings.items():
+            observe_stage(stage, seconds)
+        return fields
+
+    def extract_page(self, html, url):
+        """Like extract, but return the metrics instead of recording them.
+
+        Returns ((title, artist, lyrics), result, timings): result is the
+        PAGES label and timings maps stages to seconds. Parse workers use
+        this, since metrics recorded in their processes never reach the
+        exported registry.
+        """
+        timings = {}
+        start = time.perf_counter()
+        try:
+            soup = self.parse(html, url)
+        except Exception as e:
+            logger.error(f"Error parsing {url}: {str(e)}")
+            return (None, None, None), 'error', timings
+        finally:
+            timings['parse'] = time.perf_counter() - start
+        title, artist = self._extract_metadata_from_soup(soup, url, timings)
+        lyrics = self._extract_lyrics_from_soup(soup, url)
+        return (title, artist, lyrics), 'lyrics' if lyrics else 'no_lyrics', timings
+
     def extract_metadata(self, html, url):
         try:
-            soup = BeautifulSoup(html, 'html.parser')
+            soup = self.parse(html, url)
+        except Exception as e:
+            logger.error(f"Error extracting metadata from {url}: {str(e)}")
+            return None, None
+        timings = {}
+        title, artist = self._extract_metadata_from_soup(soup, url, timings)
+        for stage, seconds in timings.items():
+            observe_stage(stage, seconds)
+        return title, artist
+
+    def extract_lyrics(self, html, url):
+        soup = self.parse(html, url)
+        return self._extract_lyrics_from_soup(soup, url)
+
+    def _extract_metadata_from_soup(self, soup, url, timings):
+        try:
             domain = urlparse(url).netloc
-            selectors = self._get_selectors(domain)
             
-            title = self._extract_text_from_selector(soup, selectors['title'])
-            artist = self._extract_text_from_selector(soup, selectors['artist'])
+            title = self._extract_text_from_selector(soup, domain, 'title')
+            artist = self._extract_text_from_selector(soup, domain, 'artist')
             
             if not artist:
                 artist = self._extract_artist_from_url(url)
@@ -28,21 +110,21 @@ class HTMLParser:
             if not artist:
                 artist = self._extract_artist_from_domain(domain)
             
+            start = time.perf_counter()
             if title:
                 title = self._clean_text(title)
             if artist:
                 artist = self._clean_text(artist)
+            timings['clean'] = time.perf_counter() - start
             return title, artist
         except Exception as e:
             logger.error(f"Error extracting metadata from {url}: {str(e)}")
         return None, None
 
-    def extract_lyrics(self, html, url):
-        soup = BeautifulSoup(html, 'html.parser')
+    def _extract_lyrics_from_soup(self, soup, url):
         try:
             domain = urlparse(url).netloc
-            selectors = self._get_selectors(domain)
-            lyrics = self._extract_text_from_selector(soup, selectors['lyrics'])
+            lyrics = self._extract_text_from_selector(soup, domain, 'lyrics')
             if not lyrics:
                 logger.warning(f"No lyrics found at {url}")
                 return None
@@ -51,21 +133,9 @@ class HTMLParser:
             logger.error(f"Error extracting lyrics from {url}: {str(e)}")
             return None
 
-    def _extract_text_from_selector(self, soup, selectors):
-        for selector in selectors:
-            try:
-                if selector.startswith('meta['):
-                    element = soup.select_one(selector)
-                    if element and element.get('content'):
-                        return element['content']
-                else:
-                    elements = soup.select(selector)
-                    if elements:
-                        return '\n'.join(element.get_text(strip=True, separator='\n') 
-                                       for element in elements)
-            except Exception as e:
-                logger.debug(f"Error with selector {selector}: {str(e)}")
-        return None
+    def _extract_text_from_selector(self, soup, domain, field):
+        """Run the domain's compiled selector plan for a field."""
+        return self._get_plan(domain, field).run(soup)
 
     def _clean_text(self, text):
         if not text:
@@ -0,0 +1,72 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Tags whose contents never contribute to extracted text
+DEFAULT_HOLLOW_TAGS = ('script', 'style', 'template')
+
+ATTRIBUTE_PATTERN = re.compile(r'\[[^\]]*\]')
+TAG_NAME_PATTERN = re.compile(r'(?:^|[\s>+~,(])([a-zA-Z][a-zA-Z0-9-]*)')
+
+def referenced_tags(selectors):
+    """Return the tag names that appear in a list of CSS selectors."""
+    tags = set()
+    for selector in selectors:
+        # Drop attribute conditions so quoted values are not taken for tags
+        selector = ATTRIBUTE_PATTERN.sub('', selector)
+        tags.update(name.lower() for name in TAG_NAME_PATTERN.findall(selector))
+    return tags
+
+def prefilter_settings(config, backend):
+    """Return (enabled, hollow tags) for pages parsed with `backend`.
+
+    `prefilter` is true, false or "auto" (the default), which enables the
+    prefilter for backends that benefit from it. `prefilter_hollow_tags`
+    replaces DEFAULT_HOLLOW_TAGS.
+    """
+    enabled = config.get('prefilter', 'auto')
+    if enabled == 'auto':
+        enabled = backend.benefits_from_prefilter
+    return bool(enabled), config.get('prefilter_hollow_tags', DEFAULT_HOLLOW_TAGS)
+
+class HTMLPrefilter:
+    """Cheap pre-tokenization filter derived from a domain's selectors.
+
+    Inline scripts, stylesheets, templates and comments are often most of a
+    lyrics page's bytes but never contribute to the extracted fields. The
+    prefilter empties those elements (and comments) before the page reaches
+    the parser, leaving the tags themselves in place so that document
+    structure, sibling relations and text boundaries are unchanged and every
+    selector, including the fallbacks, matches exactly as before. Tags that
+    the selectors reference are left untouched.
+    """
+
+    def __init__(self, selectors, hollow_tags=DEFAULT_HOLLOW_TAGS, strip_comments=True):
+        all_selectors = [selector for field in selectors.values() for selector in field]
+        referenced = referenced_tags(all_selectors)
+        self.hollow_tags = [tag for tag in hollow_tags if tag not in referenced]
+        self.strip_comments = strip_comments
+
+        # Every alternative starts with a literal '<' so the regex engine can
+        # skip ahead between tags instead of trying each character.
+        alternatives = []
+        if self.strip_comments:
+            alternatives.append(r'!--.*?-->')
+        if self.hollow_tags:
+            names = '|'.join(re.escape(tag) for tag in self.hollow_tags)
+            alternatives.append(r'((%s)\b[^>]*>).*?(</\2\s*>)' % names)
+        if alternatives:
+            self.pattern = re.compile('<(?:%s)' % '|'.join(alternatives), re.DOTALL | re.IGNORECASE)
+        else:
+            self.pattern = None
+
+    def _replace(self, match):
+        if match.lastindex:
+            return '<' + match.group(1) + match.group(3)
+        return '<!---->'
+
+    def apply(self, html):
+        if self.pattern is None or not isinstance(html, str):
+            return html
+        return self.pattern.sub(self._replace, html)
@@ -0,0 +1,133 @@
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+class CachedResponse:
+    """Validators and body of a previously fetched page."""
+
+    __slots__ = ('url', 'etag', 'last_modified', 'body', 'fetched_at')
+
+    def __init__(self, url, etag, last_modified, body, fetched_at):
+        self.url = url
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body = body
+        self.fetched_at = fetched_at
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+class HTTPCache:
+    """On-disk cache of response validators and bodies for conditional requests.
+
+    Only responses that carry an ETag or Last-Modified header are stored,
+    since those are the only ones a server can answer with 304 Not Modified.
+    Bodies are zlib-compressed. The cache is shared by the fetcher threads,
+    so a single connection is guarded by a lock.
+    """
+
+    def __init__(self, db_path='http_cache.db', compress_level=6):
+        self.db_path = str(db_path)
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_db()
+
+    def _init_db(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    body BLOB NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    validated_at REAL NOT NULL
+                )
+            """)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def get(self, url):
+        """Return the CachedResponse for a url, or None."""
+        with self._lock:
+            row = self.conn.execute("""
+                SELECT etag, last_modified, body, fetched_at FROM responses WHERE url = ?
+            """, (url,)).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, body, fetched_at = row
+        try:
+            body = zlib.decompress(body).decode('utf-8')
+        except (zlib.error, UnicodeDecodeError) as e:
+            logger.warning(f"Dropping corrupt cache entry for {url}: {e}")
+            self.delete(url)
+            return None
+        return CachedResponse(url, etag, last_modified, body, fetched_at)
+
+    def store(self, url, body, etag=None, last_modified=None, now=None):
+        """Store a response body with its validators. Returns False if it has none."""
+        if not etag and not last_modified:
+            return False
+        now = now or time.time()
+        data = zlib.compress(body.encode('utf-8'), self.compress_level)
+        with self._lock, self.conn:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO responses (url, etag, last_modified, body, fetched_at, validated_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (url, etag, last_modified, data, now, now))
+        return True
+
+    def store_response(self, url, response):
+        """Store a requests.Response if it carries validators."""
+        return self.store(url, response.text,
+                          etag=response.headers.get('ETag'),
+                          last_modified=response.headers.get('Last-Modified'))
+
+    def touch(self, url, etag=None, last_modified=None, now=None):
+        """Record that a cached response was revalidated by a 304.
+
+        A 304 may carry updated validators, which replace the stored ones.
+        """
+        with self._lock, self.conn:
+            self.conn.execute("""
+                UPDATE responses SET validated_at = ?,
+                    etag = COALESCE(?, etag),
+                    last_modified = COALESCE(?, last_modified)
+                WHERE url = ?
+            """, (now or time.time(), etag, last_modified, url))
+
+    def delete(self, url):
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+
+    def __contains__(self, url):
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM responses WHERE url = ?", (url,)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+def open_cache(config):
+    """Create the HTTPCache described by the config, or None if it is disabled."""
+    if not config.get('http_cache', True):
+        return None
+    try:
+        return HTTPCache(config.get('http_cache_db', 'http_cache.db'))
+    except sqlite3.Error as e:
+        logger.error(f"Failed to open HTTP cache: {e}")
+        return None
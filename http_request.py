@@ -1,6 +1,14 @@
 import requests
 import random
 import logging
+import threading
+import time
+from collections import namedtuple
+from typing import List, Optional
+
+from connection_pool import PooledHTTPAdapter
+from proxy_pool import ProxyPool
+from metrics import IN_FLIGHT, REQUESTS, RESPONSE_BYTES, time_stage
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +21,15 @@ USER_AGENTS = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36 Edg/91.0.864.59'
 ]
 
+# html is the page body (the cached copy when not_modified is True), or None on
+# failure. extracted and rendered are filled in by FetchStrategy.
+FetchResult = namedtuple('FetchResult', ['html', 'not_modified', 'extracted', 'rendered'],
+                         defaults=(None, False))
+
+# Statuses that count against the proxy a response came through, along with
+# every 5xx: blocked by the site, or the proxy wants credentials
+PROXY_ERROR_STATUSES = (403, 407)
+
 def get_random_user_agent():
     return random.choice(USER_AGENTS)
 
@@ -40,84 +57,129 @@ def rotate_proxy(proxies: List[str]) -> Optional[str]:
     return random.choice(proxies)
 
 
-class ProxyRotator:
-    def __init__(self, proxies: List[str]):
-        self.proxies = proxies
-        self.current_index = -1
-        self.failed_proxies = set()
-
-    def get_next_proxy(self) -> Optional[Dict[str, str]]:
-        if not self.proxies:
-            return None
-
-        attempts = 0
-        while attempts < len(self.proxies):
-            self.current_index = (self.current_index + 1) % len(self.proxies)
-            proxy = self.proxies[self.current_index]
-            
-            if proxy not in self.failed_proxies:
-                return {
-                    'http': proxy,
-                    'https': proxy
-                }
-            attempts += 1
-        
-        return None
-
-    def mark_proxy_failed(self, proxy: str):
-        self.failed_proxies.add(proxy)
-        msg = f"Marked proxy as failed: {proxy}"
-        logger.warning(msg)
-
-def test_proxy(session: requests.Session, proxy: Dict[str, str]) -> bool:
-    try:
-        response = session.get('http://httpbin.org/ip', proxies=proxy, timeout=5)
-        return response.status_code == 200
-    except:
-        return False
-
 class HTTPRequest:
-    def __init__(self, config):
+    def __init__(self, config, cache=None, proxy_pool=None):
         self.config = config
+        self.cache = cache
         self.session = requests.Session()
+        self.adapter = PooledHTTPAdapter(config)
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
         self.headers = {'User-Agent': get_random_user_agent()}
         self.session.headers.update(self.headers)
+        # Pick a fresh User-Agent for every request instead of the session's
+        self.rotate_user_agent = bool(config.get('rotate_user_agent', False))
         self.proxies = config.get('proxies', [])
-        self.proxy_rotator = ProxyRotator(self.proxies)
-        self.current_proxy = self.proxy_rotator.get_next_proxy()
-        if self.current_proxy and test_proxy(self.session, self.current_proxy):
-            self.session.proxies = self.current_proxy
-            logger.info(f"Using proxy: {self.current_proxy['http']}")
-        else:
-            logger.warning("No working proxy found, proceeding without proxy")
+        # Configured proxies are probed on first use rather than here, so
+        # runs that never send a request do not wait for the health checks
+        self._proxy_pool = proxy_pool
+        self._proxies_checked = proxy_pool is not None or not self.proxies
+        self._proxy_lock = threading.Lock()
 
-    def get(self, url, render_js=False):
+    @property
+    def proxy_pool(self):
+        """The ProxyPool of working proxies, or None; probed on first access."""
+        if not self._proxies_checked:
+            with self._proxy_lock:
+                if not self._proxies_checked:
+                    self._proxy_pool = self._probe_proxies()
+                    self._proxies_checked = True
+        return self._proxy_pool
+
+    def _probe_proxies(self):
+        pool = ProxyPool(self.proxies, self.config)
+        if not pool.probe_all():
+            # Keep the pool: failed proxies come back once their cooldown ends
+            logger.warning("No working proxy found, retrying them after their cooldown")
+            return pool
+        logger.info(f"Using {len(pool)} proxies, best: {pool.best()}")
+        return pool
+
+    @property
+    def current_proxy(self):
+        """requests-style proxies dict for the best proxy, or None."""
+        pool = self.proxy_pool
+        return ProxyPool.as_requests_proxies(pool.best()) if pool else None
+
+    def get(self, url, render_js=False, headers=None):
+        return self.fetch(url, render_js, headers).html
+
+    def pool_stats(self):
+        """Connection reuse per host; see PooledHTTPAdapter.stats."""
+        return self.adapter.stats()
+
+    def fetch(self, url, render_js=False, headers=None):
+        """Fetch a URL, revalidating a cached copy when the cache has one.
+
+        Returns a FetchResult. When the server answers 304 Not Modified the
+        cached body is returned with not_modified=True so callers can skip
+        re-processing the page. Each attempt goes through a proxy chosen by
+        the proxy pool; failed attempts are retried through another proxy.
+        `headers` apply to this request only and leave the shared session
+        untouched, so concurrent requests cannot see each other's headers.
+        """
+        with IN_FLIGHT.track():
+            return self._fetch(url, headers)
+
+    def _fetch(self, url, headers):
+        cached = self.cache.get(url) if self.cache is not None else None
+        request_headers = {}
+        if self.rotate_user_agent:
+            request_headers['User-Agent'] = get_random_user_agent()
+        if headers:
+            request_headers.update(headers)
+        if cached:
+            request_headers.update(cached.conditional_headers())
+        headers = request_headers or None
         max_retries = 3
         retries = 0
+        tried = []
+        with time_stage('proxy_select'):
+            proxy = self.proxy_pool.choose() if self.proxy_pool else None
         while retries < max_retries:
             try:
-                response = self.session.get(url, timeout=10, proxies=self.session.proxies)
+                start = time.perf_counter()
+                with time_stage('network'):
+                    response = self.session.get(url, timeout=10, headers=headers,
+                                                proxies=ProxyPool.as_requests_proxies(proxy))
+                if proxy:
+                    if response.status_code in PROXY_ERROR_STATUSES or response.status_code >= 500:
+                        self.proxy_pool.record_failure(proxy)
+                    else:
+                        self.proxy_pool.record_success(proxy, time.perf_counter() - start)
+                RESPONSE_BYTES.inc(len(response.content))
+                if response.status_code == 304 and cached:
+                    REQUESTS.labels(outcome='not_modified').inc()
+                    self.cache.touch(url, etag=response.headers.get('ETag'),
+                                     last_modified=response.headers.get('Last-Modified'))
+                    logger.info(f"Not modified since last crawl: {url}")
+                    return FetchResult(cached.body, True)
                 response.raise_for_status()
-                return response.text
+                REQUESTS.labels(outcome='ok').inc()
+                if self.cache is not None:
+                    self.cache.store_response(url, response)
+                return FetchResult(response.text, False)
             except requests.exceptions.RequestException as e:
+                REQUESTS.labels(outcome='error').inc()
                 logger.error(f"Request failed for {url}: {e}")
                 if isinstance(e, (requests.exceptions.ProxyError, requests.exceptions.ConnectTimeout)):
-                    if self.current_proxy:
-                        self.proxy_rotator.mark_proxy_failed(self.current_proxy['http'])
+                    if proxy:
+                        self.proxy_pool.record_failure(proxy)
                 if retries < max_retries - 1:
                     logger.info(f"Retrying {url} with a different proxy ({retries + 1}/{max_retries})")
-                    self.current_proxy = self.proxy_rotator.get_next_proxy()
-                    if self.current_proxy:
-                        self.session.proxies = self.current_proxy
-                        logger.info(f"Switched to proxy: {self.current_proxy['http']}")
+                    tried.append(proxy)
+                    with time_stage('proxy_select'):
+                        proxy = self.proxy_pool.choose(exclude=tried) if self.proxy_pool else None
+                    if proxy:
+                        logger.info(f"Switched to proxy: {proxy}")
                     else:
                         logger.warning("No more proxies available. Skipping retry.")
                         break
                 else:
                     logger.error(f"Failed to get {url} after {max_retries} retries.")
-                    return None
+                    return FetchResult(None, False)
                 retries += 1
             except Exception as e:
                 logger.error(f"Request failed for {url}: {e}")
-                return None
-        return None
\ No newline at end of file
+                return FetchResult(None, False)
+        return FetchResult(None, False)
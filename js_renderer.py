@@ -0,0 +1,155 @@
+import asyncio
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+def process_tree_rss_mb(pid):
+    """Resident memory in MiB of a process and all its descendants, or None.
+
+    Chromium keeps most of its memory in renderer child processes, so the
+    whole tree is counted. Reads /proc and returns None where that is not
+    available.
+    """
+    try:
+        children = {}
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    # The command name may contain spaces; fields resume after ')'
+                    ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+
+        total_kb = 0
+        pending = [pid]
+        while pending:
+            current = pending.pop()
+            pending.extend(children.get(current, []))
+            try:
+                with open(f'/proc/{current}/status') as f:
+                    for line in f:
+                        if line.startswith('VmRSS:'):
+                            total_kb += int(line.split()[1])
+                            break
+            except OSError:
+                continue
+        return total_kb / 1024
+    except OSError:
+        return None
+
+class JSRenderer:
+    """A headless Chromium with one warm page, driven through requests-html.
+
+    requests-html (and the Chromium download behind it) is only imported
+    when the first page actually needs rendering, so crawls of sites that
+    serve their lyrics in the HTML never start a browser. The browser and
+    its page are reused for every render, which avoids launching Chromium
+    and setting up a page per URL. Renders are serialized on an event loop
+    owned by the renderer, so it can be called from any thread.
+    """
+
+    def __init__(self, headers=None, proxies=None, timeout=30):
+        self.headers = dict(headers or {})
+        self.proxies = proxies
+        self.timeout = timeout
+        self.available = True
+        self.renders = 0
+        self._session = None
+        self._browser = None
+        self._page = None
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _browser_args(self):
+        args = ['--no-sandbox']
+        proxy = (self.proxies or {}).get('https') or (self.proxies or {}).get('http')
+        if proxy:
+            args.append(f'--proxy-server={proxy}')
+        return args
+
+    def _start(self):
+        try:
+            from requests_html import HTMLSession
+            self._loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self._loop)
+            self._session = HTMLSession(browser_args=self._browser_args())
+            self._browser = self._session.browser
+        except Exception as e:
+            logger.warning(f"JavaScript rendering unavailable: {e}")
+            self.available = False
+            return False
+        return True
+
+    async def _new_page(self):
+        page = await self._browser.newPage()
+        if 'User-Agent' in self.headers:
+            await page.setUserAgent(self.headers['User-Agent'])
+        return page
+
+    async def _render(self, url, timeout):
+        if self._page is None:
+            self._page = await self._new_page()
+        await self._page.goto(url, options={'timeout': int(timeout * 1000)})
+        return await self._page.content()
+
+    def update_headers(self, headers):
+        self.headers.update(headers)
+        with self._lock:
+            if self._page is not None and 'User-Agent' in headers:
+                asyncio.set_event_loop(self._loop)
+                self._loop.run_until_complete(self._page.setUserAgent(headers['User-Agent']))
+
+    def render(self, url, timeout=None):
+        """Return the rendered HTML of a page, or None if rendering failed."""
+        timeout = min(timeout or self.timeout, self.timeout)
+        with self._lock:
+            if self._session is None and (not self.available or not self._start()):
+                return None
+            # The browser belongs to the renderer's loop, whichever thread calls
+            asyncio.set_event_loop(self._loop)
+            try:
+                html = self._loop.run_until_complete(
+                    asyncio.wait_for(self._render(url, timeout), timeout)
+                )
+                self.renders += 1
+                return html
+            except Exception as e:
+                logger.warning(f"Failed to render JavaScript content for {url}: {e}")
+                # A timed out or crashed page may be mid-navigation; use a fresh one
+                self._close_page()
+                return None
+
+    def _close_page(self):
+        if self._page is not None:
+            try:
+                self._loop.run_until_complete(self._page.close())
+            except Exception as e:
+                logger.debug(f"Error closing browser page: {e}")
+            self._page = None
+
+    def memory_mb(self):
+        """Resident memory of the browser and its child processes, or None."""
+        process = getattr(self._browser, 'process', None)
+        if process is None:
+            return None
+        return process_tree_rss_mb(process.pid)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                asyncio.set_event_loop(self._loop)
+                self._close_page()
+                try:
+                    self._session.close()
+                except Exception as e:
+                    logger.debug(f"Error closing JavaScript session: {e}")
+                self._session = None
+                self._browser = None
+            if self._loop is not None:
+                self._loop.close()
+                self._loop = None
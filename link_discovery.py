@@ -0,0 +1,254 @@
+import hashlib
+import html
+import logging
+import math
+import os
+import re
+import struct
+from urllib.parse import urljoin, urlsplit
+
+from metrics import LINKS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Query parameters that only track where a visitor came from
+TRACKING_PARAM = re.compile(r'^(utm_\w+|fbclid|gclid|ref|ref_src)$', re.IGNORECASE)
+
+ANCHOR_HREF = re.compile(r'''<a\s[^>]*?\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.IGNORECASE)
+BASE_HREF = re.compile(r'''<base\s[^>]*?\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.IGNORECASE)
+
+def _remove_dot_segments(path):
+    segments = []
+    for segment in path.split('/'):
+        if segment == '..':
+            if len(segments) > 1:
+                segments.pop()
+        elif segment != '.':
+            segments.append(segment)
+    if path.endswith(('/.', '/..')):
+        segments.append('')
+    return '/'.join(segments)
+
+def normalize_url(url, base=None):
+    """Canonical absolute form of a link, or None if it is not an http(s) URL.
+
+    Relative links are resolved against `base`. The scheme and host are
+    lowercased, default ports, fragments, dot segments and tracking
+    parameters are removed, and an empty path becomes "/". Everything else,
+    including the order of the remaining query parameters, is kept, since
+    sites may depend on it.
+    """
+    url = html.unescape(url.strip())
+    try:
+        if base:
+            url = urljoin(base, url)
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    host = parts.hostname
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+    if ':' in host:
+        host = f"[{host}]"
+    netloc = host if port is None or port == DEFAULT_PORTS[scheme] else f"{host}:{port}"
+    path = _remove_dot_segments(parts.path) or '/'
+    query = '&'.join(param for param in parts.query.split('&')
+                     if param and not TRACKING_PARAM.match(param.split('=', 1)[0]))
+    return f"{scheme}://{netloc}{path}" + (f"?{query}" if query else '')
+
+class BloomFilter:
+    """Fixed-size probabilistic set of strings.
+
+    Sized for `capacity` items at a false-positive rate of `error_rate`,
+    which takes -ln(error_rate) / ln(2)^2 bits per item: about 1.2 bytes
+    at 1%, so 10 million URLs fit in 12 MB. Items are never missed, but
+    about `error_rate` of the items that were never added are reported as
+    present; past `capacity` that rate grows quickly.
+    """
+
+    HEADER = struct.Struct('<4sQdQIQ')
+    MAGIC = b'BLM1'
+
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = min(max(float(error_rate), 1e-9), 0.5)
+        self.num_bits = max(64, math.ceil(-self.capacity * math.log(self.error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        # Double hashing: k positions from the two halves of one digest
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(item))
+
+    def add(self, item):
+        """Add `item`; returns False if it was (probably) already present."""
+        bits = self.bits
+        new = False
+        for p in self._positions(item):
+            mask = 1 << (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+    def __len__(self):
+        return self.count
+
+    def save(self, path):
+        temp_file = f"{path}.tmp"
+        with open(temp_file, 'wb') as f:
+            f.write(self.HEADER.pack(self.MAGIC, self.capacity, self.error_rate, self.num_bits,
+                                     self.num_hashes, self.count))
+            f.write(self.bits)
+        os.replace(temp_file, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            header = f.read(cls.HEADER.size)
+            if len(header) != cls.HEADER.size:
+                raise ValueError(f"{path} is not a Bloom filter file")
+            magic, capacity, error_rate, num_bits, num_hashes, count = cls.HEADER.unpack(header)
+            if magic != cls.MAGIC:
+                raise ValueError(f"{path} is not a Bloom filter file")
+            bloom = cls.__new__(cls)
+            bloom.capacity, bloom.error_rate = capacity, error_rate
+            bloom.num_bits, bloom.num_hashes, bloom.count = num_bits, num_hashes, count
+            bloom.bits = bytearray((num_bits + 7) // 8)
+            if f.readinto(bloom.bits) != len(bloom.bits):
+                raise ValueError(f"{path} is truncated")
+        return bloom
+
+class LinkExtractor:
+    """Finds the links on a page that are worth crawling.
+
+    `LINK_PATTERNS` in the config maps a domain to regular expressions,
+    with a "default" entry for other domains, like `SELECTORS`. A link is
+    kept when one of its own domain's patterns matches its path and query
+    (e.g. "^/artists/" or "-lyrics$"). Links are read from the `<a href>`
+    attributes of the raw HTML, which needs no parse and works on pages
+    without lyrics, such as artist and album listings.
+    """
+
+    def __init__(self, config):
+        self.patterns = config.get('LINK_PATTERNS', {})
+        self._compiled = {}
+
+    def _pattern(self, domain):
+        key = domain if domain in self.patterns else 'default'
+        if key not in self._compiled:
+            patterns = self.patterns.get(key) or []
+            self._compiled[key] = re.compile('|'.join(f"(?:{p})" for p in patterns)) if patterns else None
+        return self._compiled[key]
+
+    def extract(self, html_content, url):
+        """Normalized URLs of the links in `html_content` that match their domain's patterns."""
+        base = url
+        match = BASE_HREF.search(html_content)
+        if match:
+            base = urljoin(url, next(group for group in match.groups() if group is not None))
+        links = {}
+        for match in ANCHOR_HREF.finditer(html_content):
+            href = next(group for group in match.groups() if group is not None)
+            link = normalize_url(href, base)
+            if link is None or link in links:
+                continue
+            parts = urlsplit(link)
+            pattern = self._pattern(parts.netloc)
+            target = parts.path + (f"?{parts.query}" if parts.query else '')
+            if pattern is not None and pattern.search(target):
+                links[link] = None
+        return list(links)
+
+class LinkDiscovery:
+    """Queues the song links found on crawled pages in the frontier.
+
+    Links from `LinkExtractor` are kept if their domain is on the
+    frontier's allowed list and they are not in the seen-URL Bloom filter,
+    which keeps the frontier from being asked about every link again on
+    every page. The filter is sized for `discovery_capacity` URLs (default
+    10 million) at `discovery_error_rate` (default 0.01), so about 1% of
+    new links are wrongly taken as seen and skipped. It is saved to
+    `discovery_filter` (default `<frontier_db>.bloom`) on close and rebuilt
+    from the frontier when missing, out of date or full.
+    """
+
+    def __init__(self, config, frontier, extractor=None):
+        self.frontier = frontier
+        self.extractor = extractor or LinkExtractor(config)
+        self.priority = int(config.get('discovery_priority', 0))
+        self.capacity = int(config.get('discovery_capacity', 10_000_000))
+        self.error_rate = float(config.get('discovery_error_rate', 0.01))
+        self.filter_path = config.get('discovery_filter') or f"{frontier.db_path}.bloom"
+        self.seen = self._load_filter()
+        self._warned_full = False
+        self.stats = {'pages': 0, 'links': 0, 'queued': 0}
+
+    def _load_filter(self):
+        known = self.frontier.url_count()
+        try:
+            seen = BloomFilter.load(self.filter_path)
+        except FileNotFoundError:
+            seen = None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Rebuilding unreadable seen-URL filter {self.filter_path}: {e}")
+            seen = None
+        # Only frontier URLs are added to the filter, so holding more means
+        # it belongs to another frontier
+        if seen is not None and seen.count <= min(known, seen.capacity):
+            return seen
+        seen = BloomFilter(max(self.capacity, 2 * known), self.error_rate)
+        for url in self.frontier.iter_urls():
+            seen.add(url)
+        logger.info(f"Built seen-URL filter for {seen.capacity} URLs ({len(seen.bits) / 2 ** 20:.1f} MB) "
+                    f"from {known} frontier URLs")
+        return seen
+
+    def add_links(self, links):
+        """Queue the allowed links not seen before. Returns the number added to the frontier."""
+        links = list(links)
+        new = [link for link in links if self.frontier.is_allowed_domain(link) and self.seen.add(link)]
+        queued = self.frontier.add_urls(new, priority=self.priority) if new else 0
+        self.stats['links'] += len(links)
+        self.stats['queued'] += queued
+        LINKS.labels(outcome='queued').inc(queued)
+        LINKS.labels(outcome='skipped').inc(len(links) - queued)
+        if not self._warned_full and len(self.seen) > self.seen.capacity:
+            self._warned_full = True
+            logger.warning(f"Seen-URL filter holds more than its {self.seen.capacity} URLs, "
+                           f"more new links will be skipped until it is rebuilt on restart")
+        return queued
+
+    def discover(self, url, html_content):
+        """Queue the new links on a fetched page. Returns the number queued."""
+        self.stats['pages'] += 1
+        queued = self.add_links(self.extractor.extract(html_content, url))
+        if queued:
+            logger.info(f"Discovered {queued} new URLs on {url}")
+        return queued
+
+    def close(self):
+        try:
+            self.seen.save(self.filter_path)
+        except OSError as e:
+            logger.error(f"Failed to save seen-URL filter {self.filter_path}: {e}")
+
+def open_discovery(config, frontier):
+    """Create the LinkDiscovery described by the config, or None if it is disabled."""
+    if not config.get('discover_links', False):
+        return None
+    return LinkDiscovery(config, frontier)
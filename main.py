@@ -1,16 +1,30 @@
 import argparse
+import asyncio
+import functools
 import logging
 import time
+from collections import namedtuple
 from urllib.parse import urlparse
 import sys
 
 from config_manager import ConfigManager
-from url_manager import URLManager
+from frontier import Frontier, PENDING
 from http_request import HTTPRequest
+from http_cache import open_cache
+from fetch_strategy import FetchStrategy
+from render_pool import RenderPool
+from pipeline import CrawlPipeline
 from html_parser import HTMLParser
 from data_formatter import DataFormatter
 from persistence import Persistence
+from record_index import RecordIndex
+from dedup import open_dedup
+from recrawl_scheduler import open_scheduler
+from link_discovery import open_discovery
 from error_logger import ErrorLogger
+from async_fetcher import AsyncFetcher, DEFAULT_MAX_CONCURRENCY
+from rate_limiter import DomainRateLimiter
+from metrics import QUEUE_DEPTH, start_exporter
 
 # Configure logging
 logging.basicConfig(
@@ -19,17 +33,179 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def has_lyrics(extracted):
+    """Whether an HTMLParser.extract result found lyrics."""
+    return bool(extracted and extracted[2])
+
+def process_page(url, html_content, html_parser, data_formatter, error_logger, extracted=None):
+    """Turn fetched HTML into a formatted record, logging any failure.
+
+    `extracted` is the (title, artist, lyrics) tuple when the page was
+    already parsed by the fetch strategy.
+    """
+    if not html_content:
+        error_logger.log_to_db('ERROR', url, "Failed to retrieve HTML content", "HTTP request failed")
+        return None
+
+    # Extract metadata and lyrics from a single parse of the page
+    if extracted is None:
+        extracted = html_parser.extract(html_content, url)
+    title, artist, lyrics = extracted
+
+    if not lyrics:
+        error_logger.log_to_db('WARNING', url, "No lyrics found", "Content extraction failed")
+        return None
+
+    # Format data
+    formatted_data = data_formatter.format_data(title, artist, lyrics, url)
+    if not formatted_data:
+        error_logger.log_to_db('ERROR', url, "Failed to format data", "Data formatting error")
+        return None
+    return formatted_data
+
+def persist_page(url, result, frontier, html_parser, data_formatter, index, error_logger, dedup=None,
+                 scheduler=None, discovery=None):
+    """Store the outcome of fetching and parsing one page and update the frontier.
+
+    With a `dedup` index, stored records are also checked for near-duplicates.
+    With a `scheduler`, the page's next visit time is set from how often it
+    changes. With `discovery`, the links on every fetched page, with or
+    without lyrics, are added to the frontier.
+    """
+    html_content = result.html
+    try:
+        if result.not_modified and index.touch(url):
+            # Unchanged since the last crawl: keep the stored record
+            frontier.mark_done(url, scheduler.record_visit(url) if scheduler is not None else 0)
+            logger.info(f"Not modified, refreshed last_crawled for: {url}")
+            return
+
+        formatted_data = process_page(url, html_content, html_parser, data_formatter, error_logger,
+                                      extracted=result.extracted)
+        if not html_content:
+            frontier.mark_failed(url)
+            return
+        frontier.mark_done(url, scheduler.record_visit(url, formatted_data) if scheduler is not None else 0)
+        if discovery is not None:
+            discovery.discover(url, html_content)
+        if not formatted_data:
+            return
+
+        # Persist data
+        index.append(formatted_data)
+        logger.info(f"Successfully crawled and saved data for: {url}")
+        if dedup is not None:
+            kept = dedup.add(formatted_data)
+            if kept:
+                logger.info(f"{url} is a near-duplicate of {kept}")
+    except Exception as e:
+        error_msg = f"An unexpected error occurred: {e}"
+        logger.error(error_msg)
+        error_logger.log_to_db('EXCEPTION', url, error_msg, str(e))
+
+Crawler = namedtuple('Crawler', ['http_cache', 'http_request', 'rate_limiter', 'html_parser',
+                                 'renderer', 'strategy', 'fetcher', 'pipeline'])
+
+def build_crawler(config, frontier, index, error_logger, dedup=None, scheduler=None, discovery=None):
+    """Wire up the fetch, parse and persist stages.
+
+    Persisted pages update `frontier`, `index`, `dedup`, `scheduler` and
+    `discovery` and failures go to `error_logger`; a distributed worker
+    passes a LeaseResults for the frontier, index, error logger and link
+    discovery and leaves deduplication and scheduling to the coordinator.
+    """
+    # Initialize HTTP request handler with the conditional-request cache
+    http_cache = open_cache(config)
+    http_request = HTTPRequest(config, cache=http_cache)
+
+    # Initialize per-domain rate limiter
+    rate_limiter = DomainRateLimiter(config)
+
+    # Initialize HTML parser
+    html_parser = HTMLParser(config)
+
+    # Fetch statically first and render JavaScript only when the lyrics are
+    # missing; the pipeline's parse stage decides when to escalate
+    renderer = RenderPool(config, http_request.headers, lambda: http_request.current_proxy)
+    strategy = FetchStrategy(http_request, renderer=renderer, config=config)
+
+    # Initialize concurrent fetcher
+    fetcher = AsyncFetcher(strategy, config, rate_limiter)
+
+    # Fetch, parse (in worker processes) and persist as overlapping stages
+    persist = functools.partial(persist_page, frontier=frontier, html_parser=html_parser,
+                                data_formatter=DataFormatter(), index=index, error_logger=error_logger,
+                                dedup=dedup, scheduler=scheduler, discovery=discovery)
+    pipeline = CrawlPipeline(fetcher, config, persist, has_content=has_lyrics,
+                             strategy=strategy, html_parser=html_parser)
+    return Crawler(http_cache, http_request, rate_limiter, html_parser, renderer, strategy, fetcher, pipeline)
+
+def close_crawler(crawler):
+    crawler.pipeline.close()
+    crawler.fetcher.close()
+    crawler.renderer.close()
+    if crawler.http_cache is not None:
+        crawler.http_cache.close()
+
+def log_settings(crawler):
+    logger.info(f"Using default rate limit of {crawler.rate_limiter.limits['default']['delay']} seconds per domain, "
+                f"{crawler.fetcher.max_concurrency} requests in flight, "
+                f"{crawler.fetcher.per_domain_concurrency} per domain, "
+                f"{crawler.pipeline.parse_workers} parse workers")
+
+def run_worker(config, coordinator_url, worker_id=None, exit_when_done=False):
+    """Crawl URLs leased from a coordinator until interrupted or the crawl is done.
+
+    Records and errors are sent to the coordinator, which owns the shared
+    frontier, output store and error log.
+    """
+    from crawl_worker import CoordinatorClient, CrawlWorker, LeaseResults
+    # Links found on leased pages are reported to the coordinator, which owns the seen-URL filter
+    extractor = None
+    if config.get('discover_links', False):
+        from link_discovery import LinkExtractor
+        extractor = LinkExtractor(config)
+    results = LeaseResults(extractor)
+    crawler = build_crawler(config, results, results, results,
+                            discovery=results if extractor is not None else None)
+    client = CoordinatorClient(coordinator_url, worker_id, config.get('coordinator_token'))
+    worker = CrawlWorker(client, crawler.pipeline, results, config)
+    exporter = start_exporter(config)
+    logger.info(f"Worker {client.worker_id} crawling for {coordinator_url}")
+    log_settings(crawler)
+    try:
+        worker.run(exit_when_done=exit_when_done)
+    except KeyboardInterrupt:
+        logger.info("Worker stopped by user")
+    finally:
+        close_crawler(crawler)
+        if exporter is not None:
+            exporter.close()
+    return worker.stats
+
 def main():
     parser = argparse.ArgumentParser(description='Crawl lyrics from specified URLs.')
     parser.add_argument('urls', nargs='*', help='List of URLs to crawl')
+    parser.add_argument('--seed-file', type=str, help='File of URLs to crawl, one per line')
     parser.add_argument('--config', type=str, default='config.json', help='Path to configuration file')
     parser.add_argument('--check-updates', action='store_true', help='Check and update existing URLs')
-    parser.add_argument('--rate-limit', type=float, default=15.5, help='Rate limit in seconds between requests')
+    parser.add_argument('--rate-limit', type=float, help='Default rate limit in seconds between requests to the same domain')
     parser.add_argument('--proxy-file', type=str, help='Path to the proxy list file')
+    parser.add_argument('--concurrency', type=int, help='Maximum number of requests in flight')
+    parser.add_argument('--per-domain-concurrency', type=int, help='Maximum number of requests in flight per domain')
+    parser.add_argument('--serve', type=str, metavar='HOST:PORT',
+                        help='Run as coordinator, leasing URLs to workers started with --coordinator')
+    parser.add_argument('--coordinator', type=str, metavar='URL', help='Run as a worker of this coordinator')
+    parser.add_argument('--worker-id', type=str, help='Name of this worker (default: hostname-pid)')
+    parser.add_argument('--exit-when-done', action='store_true', help='Stop the worker once no URLs are left')
+    parser.add_argument('--once', action='store_true',
+                        help='Exit once no URLs are left instead of waiting for the next revisit')
+    parser.add_argument('--discover', action='store_true',
+                        help='Also crawl links on fetched pages that match the LINK_PATTERNS in the config')
     args = parser.parse_args()
 
-    if len(args.urls) < 1:
-        error_msg = "No URLs provided. Usage: python main.py [--check-updates] URL1 URL2 ..."
+    if len(args.urls) < 1 and not args.seed_file and not (args.serve or args.coordinator):
+        error_msg = "No URLs provided. Usage: python main.py [--check-updates] [--seed-file FILE] URL1 URL2 ..."
         logger.error(error_msg)
         sys.stderr.write(f"ERROR: {error_msg}\n")
         sys.exit(1)
@@ -39,18 +215,34 @@ def main():
     config = config_manager.load_config()
     if args.proxy_file:
         config['proxy_file'] = args.proxy_file
+        config['proxies'] = config_manager.load_proxies_from_file(args.proxy_file)
+    if args.concurrency:
+        config['max_concurrency'] = args.concurrency
+    if args.per_domain_concurrency:
+        config['per_domain_concurrency'] = args.per_domain_concurrency
+    if args.rate_limit:
+        config['rate_limit'] = args.rate_limit
+        rate_limits = config.setdefault('RATE_LIMITS', {})
+        rate_limits['default'] = {**rate_limits.get('default', {}), 'delay': args.rate_limit}
+    if args.discover:
+        config['discover_links'] = True
 
-    # Initialize URL manager
-    url_manager = URLManager(args.urls)
+    if args.serve:
+        from coordinator import run_coordinator
+        host, _, port = args.serve.rpartition(':')
+        run_coordinator(config, args.urls, args.seed_file, host or '127.0.0.1', int(port))
+        return
+    if args.coordinator:
+        run_worker(config, args.coordinator, args.worker_id, args.exit_when_done)
+        return
 
-    # Initialize HTTP request handler
-    http_request = HTTPRequest(config)
-
-    # Initialize HTML parser
-    html_parser = HTMLParser(config)
-
-    # Initialize data formatter
-    data_formatter = DataFormatter()
+    # Initialize the persistent URL frontier and resume any interrupted run
+    frontier = Frontier(config.get('frontier_db', 'crawler_frontier.db'))
+    frontier.recover()
+    added = frontier.add_urls(args.urls, seed=True)
+    if args.seed_file:
+        added += frontier.add_seed_file(args.seed_file)
+    logger.info(f"Added {added} new URLs to the frontier: {frontier.counts()}")
 
     # Initialize persistence handler
     persistence = Persistence(config)
@@ -58,56 +250,77 @@ def main():
     # Initialize error logger
     error_logger = ErrorLogger(config)
 
-    # Load existing data
-    existing_data = persistence.load_existing_data('song_lyrics.json')
+    # Open the append-only output store, merging in newer records from any legacy JSON output
+    output_file = config.get('output_file', 'song_lyrics.jsonl')
+    store = persistence.open_store(output_file)
+    index = RecordIndex(store)
+    persistence.import_legacy_json(config.get('legacy_output_file', 'song_lyrics.json'), store, index)
+    dedup = open_dedup(config)
+    # Revisit each page according to how often it changes
+    scheduler = open_scheduler(config)
+    # Queue the song links found on fetched pages
+    discovery = open_discovery(config, frontier)
+
+    # Connections, proxies, browsers and parse workers are only set up once
+    # there is something to crawl, so a run with nothing to do exits quickly
+    crawler = None
+    batch_size = int(config.get('batch_size', int(config.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)) * 4))
+    selector_stats_file = config.get('selector_stats_file', 'selector_stats.json')
+
+    if args.check_updates:
+        if scheduler is not None:
+            visits = scheduler.next_visits(args.urls, index.last_crawled_many(args.urls))
+            now = time.time()
+            stale_urls = [url for url in args.urls if visits[url] <= now]
+            frontier.requeue(stale_urls)
+            frontier.schedule_many((url, visits[url]) for url in args.urls if visits[url] > now)
+        else:
+            stale_urls = index.stale_urls(args.urls)
+            frontier.requeue(stale_urls)
+            stale = set(stale_urls)
+            frontier.mark_done_many(url for url in args.urls if url not in stale)
+        logger.info(f"{len(stale_urls)} of {len(args.urls)} URLs need updating")
+
+    # Serve metrics at /metrics and/or write them to a snapshot file
+    exporter = start_exporter(config)
 
     logger.info("Starting continuous crawling process...")
-    logger.info(f"Using rate limit of {args.rate_limit} seconds")
 
     while True:
         try:
-            # Get the next URL to crawl
-            url = url_manager.get_next_url()
-            if not url:
+            # Claim the next batch of eligible URLs
+            batch = frontier.dequeue(batch_size)
+            QUEUE_DEPTH.labels(queue='frontier').set(frontier.count(PENDING))
+
+            if not batch:
+                if scheduler is not None and frontier.requeue_due(failed_after=scheduler.initial_interval):
+                    continue
+                next_eligible = frontier.next_eligible_time()
+                if next_eligible is not None:
+                    time.sleep(min(max(0, next_eligible - time.time()), 300))
+                    continue
+                if args.once:
+                    logger.info("No more URLs to crawl")
+                    break
+                next_revisit = frontier.next_revisit_time() if scheduler is not None else None
+                if next_revisit is not None:
+                    # Sleep until the next page is due, waking up regularly for failed URLs
+                    logger.info(f"No URLs due, next revisit at {time.ctime(next_revisit)}: {scheduler.stats()}")
+                    time.sleep(min(max(1, next_revisit - time.time()), 3600))
+                    continue
                 logger.info("No more URLs to crawl. Waiting for 24 hours before next check...")
                 time.sleep(24 * 3600)
-                url_manager = URLManager(args.urls)
-                continue
-
-            logger.info(f"Crawling URL: {url}")
-            
-            # Add rate limiting delay
-            time.sleep(args.rate_limit)
-            
-            # Fetch HTML content
-            html_content = http_request.get(url, render_js=True)
-            if not html_content:
-                error_logger.log_to_db('ERROR', url, "Failed to retrieve HTML content", "HTTP request failed")
-                url_manager.mark_crawled(url)
-                continue
-
-            # Extract metadata and lyrics
-            title, artist = html_parser.extract_metadata(html_content, url)
-            lyrics = html_parser.extract_lyrics(html_content, url)
-
-            if not lyrics:
-                error_logger.log_to_db('WARNING', url, "No lyrics found", "Content extraction failed")
-                url_manager.mark_crawled(url)
-                continue
-
-            # Format data
-            formatted_data = data_formatter.format_data(title, artist, lyrics, url)
-            if not formatted_data:
-                error_logger.log_to_db('ERROR', url, "Failed to format data", "Data formatting error")
-                url_manager.mark_crawled(url)
+                frontier.requeue()
                 continue
 
-            # Persist data
-            existing_data.append(formatted_data)
-            persistence.save_data(existing_data, 'song_lyrics.json')
-            url_manager.mark_crawled(url)
-
-            logger.info(f"Successfully crawled and saved data for: {url}")
+            if crawler is None:
+                crawler = build_crawler(config, frontier, index, error_logger, dedup, scheduler, discovery)
+                log_settings(crawler)
+            logger.info(f"Crawling batch of {len(batch)} URLs")
+            asyncio.run(crawler.pipeline.run(batch))
+            crawler.pipeline.dump_selector_stats(selector_stats_file)
+            for host, stats in crawler.http_request.pool_stats().items():
+                logger.debug(f"Connections to {host}: {stats}")
 
         except KeyboardInterrupt:
             logger.info("Crawling process stopped by user")
@@ -115,8 +328,24 @@ def main():
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}"
             logger.error(error_msg)
-            error_logger.log_to_db('EXCEPTION', url, error_msg, str(e))
+            error_logger.log_to_db('EXCEPTION', None, error_msg, str(e))
             time.sleep(300)  # Wait 5 minutes before retrying
 
+    if crawler is not None:
+        crawler.pipeline.dump_selector_stats(selector_stats_file)
+        close_crawler(crawler)
+    frontier.close()
+    index.close()
+    store.close()
+    if dedup is not None:
+        dedup.close()
+    if scheduler is not None:
+        scheduler.close()
+    if discovery is not None:
+        discovery.close()
+    error_logger.close()
+    if exporter is not None:
+        exporter.close()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,357 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; spans a fast parse up to a slow render
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(value)
+    return repr(value)
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (name + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+               for name, value in labels)
+    return '{' + ','.join(escaped) + '}'
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _default(self):
+        # Metrics without labels have a single child
+        return self.labels()
+
+    def _items(self):
+        with self._lock:
+            items = list(self._children.items())
+        return [(tuple(zip(self.labelnames, key)), child) for key, child in sorted(items)]
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        self.value = float(value)
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default().inc(amount)
+
+    def samples(self):
+        return [(self.name, labels, child.value) for labels, child in self._items()]
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, amount=1):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the block as in progress while it runs."""
+        child = self.labels(**labels)
+        child.inc()
+        try:
+            yield
+        finally:
+            child.dec()
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', 'count', 'max', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+            self.max = max(self.max, value)
+
+    def cumulative(self):
+        with self._lock:
+            counts = list(self.counts)
+        total = 0
+        result = []
+        for bound, count in zip(self.bounds + (math.inf,), counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q):
+        """Estimate a quantile by interpolating inside its bucket.
+
+        The estimate never exceeds the largest value observed, which keeps
+        it sensible when every value falls into the first bucket.
+        """
+        buckets = self.cumulative()
+        total = buckets[-1][1]
+        if not total:
+            return None
+        rank = q * total
+        lower, below = 0.0, 0
+        for bound, cumulative in buckets:
+            if cumulative >= rank:
+                if bound == math.inf:
+                    return min(lower, self.max)
+                inside = cumulative - below
+                return min(lower + (bound - lower) * ((rank - below) / inside if inside else 0), self.max)
+            lower, below = bound, cumulative
+        return min(lower, self.max)
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramValue(self.bounds)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes, in seconds."""
+        child = self.labels(**labels)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            child.observe(time.perf_counter() - start)
+
+    def samples(self):
+        samples = []
+        for labels, child in self._items():
+            for bound, count in child.cumulative():
+                samples.append((f"{self.name}_bucket", labels + (('le', _format_value(float(bound))),), count))
+            samples.append((f"{self.name}_sum", labels, child.sum))
+            samples.append((f"{self.name}_count", labels, child.count))
+        return samples
+
+class MetricsRegistry:
+    """A set of counters, gauges and histograms with two export formats.
+
+    `render` produces the Prometheus text exposition format and `snapshot`
+    a JSON-friendly dict, which for histograms adds the mean and estimated
+    median and 95th percentile so a snapshot file can be read directly.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def metrics(self):
+        with self._lock:
+            return [self._metrics[name] for name in sorted(self._metrics)]
+
+    def render(self):
+        lines = []
+        for metric in self.metrics():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        result = {}
+        for metric in self.metrics():
+            values = []
+            for labels, child in metric._items():
+                entry = {'labels': dict(labels)}
+                if isinstance(child, _HistogramValue):
+                    p50, p95 = child.quantile(0.5), child.quantile(0.95)
+                    entry.update({
+                        'count': child.count,
+                        'sum': round(child.sum, 6),
+                        'mean': round(child.sum / child.count, 6) if child.count else None,
+                        'p50': round(p50, 6) if p50 is not None else None,
+                        'p95': round(p95, 6) if p95 is not None else None,
+                        'max': round(child.max, 6)
+                    })
+                else:
+                    entry['value'] = child.value
+                values.append(entry)
+            result[metric.name] = {'type': metric.type, 'help': metric.help, 'values': values}
+        return result
+
+    def write_snapshot(self, path):
+        """Atomically replace `path` with the current snapshot."""
+        temp_file = f"{path}.tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump({'timestamp': time.time(), 'metrics': self.snapshot()}, f, indent=2)
+            os.replace(temp_file, path)
+        except Exception as e:
+            logger.error(f"Failed to write metrics snapshot to {path}: {e}")
+            return False
+        return True
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'crawler_stage_seconds',
+    'Time spent in each crawl stage (rate_limit, proxy_select, network, render, parse, clean, persist)',
+    ['stage'])
+REQUESTS = REGISTRY.counter('crawler_requests_total', 'HTTP requests by outcome', ['outcome'])
+RESPONSE_BYTES = REGISTRY.counter('crawler_response_bytes_total', 'Bytes of response bodies received')
+IN_FLIGHT = REGISTRY.gauge('crawler_requests_in_flight', 'HTTP requests currently in progress')
+QUEUE_DEPTH = REGISTRY.gauge('crawler_queue_depth', 'Items waiting in each internal queue', ['queue'])
+PAGES = REGISTRY.counter('crawler_pages_total', 'Pages parsed, by whether lyrics were found', ['result'])
+RECORDS = REGISTRY.counter('crawler_records_written_total', 'Records written to the output', ['output'])
+LINKS = REGISTRY.counter('crawler_discovered_links_total', 'Links found by discovery, by whether they were queued',
+                         ['outcome'])
+
+def time_stage(stage):
+    """Context manager adding the time spent in the block to `stage`."""
+    return STAGE_SECONDS.time(stage=stage)
+
+def observe_stage(stage, seconds):
+    """Add a duration measured elsewhere, e.g. in a worker process, to `stage`."""
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class MetricsExporter:
+    """Serves a registry at /metrics and writes it to a snapshot file.
+
+    With `metrics_port` set, Prometheus can scrape
+    http://<metrics_host>:<metrics_port>/metrics. With
+    `metrics_snapshot_file` set, a JSON snapshot is written there every
+    `metrics_snapshot_interval` seconds (default 60) and once more on close.
+    """
+
+    def __init__(self, config, registry=REGISTRY):
+        self.registry = registry
+        self.port = config.get('metrics_port')
+        self.host = config.get('metrics_host', '127.0.0.1')
+        self.snapshot_file = config.get('metrics_snapshot_file')
+        self.snapshot_interval = float(config.get('metrics_snapshot_interval', 60))
+        self.server = None
+        self._threads = []
+        self._stop = threading.Event()
+
+    def start(self):
+        if self.port is not None:
+            self.server = ThreadingHTTPServer((self.host, int(self.port)), _MetricsHandler)
+            self.server.daemon_threads = True
+            self.server.registry = self.registry
+            self._spawn(self.server.serve_forever, 'metrics-server')
+            logger.info(f"Serving metrics at http://{self.host}:{self.server.server_address[1]}/metrics")
+        if self.snapshot_file:
+            self._spawn(self._snapshot_loop, 'metrics-snapshot')
+        return self
+
+    def _spawn(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _snapshot_loop(self):
+        while not self._stop.wait(self.snapshot_interval):
+            self.registry.write_snapshot(self.snapshot_file)
+
+    def close(self):
+        self._stop.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self.snapshot_file:
+            self.registry.write_snapshot(self.snapshot_file)
+
+def start_exporter(config, registry=REGISTRY):
+    """Start a MetricsExporter, or return None when no export is configured."""
+    if config.get('metrics_port') is None and not config.get('metrics_snapshot_file'):
+        return None
+    return MetricsExporter(config, registry).start()
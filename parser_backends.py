@@ -0,0 +1,175 @@
+import logging
+
+# Each backend imports its parser library when it is created, so importing
+# this module (and everything that builds on it) stays cheap and only the
+# backend actually used is ever loaded.
+
+logger = logging.getLogger(__name__)
+
+# BeautifulSoup leaves the contents of these tags out of get_text(); the
+# other backends skip them too so every backend extracts the same text.
+SKIPPED_TEXT_TAGS = frozenset(['script', 'style', 'template'])
+
+class BeautifulSoupBackend:
+    """BeautifulSoup with the pure-Python html.parser tree builder."""
+
+    name = 'html.parser'
+    # Tokenizing inline scripts and comments in pure Python is expensive, so
+    # stripping them first with HTMLPrefilter pays off
+    benefits_from_prefilter = True
+
+    def __init__(self, features='html.parser'):
+        import soupsieve
+        from bs4 import BeautifulSoup
+        self.features = features
+        self._soup = BeautifulSoup
+        self._soupsieve = soupsieve
+
+    def parse(self, html):
+        return self._soup(html, self.features)
+
+    def compile(self, selector):
+        return self._soupsieve.compile(selector)
+
+    def select(self, doc, selector):
+        return doc.select(selector)
+
+    def select_one(self, doc, selector):
+        return doc.select_one(selector)
+
+    def get_text(self, node):
+        return node.get_text(strip=True, separator='\n')
+
+    def get_attr(self, node, name):
+        return node.get(name)
+
+class LxmlBackend:
+    """libxml2 parsing through lxml.html, with cssselect for CSS queries."""
+
+    name = 'lxml'
+    benefits_from_prefilter = False
+
+    def __init__(self):
+        try:
+            import lxml.html
+            from lxml.cssselect import CSSSelector
+        except ImportError:
+            raise ImportError("lxml and cssselect are required for the lxml parser backend") from None
+        self._html = lxml.html
+        self._css_selector = CSSSelector
+        self._parser = lxml.html.HTMLParser(encoding='utf-8')
+        self._selectors = {}
+
+    def parse(self, html):
+        if isinstance(html, str):
+            html = html.encode('utf-8')
+        return self._html.document_fromstring(html, parser=self._parser)
+
+    def compile(self, selector):
+        if not isinstance(selector, str):
+            return selector
+        compiled = self._selectors.get(selector)
+        if compiled is None:
+            compiled = self._selectors[selector] = self._css_selector(selector)
+        return compiled
+
+    def select(self, doc, selector):
+        return self.compile(selector)(doc)
+
+    def select_one(self, doc, selector):
+        elements = self.compile(selector)(doc)
+        return elements[0] if elements else None
+
+    def _iter_text(self, element):
+        if element.text:
+            yield element.text
+        for child in element:
+            # Comments and processing instructions have a non-string tag
+            if isinstance(child.tag, str) and child.tag not in SKIPPED_TEXT_TAGS:
+                yield from self._iter_text(child)
+            if child.tail:
+                yield child.tail
+
+    def get_text(self, node):
+        return '\n'.join(text.strip() for text in self._iter_text(node) if text.strip())
+
+    def get_attr(self, node, name):
+        return node.get(name)
+
+class SelectolaxBackend:
+    """The lexbor engine through selectolax, the fastest available backend."""
+
+    name = 'selectolax'
+    benefits_from_prefilter = False
+
+    def __init__(self):
+        try:
+            from selectolax.lexbor import LexborHTMLParser
+        except ImportError:
+            raise ImportError("selectolax is required for the selectolax parser backend") from None
+        self._parser = LexborHTMLParser
+
+    def parse(self, html):
+        return self._parser(html)
+
+    def compile(self, selector):
+        # lexbor has no reusable compiled form; selectors are passed as text
+        return selector
+
+    def select(self, doc, selector):
+        return doc.css(selector)
+
+    def select_one(self, doc, selector):
+        return doc.css_first(selector)
+
+    def get_text(self, node):
+        parts = []
+        for child in node.traverse(include_text=True):
+            if child.tag == '-text' and child.parent.tag not in SKIPPED_TEXT_TAGS:
+                text = child.text_content.strip()
+                if text:
+                    parts.append(text)
+        return '\n'.join(parts)
+
+    def get_attr(self, node, name):
+        return node.attributes.get(name)
+
+BACKENDS = {
+    SelectolaxBackend.name: SelectolaxBackend,
+    LxmlBackend.name: LxmlBackend,
+    BeautifulSoupBackend.name: BeautifulSoupBackend,
+}
+
+# Preference order for the 'auto' setting, fastest first
+AUTO_ORDER = ['selectolax', 'lxml', 'html.parser']
+
+def available_backends():
+    """Names of the backends whose dependencies are installed."""
+    names = []
+    for name in AUTO_ORDER:
+        try:
+            BACKENDS[name]()
+            names.append(name)
+        except ImportError:
+            pass
+    return names
+
+def get_backend(name='html.parser'):
+    """Return a parser backend by name, falling back to html.parser.
+
+    `name` is one of the keys of BACKENDS, or 'auto' for the fastest one
+    installed. A backend whose dependencies are missing falls back to the
+    BeautifulSoup html.parser backend with a warning.
+    """
+    candidates = AUTO_ORDER if name == 'auto' else [name]
+    for candidate in candidates:
+        backend_class = BACKENDS.get(candidate)
+        if backend_class is None:
+            logger.warning(f"Unknown parser backend: {candidate}")
+            continue
+        try:
+            return backend_class()
+        except ImportError as e:
+            if name != 'auto':
+                logger.warning(f"{e}; falling back to html.parser")
+    return BeautifulSoupBackend()
@@ -0,0 +1,85 @@
+"""Sample lyrics pages and selectors for parser tests and benchmarks.
+
+FIXTURES holds (html, url) pairs covering the genius.com selectors, the
+`default` selectors of config.json and a site with selectors of its own;
+every parser backend must extract the same fields from them.
+"""
+import json
+
+with open('config.json', 'r') as f:
+    SELECTORS = json.load(f)['SELECTORS']
+
+SELECTORS = dict(SELECTORS, **{
+    'example.com': {
+        'title': ['h1'],
+        'artist': ['.artist'],
+        'lyrics': ['div.lyrics']
+    }
+})
+
+GENIUS_PAGE = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>Song Title | Genius Lyrics</title>
+    <meta property="og:title" content="Song Title">
+    <meta property="og:site_name" content="Genius">
+    <script>window.__PRELOADED_STATE__ = {"lyrics": "not these"};</script>
+    <style>.Lyrics__Container { color: red; }</style>
+</head>
+<body>
+    <h1 class="SongHeader__Title-sc-1b7aqpg-7">Song Title</h1>
+    <a class="SongHeader__Artist-sc-1b7aqpg-9" href="/artists/Some-artist">Some Artist</a>
+    <div class="ad"><script>loadAds();</script><iframe src="/ad"></iframe></div>
+    <div data-lyrics-container="true" class="Lyrics__Container-sc-1ynbvzw-6">
+        [Verse 1]<br>First line &amp; more<br/>
+        <a href="/annotation"><span>Second line</span></a><br>
+        <!-- annotation marker -->Third line<script>track();</script>
+    </div>
+    <div data-lyrics-container="true" class="Lyrics__Container-sc-1ynbvzw-6">
+        [Chorus]<br><i>Fourth</i> line
+    </div>
+</body>
+</html>
+"""
+
+DEFAULT_PAGE = """
+<html>
+<head>
+    <title>Default Title</title>
+    <meta name="artist" content="Meta Artist">
+</head>
+<body>
+    <div class="song-header"><h1>Header Title</h1></div>
+    <div class="artist-header"><h2>Header Artist</h2></div>
+    <div class="song-lyrics">
+        <p>Line one</p>
+        <p>  Line two  </p>
+        <p></p>
+        <noscript>Enable JavaScript</noscript>
+    </div>
+</body>
+</html>
+"""
+
+TEST_PAGE = """
+<html>
+<head>
+    <title>Test Title</title>
+    <meta name="artist" content="Test Artist">
+</head>
+<body>
+    <h1>Main Title</h1>
+    <div class="artist">Artist Name</div>
+    <div class="lyrics">Test lyrics</div>
+</body>
+</html>
+"""
+
+# (html, url) pairs every backend must extract identically
+FIXTURES = [
+    (GENIUS_PAGE, 'https://genius.com/Some-artist-song-title-lyrics'),
+    (DEFAULT_PAGE, 'https://lyrics.example.org/song'),
+    (TEST_PAGE, 'http://example.com/song'),
+    (TEST_PAGE, 'http://another-example.com/song'),
+]
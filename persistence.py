@@ -1,34 +1,275 @@
 import json
 import logging
 import os
+import time
+
+from metrics import RECORDS, time_stage
 
 logger = logging.getLogger(__name__)
 
+class JSONLStore:
+    """Append-only JSON Lines output store.
+
+    Each record is written as one line at the end of the file, so saving a
+    page costs the same no matter how large the corpus is. Writes are
+    flushed to the OS immediately, so they survive the process being killed,
+    and group-committed to disk: the file is fsynced after `fsync_every`
+    records or `fsync_interval` seconds, whichever comes first. Re-crawled URLs simply
+    append a newer record; compaction periodically rewrites the file keeping
+    only the latest record per `url`.
+    """
+
+    def __init__(self, path, fsync_every=100, fsync_interval=5.0, compact_ratio=2.0,
+                 compact_min_bytes=1024 * 1024, temp_dir=None):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self.temp_dir = temp_dir or os.path.dirname(os.path.abspath(path))
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._compacted_size = 0
+        self.compactions = 0
+        self.on_compact = []
+
+    def open(self):
+        if self._file is None:
+            self._repair_tail()
+            self._file = open(self.path, 'ab')
+            self._compacted_size = self._file.tell()
+        return self
+
+    def _repair_tail(self):
+        """Drop a partial last line left by a crash, so the next record starts on a line of its own."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            if end == 0:
+                return
+            f.seek(end - 1)
+            if f.read(1) == b'\n':
+                return
+            keep = 0
+            position = end
+            while position > 0:
+                start = max(0, position - 65536)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b'\n')
+                if newline != -1:
+                    keep = start + newline + 1
+                    break
+                position = start
+            logger.warning(f"Truncating a partial record of {end - keep} bytes at the end of {self.path}")
+            f.truncate(keep)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
+
+    def size(self):
+        if self._file is not None:
+            return self._file.tell()
+        return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def append(self, record):
+        """Append one record and return its (offset, length) in the file."""
+        with time_stage('persist'):
+            self.open()
+            line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+            offset = self._file.tell()
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_every
+                    or time.monotonic() - self._last_sync >= self.fsync_interval):
+                self.sync()
+            self.maybe_compact()
+        RECORDS.labels(output='jsonl').inc()
+        return offset, len(line)
+
+    def sync(self):
+        if self._file is None:
+            return
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def iter_entries(self, start=0):
+        """Stream (offset, length, record) for every record from `start` onwards."""
+        if self._file is not None:
+            self._file.flush()
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                length = len(line)
+                if line.strip():
+                    try:
+                        yield offset, length, json.loads(line)
+                    except ValueError:
+                        # A crash can leave a partial last line behind
+                        logger.warning(f"Skipping corrupt record at offset {offset} in {self.path}")
+                offset += length
+
+    def iter_records(self):
+        for _, _, record in self.iter_entries():
+            yield record
+
+    def read_at(self, offset, length):
+        """Read the record stored at the given offset."""
+        if self._file is not None:
+            self._file.flush()
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def read_many(self, positions):
+        """Stream the records at the given (offset, length) positions through one file handle."""
+        if self._file is not None:
+            self._file.flush()
+        with open(self.path, 'rb') as f:
+            for offset, length in positions:
+                f.seek(offset)
+                yield json.loads(f.read(length))
+
+    def maybe_compact(self):
+        """Compact once the file has grown by `compact_ratio` since the last compaction.
+
+        The geometric threshold keeps the amortized cost per append constant.
+        """
+        size = self.size()
+        if size >= self.compact_min_bytes and size >= self._compacted_size * self.compact_ratio:
+            return self.compact()
+        return False
+
+    def compact(self):
+        """Rewrite the file keeping only the latest record for each url."""
+        latest = {}
+        for offset, _, record in self.iter_entries():
+            url = record.get('url')
+            if url:
+                latest[url] = offset
+
+        was_open = self._file is not None
+        self.close()
+        temp_file = os.path.join(self.temp_dir, os.path.basename(self.path) + '.compact')
+        try:
+            with open(temp_file, 'wb') as out:
+                for offset, _, record in self.iter_entries():
+                    url = record.get('url')
+                    if url and latest.get(url) != offset:
+                        continue
+                    out.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temp_file, self.path)
+            logger.info(f"Compacted {self.path} to {len(latest)} records")
+        except Exception as e:
+            logger.error(f"Failed to compact {self.path}: {e}")
+            return False
+        finally:
+            if was_open:
+                self.open()
+            self._compacted_size = self.size()
+        self.compactions += 1
+        for callback in self.on_compact:
+            callback(self)
+        return True
+
 class Persistence:
     def __init__(self, config):
         self.config = config
-        self.temp_dir = self.config.get('temp_dir')
-        if not self.temp_dir:
-            self.temp_dir = 'temp'
-            os.makedirs(self.temp_dir, exist_ok=True)
+        self.temp_dir = self.config.get('temp_dir') or 'temp'
+        os.makedirs(self.temp_dir, exist_ok=True)
+
+    def open_store(self, output_file):
+        """Open an append-only JSONL store for the given output file."""
+        store_config = self.config.get('output_store', {})
+        return JSONLStore(
+            output_file,
+            fsync_every=store_config.get('fsync_every', 100),
+            fsync_interval=store_config.get('fsync_interval', 5.0),
+            compact_ratio=store_config.get('compact_ratio', 2.0),
+            compact_min_bytes=store_config.get('compact_min_bytes', 1024 * 1024),
+            temp_dir=self.temp_dir
+        ).open()
+
+    def iter_existing_data(self, output_file):
+        """Stream records from a JSONL store or a legacy JSON array file."""
+        if not os.path.exists(output_file):
+            return
+        if output_file.endswith('.jsonl'):
+            yield from JSONLStore(output_file).iter_records()
+        else:
+            with open(output_file, 'r', encoding='utf-8') as f:
+                yield from json.load(f)
 
     def load_existing_data(self, output_file):
         try:
-            if os.path.exists(output_file):
-                with open(output_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            return list(self.iter_existing_data(output_file))
         except Exception as e:
             logger.warning(f"Could not load existing data: {e}")
         return []
 
+    def import_legacy_json(self, json_file, store, index=None):
+        """Copy records from a legacy JSON array file into the store.
+
+        Without an `index` the file is only imported into an empty store.
+        With the store's RecordIndex, records newer than the stored record
+        of their url are appended to a non-empty store too, so a legacy file
+        that was written to after the first import is still merged; the
+        file is only read again once it has changed.
+        """
+        if not os.path.exists(json_file) or (index is None and store.size()):
+            return 0
+        if index is not None:
+            stat = os.stat(json_file)
+            version = stat.st_mtime_ns ^ stat.st_size
+            key = f"legacy_json:{os.path.abspath(json_file)}"
+            if index.get_meta(key) == version:
+                return 0
+        count = 0
+        for record in self.load_existing_data(json_file):
+            if index is None:
+                store.append(record)
+            else:
+                url = record.get('url')
+                if url in index and (index.last_crawled(url) or '') >= (record.get('last_crawled') or ''):
+                    continue
+                index.append(record)
+            count += 1
+        store.sync()
+        if index is not None:
+            index.set_meta(key, version)
+            index.flush()
+        if count:
+            logger.info(f"Imported {count} records from {json_file} into {store.path}")
+        return count
+
     def save_data(self, data, output_file):
         temp_file = os.path.join(self.temp_dir, 'temp_lyrics.json')
         try:
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-            os.replace(temp_file, output_file)
+            with time_stage('persist'):
+                with open(temp_file, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, indent=2, ensure_ascii=False)
+                os.replace(temp_file, output_file)
+            RECORDS.labels(output='json').inc(len(data))
             logger.info(f"Successfully saved data to {output_file}")
         except Exception as e:
             logger.error(f"Failed to save data to {output_file}: {e}")
             return False
-        return True
\ No newline at end of file
+        return True
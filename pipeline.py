@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlparse
+
+from html_parser import HTMLParser
+from metrics import PAGES, QUEUE_DEPTH, observe_stage, time_stage
+from selector_plan import merge_plan_stats, write_stats
+
+logger = logging.getLogger(__name__)
+
+# Parser of the current parse worker process, built by init_parse_worker
+_worker_parser = None
+
+def init_parse_worker(config):
+    """ProcessPoolExecutor initializer: build one HTMLParser per worker."""
+    global _worker_parser
+    _worker_parser = HTMLParser(config)
+
+def parse_page(html, url):
+    """Extract (title, artist, lyrics) from a page in a parse worker.
+
+    Returns the fields, the page result and clean stage seconds for the
+    metrics, and (pid, selector stats). The stats are sent with every page,
+    since a worker cannot tell which of its pages is the last one.
+    """
+    fields, result, timings = _worker_parser.extract_page(html, url)
+    return fields, result, timings.get('clean'), (os.getpid(), _worker_parser.selector_stats())
+
+class CrawlPipeline:
+    """Fetch, parse and persist stages connected by bounded queues.
+
+    Fetching runs on the AsyncFetcher's threads, parsing on a pool of
+    `parse_workers` processes (so extraction never holds the GIL the
+    fetchers need) and persisting on the event loop thread, which owns the
+    SQLite connections. The queues hold at most `pipeline_queue_size`
+    pages, and a fetcher keeps its request slot until the parse queue takes
+    its page, so a backlog of parsing slows fetching down instead of piling
+    up pages in memory.
+
+    When the fetch strategy has no extract function of its own, the parse
+    stage checks the result with `has_content` and asks the strategy to
+    render pages whose content is missing, reporting the outcome back so the
+    strategy can learn which domains need JavaScript.
+
+    With `parse_workers` set to 0 pages are parsed on the event loop thread
+    with `html_parser`. Otherwise metrics recorded inside worker processes
+    would stay there, so the workers return the page result and clean time
+    to be recorded here, and the parse stage is timed around the call into
+    the worker, including the transfer to and from it.
+    """
+
+    def __init__(self, fetcher, config, persist, has_content=bool, strategy=None, html_parser=None):
+        self.fetcher = fetcher
+        self.config = config
+        self.persist = persist
+        self.has_content = has_content
+        self.strategy = strategy
+        self.html_parser = html_parser
+        self.parse_workers = int(config.get('parse_workers', os.cpu_count() or 1))
+        self.queue_size = int(config.get('pipeline_queue_size', max(2, self.parse_workers * 2)))
+        self._pool = None
+        self.worker_stats = {}
+        self.stats = {'fetched': 0, 'parsed': 0, 'escalated': 0, 'persisted': 0, 'parse_errors': 0}
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.parse_workers,
+                                             initializer=init_parse_worker,
+                                             initargs=(self.config,))
+        return self._pool
+
+    async def _parse(self, html, url):
+        if self.parse_workers <= 0:
+            return self.html_parser.extract(html, url)
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        try:
+            with time_stage('parse'):
+                fields, result, clean_seconds, (pid, stats) = await loop.run_in_executor(
+                    pool, parse_page, html, url)
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory); start a fresh pool, unless
+            # another page's failure already did
+            logger.error(f"Parse worker pool broke while parsing {url}: {e}")
+            pool.shutdown(wait=False)
+            if self._pool is pool:
+                self._pool = None
+            self.stats['parse_errors'] += 1
+            return None
+        except Exception as e:
+            logger.error(f"Failed to parse {url}: {e}")
+            self.stats['parse_errors'] += 1
+            return None
+        PAGES.labels(result=result).inc()
+        if clean_seconds is not None:
+            observe_stage('clean', clean_seconds)
+        self.worker_stats[pid] = stats
+        return fields
+
+    async def _escalate(self, url, result):
+        """Render a page whose static HTML lacked the content and parse it again."""
+        loop = asyncio.get_running_loop()
+        html = await loop.run_in_executor(None, self.strategy.render, url)
+        if html is None:
+            return None
+        fields = await self._parse(html, url)
+        if not self.has_content(fields):
+            return None
+        self.stats['escalated'] += 1
+        self.strategy.record_escalation(urlparse(url).netloc)
+        return result._replace(html=html, extracted=fields, rendered=True)
+
+    async def _parse_stage(self, parse_queue, persist_queue):
+        escalate = self.strategy is not None and self.strategy.extract is None
+        while True:
+            item = await parse_queue.get()
+            QUEUE_DEPTH.labels(queue='parse').set(parse_queue.qsize())
+            if item is None:
+                break
+            url, result = item
+            if result.html is not None and not result.not_modified and result.extracted is None:
+                fields = await self._parse(result.html, url)
+                self.stats['parsed'] += 1
+                result = result._replace(extracted=fields)
+                if escalate and not result.rendered:
+                    if self.has_content(fields):
+                        self.strategy.record_static_hit(urlparse(url).netloc)
+                    else:
+                        result = await self._escalate(url, result) or result
+            await persist_queue.put((url, result))
+            QUEUE_DEPTH.labels(queue='persist').set(persist_queue.qsize())
+
+    async def _persist_stage(self, persist_queue):
+        while True:
+            item = await persist_queue.get()
+            QUEUE_DEPTH.labels(queue='persist').set(persist_queue.qsize())
+            if item is None:
+                break
+            url, result = item
+            try:
+                self.persist(url, result)
+                self.stats['persisted'] += 1
+            except Exception as e:
+                logger.error(f"Failed to persist {url}: {e}")
+
+    async def _fetch(self, url, parse_queue):
+        await self.fetcher.fetch_into(url, parse_queue)
+        self.stats['fetched'] += 1
+
+    async def run(self, urls):
+        """Crawl a batch of URLs through all stages and wait until every page is persisted."""
+        parse_queue = asyncio.Queue(self.queue_size)
+        persist_queue = asyncio.Queue(self.queue_size)
+        fetchers = [asyncio.ensure_future(self._fetch(url, parse_queue)) for url in urls]
+        parsers = [asyncio.ensure_future(self._parse_stage(parse_queue, persist_queue))
+                   for _ in range(max(1, self.parse_workers))]
+        persister = asyncio.ensure_future(self._persist_stage(persist_queue))
+        tasks = fetchers + parsers + [persister]
+        try:
+            await asyncio.gather(*fetchers)
+            for _ in parsers:
+                await parse_queue.put(None)
+            await asyncio.gather(*parsers)
+            await persist_queue.put(None)
+            await persister
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def selector_stats(self):
+        if self.parse_workers <= 0:
+            return self.html_parser.selector_stats()
+        return merge_plan_stats(self.worker_stats.values())
+
+    def dump_selector_stats(self, path):
+        return write_stats(self.selector_stats(), path)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
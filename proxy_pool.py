@@ -0,0 +1,166 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+class ProxyStats:
+    """Rolling health of one proxy.
+
+    Latency and success rate are exponentially weighted moving averages, so
+    a proxy's score follows its recent behaviour. Each failure puts the
+    proxy in a cooldown that doubles with every consecutive failure, and a
+    success ends the streak.
+    """
+
+    __slots__ = ('proxy', 'latency', 'success_rate', 'successes', 'failures',
+                 'consecutive_failures', 'cooldown_until')
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.latency = None
+        self.success_rate = 1.0
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+
+    def record_success(self, latency, alpha):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.latency = latency if self.latency is None else (1 - alpha) * self.latency + alpha * latency
+        self.success_rate = (1 - alpha) * self.success_rate + alpha
+
+    def record_failure(self, now, alpha, cooldown, max_cooldown):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.success_rate = (1 - alpha) * self.success_rate
+        self.cooldown_until = now + min(cooldown * 2 ** (self.consecutive_failures - 1), max_cooldown)
+
+    def score(self, default_latency):
+        # Untested proxies are assumed to be as fast as the typical one
+        latency = self.latency if self.latency is not None else default_latency
+        return self.success_rate / max(latency, 0.001)
+
+    def stats(self, now):
+        return {
+            'proxy': self.proxy,
+            'latency_ms': round(self.latency * 1000, 1) if self.latency is not None else None,
+            'success_rate': round(self.success_rate, 4),
+            'successes': self.successes,
+            'failures': self.failures,
+            'cooling_down_s': round(max(0.0, self.cooldown_until - now), 1)
+        }
+
+class ProxyPool:
+    """Health-checked proxy pool with latency-scored selection.
+
+    `probe_all` checks every proxy concurrently against `proxy_probe_url`
+    (point it at a local stub in tests). Real requests report back through
+    `record_success` and `record_failure`, so the stats keep up with how the
+    proxies behave during the crawl. `choose` picks among the proxies that
+    are not cooling down, weighted by score (success rate over latency), so
+    fast and reliable proxies carry most of the traffic without all of it
+    going through a single one.
+    """
+
+    def __init__(self, proxies, config=None, session=None, clock=time.monotonic):
+        config = config or {}
+        self.probe_url = config.get('proxy_probe_url', 'http://httpbin.org/ip')
+        self.probe_timeout = float(config.get('proxy_probe_timeout', 5))
+        self.probe_workers = int(config.get('proxy_probe_workers', 16))
+        self.cooldown = float(config.get('proxy_cooldown', 60))
+        self.max_cooldown = float(config.get('proxy_max_cooldown', 3600))
+        self.alpha = float(config.get('proxy_stats_alpha', 0.3))
+        self.session = session or requests.Session()
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.proxies = {proxy: ProxyStats(proxy) for proxy in dict.fromkeys(proxies)}
+
+    def __len__(self):
+        return len(self.proxies)
+
+    @staticmethod
+    def as_requests_proxies(proxy):
+        return {'http': proxy, 'https': proxy} if proxy else None
+
+    def _probe(self, proxy):
+        start = time.perf_counter()
+        try:
+            response = self.session.get(self.probe_url, proxies=self.as_requests_proxies(proxy),
+                                        timeout=self.probe_timeout)
+            ok = response.status_code == 200
+        except Exception as e:
+            logger.debug(f"Probe through {proxy} failed: {e}")
+            ok = False
+        if ok:
+            self.record_success(proxy, time.perf_counter() - start)
+        else:
+            self.record_failure(proxy)
+        return ok
+
+    def probe_all(self):
+        """Probe every proxy concurrently and return how many are working."""
+        if not self.proxies:
+            return 0
+        workers = min(self.probe_workers, len(self.proxies))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            working = sum(executor.map(self._probe, list(self.proxies)))
+        logger.info(f"{working} of {len(self.proxies)} proxies passed the health check")
+        return working
+
+    def record_success(self, proxy, latency):
+        with self._lock:
+            stats = self.proxies.get(proxy)
+            if stats is not None:
+                stats.record_success(latency, self.alpha)
+
+    def record_failure(self, proxy):
+        with self._lock:
+            stats = self.proxies.get(proxy)
+            if stats is not None:
+                stats.record_failure(self.clock(), self.alpha, self.cooldown, self.max_cooldown)
+                if stats.consecutive_failures == 1:
+                    logger.warning(f"Proxy failed, cooling down: {proxy}")
+
+    def available(self):
+        now = self.clock()
+        with self._lock:
+            return [proxy for proxy, stats in self.proxies.items() if stats.cooldown_until <= now]
+
+    def choose(self, exclude=()):
+        """Pick a proxy URL by score, or None if none is available.
+
+        Proxies that are cooling down are never picked, so when all of them
+        are the request goes out without a proxy until the first one
+        recovers.
+        """
+        now = self.clock()
+        with self._lock:
+            ready = [stats for proxy, stats in self.proxies.items()
+                     if proxy not in exclude and stats.cooldown_until <= now]
+            if not ready:
+                return None
+            latencies = [stats.latency for stats in ready if stats.latency is not None]
+            default_latency = sum(latencies) / len(latencies) if latencies else 1.0
+            weights = [stats.score(default_latency) for stats in ready]
+            return random.choices(ready, weights=weights)[0].proxy
+
+    def best(self):
+        """The proxy with the highest score among those not cooling down, or None."""
+        now = self.clock()
+        with self._lock:
+            ready = [stats for stats in self.proxies.values() if stats.cooldown_until <= now]
+            if not ready:
+                return None
+            return max(ready, key=lambda stats: stats.score(float('inf'))).proxy
+
+    def stats(self):
+        now = self.clock()
+        with self._lock:
+            return [stats.stats(now) for stats in self.proxies.values()]
@@ -0,0 +1,175 @@
+import asyncio
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from urllib.parse import urlparse
+
+from metrics import time_stage
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DELAY = 15.5
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.clock = clock
+        self.tokens = float(self.burst)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = max(0.0, now - self.updated)
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        with self._lock:
+            self._refill(self.clock())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def delay(self):
+        """Seconds until the next token is available (0 if one is ready now)."""
+        with self._lock:
+            self._refill(self.clock())
+            if self.tokens >= 1:
+                return 0.0
+            if self.rate <= 0:
+                return float('inf')
+            return (1 - self.tokens) / self.rate
+
+class DomainRateLimiter:
+    """One token bucket per domain.
+
+    Limits are read from the `RATE_LIMITS` section of config.json, keyed by
+    domain like `SELECTORS`, with a `default` entry for every other host:
+
+        "RATE_LIMITS": {
+            "genius.com": {"delay": 15.0, "burst": 1},
+            "default": {"delay": 5.0, "burst": 2}
+        }
+
+    `delay` is the sustained number of seconds between requests and `burst`
+    the number of requests allowed back to back after an idle period.
+    """
+
+    def __init__(self, config, clock=time.monotonic):
+        self.config = config
+        self.clock = clock
+        self.limits = dict(config.get('RATE_LIMITS') or {})
+        default = dict(self.limits.get('default') or {})
+        default.setdefault('delay', config.get('rate_limit', DEFAULT_DELAY))
+        default.setdefault('burst', 1)
+        self.limits['default'] = default
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def _get_limit(self, domain):
+        return self.limits.get(domain, self.limits['default'])
+
+    def min_interval(self, domain):
+        """Sustained number of seconds between requests to `domain`."""
+        limit = self._get_limit(domain)
+        return float(limit.get('delay', self.limits['default']['delay']))
+
+    def get_bucket(self, domain):
+        bucket = self.buckets.get(domain)
+        if bucket is None:
+            limit = self._get_limit(domain)
+            delay = self.min_interval(domain)
+            rate = 1.0 / delay if delay > 0 else float('inf')
+            with self._lock:
+                bucket = self.buckets.setdefault(
+                    domain, TokenBucket(rate, int(limit.get('burst', 1)), clock=self.clock))
+        return bucket
+
+    def try_acquire(self, domain):
+        return self.get_bucket(domain).try_acquire()
+
+    def delay(self, domain):
+        return self.get_bucket(domain).delay()
+
+    def acquire(self, domain):
+        """Block the calling thread until a request to `domain` is allowed."""
+        bucket = self.get_bucket(domain)
+        with time_stage('rate_limit'):
+            while not bucket.try_acquire():
+                time.sleep(bucket.delay())
+
+    async def wait(self, domain):
+        """Wait until a request to `domain` is allowed without blocking other hosts."""
+        bucket = self.get_bucket(domain)
+        with time_stage('rate_limit'):
+            while not bucket.try_acquire():
+                await asyncio.sleep(bucket.delay())
+
+class RateLimitedQueue:
+    """Per-domain URL queues that hand out whichever URL is allowed next.
+
+    A URL for a throttled host never holds up URLs for other hosts, so a
+    crawl over several sites takes roughly as long as its slowest site
+    rather than the sum of every site's delays.
+    """
+
+    def __init__(self, rate_limiter, urls=None):
+        self.rate_limiter = rate_limiter
+        self.queues = {}
+        self.ready = []  # heap of (ready_at, domain)
+        for url in urls or []:
+            self.put(url)
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def put(self, url):
+        domain = urlparse(url).netloc
+        queue = self.queues.get(domain)
+        if queue is None:
+            queue = self.queues[domain] = deque()
+        if not queue:
+            heapq.heappush(self.ready, (self.rate_limiter.clock(), domain))
+        queue.append(url)
+
+    def next_ready(self):
+        """Return (url, 0) for a URL that may be fetched now, or (None, wait).
+
+        `wait` is the number of seconds until some URL becomes ready, or None
+        once the queue is empty.
+        """
+        while self.ready:
+            ready_at, domain = self.ready[0]
+            now = self.rate_limiter.clock()
+            if ready_at > now:
+                return None, ready_at - now
+            heapq.heappop(self.ready)
+            queue = self.queues.get(domain)
+            if not queue:
+                continue
+            if not self.rate_limiter.try_acquire(domain):
+                heapq.heappush(self.ready, (now + self.rate_limiter.delay(domain), domain))
+                continue
+            url = queue.popleft()
+            if queue:
+                heapq.heappush(self.ready, (now + self.rate_limiter.delay(domain), domain))
+            return url, 0
+        return None, None
+
+    def get(self):
+        """Block until a URL is ready and return it, or None when empty."""
+        with time_stage('rate_limit'):
+            while True:
+                url, wait = self.next_ready()
+                if url or wait is None:
+                    return url
+                time.sleep(wait)
@@ -0,0 +1,226 @@
+import logging
+import sqlite3
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+class RecordIndex:
+    """URL-keyed SQLite index over a JSONLStore.
+
+    For every url the index keeps the offset and length of its latest record
+    in the store together with its `last_crawled` timestamp, so lookups and
+    staleness checks never need to load the output file. The index remembers
+    how much of the store it has seen and catches up on open, and it is
+    rebuilt automatically after the store is compacted.
+
+    With `read_only`, the index is opened without writing to it, for reading
+    a store while another process is appending to it; records the writer has
+    not committed to the index yet are picked up from the store by
+    `iter_records`.
+    """
+
+    def __init__(self, store, db_path=None, commit_every=100, read_only=False, timeout=5.0):
+        self.store = store
+        self.db_path = str(db_path or store.path + '.idx')
+        self.commit_every = commit_every
+        self.read_only = read_only
+        self._uncommitted = 0
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=timeout)
+            return
+        self.conn = sqlite3.connect(self.db_path, timeout=timeout)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_db()
+        store.on_compact.append(lambda _store: self.rebuild())
+        self.catch_up()
+
+    def _init_db(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS records (
+                    url TEXT PRIMARY KEY,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL,
+                    last_crawled TEXT
+                )
+            """)
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_records_last_crawled
+                ON records (last_crawled)
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+            """)
+
+    def _get_indexed_size(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'indexed_size'").fetchone()
+        return row[0] if row else 0
+
+    def _set_indexed_size(self, size):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('indexed_size', ?)", (size,))
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def close(self):
+        if not self.read_only:
+            self.flush()
+        self.conn.close()
+
+    def flush(self):
+        self._set_indexed_size(self.store.size())
+        self.conn.commit()
+        self._uncommitted = 0
+
+    def catch_up(self):
+        """Index records appended to the store since the index was last updated."""
+        indexed_size = self._get_indexed_size()
+        store_size = self.store.size()
+        if indexed_size > store_size:
+            # The store was compacted or replaced behind our back
+            return self.rebuild()
+        count = 0
+        for offset, length, record in self.store.iter_entries(start=indexed_size):
+            self._add(record, offset, length)
+            count += 1
+        self.flush()
+        if count:
+            logger.info(f"Indexed {count} new records from {self.store.path}")
+        return count
+
+    def rebuild(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM records")
+            self._set_indexed_size(0)
+        return self.catch_up()
+
+    def _add(self, record, offset, length):
+        url = record.get('url')
+        if not url:
+            return
+        self.conn.execute("""
+            INSERT OR REPLACE INTO records (url, offset, length, last_crawled)
+            VALUES (?, ?, ?, ?)
+        """, (url, offset, length, record.get('last_crawled')))
+
+    def add(self, record, offset, length):
+        """Index a record that has just been appended to the store."""
+        self._add(record, offset, length)
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_every:
+            self.flush()
+
+    def append(self, record):
+        """Append a record to the store and index it."""
+        compactions = self.store.compactions
+        offset, length = self.store.append(record)
+        # Appending may have triggered a compaction, which rebuilt the index
+        # and already picked this record up at its new offset.
+        if self.store.compactions == compactions:
+            self.add(record, offset, length)
+        return offset, length
+
+    def touch(self, url, now=None):
+        """Re-append a url's latest record with a fresh `last_crawled`.
+
+        Used when a page is known to be unchanged, so it does not have to be
+        parsed again. Returns False if the url has no record.
+        """
+        record = self.get(url)
+        if record is None:
+            return False
+        record['last_crawled'] = (now or datetime.now()).isoformat()
+        self.append(record)
+        return True
+
+    def __contains__(self, url):
+        return self.conn.execute("SELECT 1 FROM records WHERE url = ?", (url,)).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def get(self, url):
+        """Return the latest stored record for a url, or None."""
+        row = self.conn.execute("SELECT offset, length FROM records WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return self.store.read_at(*row)
+
+    def iter_records(self, since=None):
+        """Stream the latest record of every url, in file order.
+
+        With `since`, only records whose `last_crawled` is later than it are
+        returned, which is how incremental exports find what changed.
+        """
+        tail = {}
+        if self.read_only:
+            # Records appended since the writer last committed the index
+            for offset, length, record in self.store.iter_entries(start=self._get_indexed_size()):
+                if record.get('url'):
+                    tail[record['url']] = (offset, length, record.get('last_crawled'))
+        query = "SELECT url, offset, length FROM records"
+        params = ()
+        if since is not None:
+            query += " WHERE last_crawled > ?"
+            params = (since,)
+        rows = self.conn.execute(query + " ORDER BY offset", params)
+        yield from self.store.read_many((offset, length) for url, offset, length in rows if url not in tail)
+        yield from self.store.read_many(sorted(
+            (offset, length) for offset, length, last_crawled in tail.values()
+            if since is None or (last_crawled or '') > since))
+
+    def last_crawled(self, url):
+        row = self.conn.execute("SELECT last_crawled FROM records WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def last_crawled_many(self, urls, chunk_size=500):
+        """Return {url: last_crawled} for the given urls that are in the index."""
+        urls = list(urls)
+        result = {}
+        for i in range(0, len(urls), chunk_size):
+            chunk = urls[i:i + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            result.update(self.conn.execute(
+                f"SELECT url, last_crawled FROM records WHERE url IN ({placeholders})", chunk
+            ))
+        return result
+
+    def stale_urls(self, urls, max_age=timedelta(hours=24), now=None):
+        """Return the urls that were never crawled or were crawled longer than max_age ago."""
+        urls = list(urls)
+        cutoff = (now or datetime.now()) - max_age
+        known = self.last_crawled_many(urls)
+        stale = []
+        for url in urls:
+            last_crawled = known.get(url)
+            try:
+                if last_crawled and datetime.fromisoformat(last_crawled) >= cutoff:
+                    continue
+            except (ValueError, TypeError):
+                pass
+            stale.append(url)
+        return stale
+
+def iter_latest_records(store, since=None):
+    """Stream the latest record of every url in `store`, crawled after `since` if given.
+
+    If a running crawl holds the index, the records it has committed are
+    read through a read-only view instead of waiting for it.
+    """
+    try:
+        index = RecordIndex(store, timeout=1)
+    except sqlite3.OperationalError:
+        logger.info(f"{store.path} is being written, reading a read-only view of its index")
+        index = RecordIndex(store, read_only=True)
+    try:
+        yield from index.iter_records(since)
+    finally:
+        index.close()
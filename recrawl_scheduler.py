@@ -0,0 +1,242 @@
+import hashlib
+import json
+import logging
+import math
+import random
+import sqlite3
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Weight of past visits in the change-rate estimate, so a page whose update
+# pattern changes is re-learned within roughly ten visits
+HISTORY_DECAY = 0.9
+
+def content_hash(record):
+    """Hash of the parts of a record that matter when deciding whether a page changed."""
+    content = [record.get('title'), record.get('artist'), record.get('completion')]
+    return hashlib.sha256(json.dumps(content, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def estimate_change_rate(visits, changes, observed):
+    """Changes per second of a page revisited `visits` times over `observed` seconds.
+
+    Uses the Cho & Garcia-Molina estimator, which corrects for changes
+    missed between visits: -log((n - X + 0.5) / (n + 0.5)) / mean interval.
+    Returns None without enough history.
+    """
+    if visits <= 0 or observed <= 0:
+        return None
+    changes = min(changes, visits)
+    return -math.log((visits - changes + 0.5) / (visits + 0.5)) / (observed / visits)
+
+class RecrawlScheduler:
+    """Per-URL revisit times learned from how often each page changes.
+
+    Every visit records a hash of the page's content. Pages that have never
+    been seen to change are revisited at `recrawl_backoff` times the
+    previous interval (default 2), starting from `recrawl_initial_interval`
+    hours (default 24). Once changes are seen, the interval follows the
+    estimated mean time between changes, moving by at most the backoff
+    factor per visit. Intervals stay between `recrawl_min_interval`
+    (default 6) and `recrawl_max_interval` hours (default 720), and each
+    revisit time is jittered by up to `recrawl_jitter` (default 0.2) of the
+    interval so revisits spread out instead of arriving together.
+
+    A failed visit is retried after the minimum interval, growing by the
+    backoff factor with every consecutive failure up to the maximum, so an
+    unreachable page is not fetched again on every pass.
+    """
+
+    def __init__(self, config, db_path=None, rng=None, clock=time.time):
+        self.db_path = str(db_path or config.get('recrawl_db') or
+                           config.get('frontier_db', 'crawler_frontier.db'))
+        self.initial_interval = float(config.get('recrawl_initial_interval', 24)) * HOUR
+        self.min_interval = float(config.get('recrawl_min_interval', 6)) * HOUR
+        self.max_interval = float(config.get('recrawl_max_interval', 720)) * HOUR
+        self.backoff = max(1.0, float(config.get('recrawl_backoff', 2.0)))
+        self.jitter = min(max(float(config.get('recrawl_jitter', 0.2)), 0.0), 0.9)
+        self.rng = rng or random.Random()
+        self.clock = clock
+        self.conn = sqlite3.connect(self.db_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_db()
+
+    def _init_db(self):
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS recrawl (
+                    url TEXT PRIMARY KEY,
+                    content_hash TEXT,
+                    last_visit REAL NOT NULL,
+                    last_change REAL,
+                    visits REAL NOT NULL DEFAULT 0,
+                    changes REAL NOT NULL DEFAULT 0,
+                    observed REAL NOT NULL DEFAULT 0,
+                    interval REAL NOT NULL,
+                    next_visit REAL NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_recrawl_next_visit
+                ON recrawl (next_visit)
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS recrawl_failures (
+                    url TEXT PRIMARY KEY,
+                    failures INTEGER NOT NULL,
+                    next_visit REAL NOT NULL
+                )
+            """)
+
+    def close(self):
+        self.conn.close()
+
+    def _clamp(self, interval):
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def _jittered(self, now, interval):
+        return now + interval * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def record_visit(self, url, record=None, now=None):
+        """Record a successful visit and return the time the url should next be visited.
+
+        `record` is the page's new record; None means the page is known to
+        be unchanged (e.g. the server answered 304 Not Modified) or had
+        nothing to store.
+        """
+        now = self.clock() if now is None else now
+        new_hash = content_hash(record) if record is not None else None
+        with self.conn:
+            self.conn.execute("DELETE FROM recrawl_failures WHERE url = ?", (url,))
+        row = self.conn.execute("""
+            SELECT content_hash, last_visit, last_change, visits, changes, observed, interval
+            FROM recrawl WHERE url = ?
+        """, (url,)).fetchone()
+
+        if row is None:
+            interval = self._clamp(self.initial_interval)
+            next_visit = self._jittered(now, interval)
+            with self.conn:
+                self.conn.execute("""
+                    INSERT INTO recrawl (url, content_hash, last_visit, last_change, interval, next_visit)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                """, (url, new_hash, now, now, interval, next_visit))
+            return next_visit
+
+        old_hash, last_visit, last_change, visits, changes, observed, interval = row
+        changed = new_hash is not None and old_hash is not None and new_hash != old_hash
+        visits = visits * HISTORY_DECAY + 1
+        changes = changes * HISTORY_DECAY + (1 if changed else 0)
+        observed = observed * HISTORY_DECAY + max(0.0, now - last_visit)
+
+        rate = estimate_change_rate(visits, changes, observed)
+        target = 1 / rate if rate else math.inf
+        if changed:
+            target = min(target, interval)
+        new_interval = self._clamp(min(max(target, interval / self.backoff), interval * self.backoff))
+        next_visit = self._jittered(now, new_interval)
+        with self.conn:
+            self.conn.execute("""
+                UPDATE recrawl
+                SET content_hash = ?, last_visit = ?, last_change = ?, visits = ?, changes = ?,
+                    observed = ?, interval = ?, next_visit = ?
+                WHERE url = ?
+            """, (new_hash or old_hash, now, now if changed else last_change, visits, changes,
+                  observed, new_interval, next_visit, url))
+        if changed:
+            logger.debug(f"{url} changed, next visit in {new_interval / HOUR:.1f} hours")
+        return next_visit
+
+    def record_failure(self, url, now=None):
+        """Record a failed visit and return the time the url should be retried."""
+        now = self.clock() if now is None else now
+        row = self.conn.execute("SELECT failures FROM recrawl_failures WHERE url = ?", (url,)).fetchone()
+        failures = (row[0] if row else 0) + 1
+        interval = self._clamp(self.min_interval * self.backoff ** (failures - 1))
+        next_visit = self._jittered(now, interval)
+        with self.conn:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO recrawl_failures (url, failures, next_visit)
+                VALUES (?, ?, ?)
+            """, (url, failures, next_visit))
+        logger.debug(f"{url} failed {failures} times in a row, retrying in {interval / HOUR:.1f} hours")
+        return next_visit
+
+    def next_visit(self, url):
+        row = (self.conn.execute("SELECT next_visit FROM recrawl_failures WHERE url = ?", (url,)).fetchone()
+               or self.conn.execute("SELECT next_visit FROM recrawl WHERE url = ?", (url,)).fetchone())
+        return row[0] if row else None
+
+    def next_visits(self, urls, last_crawled=None, chunk_size=500):
+        """Return {url: next visit time} for the given urls.
+
+        Urls the scheduler has not seen yet are due `recrawl_initial_interval`
+        after their `last_crawled` time from `last_crawled` ({url: ISO
+        timestamp}, e.g. RecordIndex.last_crawled_many), or immediately.
+        Urls whose last visit failed are due at their retry time.
+        """
+        urls = list(urls)
+        known = {}
+        for i in range(0, len(urls), chunk_size):
+            chunk = urls[i:i + chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            known.update(self.conn.execute(
+                f"SELECT url, next_visit FROM recrawl WHERE url IN ({placeholders})", chunk
+            ))
+            known.update(self.conn.execute(
+                f"SELECT url, next_visit FROM recrawl_failures WHERE url IN ({placeholders})", chunk
+            ))
+        last_crawled = last_crawled or {}
+        result = {}
+        for url in urls:
+            if url in known:
+                result[url] = known[url]
+                continue
+            try:
+                result[url] = datetime.fromisoformat(last_crawled[url]).timestamp() + self.initial_interval
+            except (KeyError, ValueError, TypeError):
+                result[url] = 0.0
+        return result
+
+    def due_urls(self, urls, last_crawled=None, now=None):
+        """The urls whose next visit time has come, in the given order."""
+        now = self.clock() if now is None else now
+        visits = self.next_visits(urls, last_crawled)
+        return [url for url in visits if visits[url] <= now]
+
+    def next_visit_time(self, urls=None, last_crawled=None):
+        """Earliest scheduled visit, of the given urls or of all, or None.
+
+        `last_crawled` is passed on to next_visits for urls not seen yet.
+        """
+        if urls is None:
+            return self.conn.execute("""
+                SELECT MIN(next_visit) FROM (
+                    SELECT next_visit FROM recrawl WHERE url NOT IN (SELECT url FROM recrawl_failures)
+                    UNION ALL SELECT next_visit FROM recrawl_failures
+                )
+            """).fetchone()[0]
+        visits = self.next_visits(urls, last_crawled)
+        return min(visits.values()) if visits else None
+
+    def stats(self):
+        urls, changing, mean_interval = self.conn.execute("""
+            SELECT COUNT(*), COALESCE(SUM(changes > 0), 0), AVG(interval) FROM recrawl
+        """).fetchone()
+        return {'urls': urls, 'changing': changing,
+                'mean_interval_hours': round(mean_interval / HOUR, 1) if mean_interval else None}
+
+def open_scheduler(config):
+    """Create the RecrawlScheduler described by the config, or None if it is disabled."""
+    if not config.get('recrawl_schedule', True):
+        return None
+    try:
+        return RecrawlScheduler(config)
+    except sqlite3.Error as e:
+        logger.error(f"Failed to open recrawl scheduler: {e}")
+        return None
@@ -0,0 +1,155 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from js_renderer import JSRenderer
+from metrics import QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+class RenderJob:
+    __slots__ = ('url', 'deadline', 'future')
+
+    def __init__(self, url, deadline):
+        self.url = url
+        self.deadline = deadline
+        self.future = Future()
+
+class RenderPool:
+    """Fixed pool of headless-browser workers fed from a job queue.
+
+    Each worker thread owns one JSRenderer, i.e. one Chromium with a warm
+    page and its own event loop, so pages render in parallel without
+    sharing browser state. Jobs carry a deadline covering both the wait in
+    the queue and the render; a job still queued when its deadline passes
+    is dropped, and a render is never given longer than the time left. A
+    worker's browser is recycled after `render_max_pages` pages or once it
+    grows past `render_max_memory_mb`, which caps Chromium's memory creep.
+
+    Workers start on the first job, so no browser is launched for crawls
+    that never need JavaScript. `render` has the same signature as
+    JSRenderer.render, so the pool can stand in for a single renderer.
+    `proxies` may also be a function returning them, called when the first
+    browser starts.
+    """
+
+    def __init__(self, config, headers=None, proxies=None, renderer_factory=None):
+        self.size = int(config.get('render_workers', 2))
+        self.render_timeout = float(config.get('render_timeout', 30))
+        self.default_deadline = float(config.get('render_deadline', 60))
+        self.max_pages = int(config.get('render_max_pages', 100))
+        self.max_memory_mb = config.get('render_max_memory_mb', 1024)
+        self.headers = dict(headers or {})
+        self.proxies = proxies
+        self.renderer_factory = renderer_factory or (
+            lambda: JSRenderer(self.headers, self._get_proxies(), self.render_timeout)
+        )
+        self.available = True
+        self._jobs = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {'rendered': 0, 'failed': 0, 'expired': 0, 'recycled': 0}
+
+    def _get_proxies(self):
+        # A callable defers picking the proxy (and probing the proxies)
+        # until a browser is actually started
+        return self.proxies() if callable(self.proxies) else self.proxies
+
+    def _start_workers(self):
+        with self._lock:
+            if self._workers or self._closed:
+                return
+            for i in range(self.size):
+                worker = threading.Thread(target=self._work, name=f'render-worker-{i}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            logger.info(f"Started {self.size} render workers")
+
+    def submit(self, url, deadline=None):
+        """Queue a render and return a Future for its HTML (None on failure).
+
+        `deadline` is the number of seconds the caller is willing to wait,
+        defaulting to `render_deadline`.
+        """
+        job = RenderJob(url, time.monotonic() + (deadline or self.default_deadline))
+        if self._closed or not self.available:
+            job.future.set_result(None)
+            return job.future
+        self._start_workers()
+        self._jobs.put(job)
+        QUEUE_DEPTH.labels(queue='render').set(self._jobs.qsize())
+        return job.future
+
+    def render(self, url, timeout=None):
+        return self.submit(url, timeout).result()
+
+    def update_headers(self, headers):
+        # Takes effect as workers start or recycle their browsers
+        self.headers.update(headers)
+
+    def _should_recycle(self, renderer, pages):
+        if pages >= self.max_pages:
+            return f"{pages} pages"
+        if self.max_memory_mb:
+            memory = renderer.memory_mb()
+            if memory is not None and memory > self.max_memory_mb:
+                return f"{memory:.0f} MiB"
+        return None
+
+    def _work(self):
+        renderer = None
+        pages = 0
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            QUEUE_DEPTH.labels(queue='render').set(self._jobs.qsize())
+            remaining = job.deadline - time.monotonic()
+            if remaining <= 0:
+                self.stats['expired'] += 1
+                logger.warning(f"Render deadline passed while queued: {job.url}")
+                job.future.set_result(None)
+                continue
+            if renderer is None:
+                renderer = self.renderer_factory()
+                pages = 0
+            try:
+                html = renderer.render(job.url, timeout=min(remaining, self.render_timeout))
+            except Exception as e:
+                logger.error(f"Render worker failed on {job.url}: {e}")
+                html = None
+            if not renderer.available:
+                # requests-html or Chromium is missing; every job would fail
+                self.available = False
+            self.stats['rendered' if html is not None else 'failed'] += 1
+            job.future.set_result(html)
+
+            pages += 1
+            reason = self._should_recycle(renderer, pages)
+            if reason:
+                logger.info(f"Recycling browser after {reason}")
+                self.stats['recycled'] += 1
+                renderer.close()
+                renderer = None
+        if renderer is not None:
+            renderer.close()
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+        # Fail anything still queued, then stop the workers
+        while True:
+            try:
+                job = self._jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job.future.set_result(None)
+        for _ in workers:
+            self._jobs.put(None)
+        for worker in workers:
+            worker.join(timeout=self.render_timeout)
@@ -0,0 +1,182 @@
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class CompiledSelector:
+    """One selector of a plan, compiled for the parser backend, with its stats."""
+
+    __slots__ = ('selector', 'position', 'is_meta', 'compiled', 'hits', 'misses',
+                 'errors', 'total_time', 'demoted')
+
+    def __init__(self, selector, position, backend):
+        self.selector = selector
+        self.position = position
+        self.is_meta = selector.startswith('meta[')
+        try:
+            self.compiled = backend.compile(selector)
+        except Exception as e:
+            logger.warning(f"Invalid selector {selector}: {e}")
+            self.compiled = None
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.demoted = False
+
+    @property
+    def tries(self):
+        return self.hits + self.misses + self.errors
+
+    @property
+    def hit_rate(self):
+        return self.hits / self.tries if self.tries else 0.0
+
+    def stats(self):
+        return {
+            'selector': self.selector,
+            'position': self.position,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_rate': round(self.hit_rate, 4),
+            'avg_ms': round(self.total_time * 1000 / self.tries, 4) if self.tries else 0.0,
+            'demoted': self.demoted
+        }
+
+class SelectorPlan:
+    """A field's selector fallback list, compiled once and reordered by hit rate.
+
+    Selectors are tried in order until one matches, starting in configured
+    order. Every `reorder_every` runs, the selectors are sorted by hit rate,
+    highest first, with the configured order breaking ties, so the selector
+    that matches most pages is tried first. Selectors that have been tried
+    at least `min_samples` times and hit less than `demote_below` of the
+    time are moved behind all others. Demoted selectors stay in the plan as
+    late fallbacks and are promoted again if they start hitting.
+    """
+
+    def __init__(self, selectors, backend, name=None, min_samples=20, demote_below=0.05,
+                 reorder_every=50, markup_warning_rate=0.5):
+        self.name = name
+        self.backend = backend
+        self.selectors = [CompiledSelector(selector, position, backend)
+                          for position, selector in enumerate(selectors)]
+        self.order = list(self.selectors)
+        self.min_samples = min_samples
+        self.demote_below = demote_below
+        self.reorder_every = reorder_every
+        self.markup_warning_rate = markup_warning_rate
+        self.runs = 0
+        self.empty_runs = 0
+        self._warned = False
+
+    def _match(self, entry, doc):
+        if entry.compiled is None:
+            raise ValueError(f"Selector {entry.selector} could not be compiled")
+        if entry.is_meta:
+            element = self.backend.select_one(doc, entry.compiled)
+            if element is not None:
+                content = self.backend.get_attr(element, 'content')
+                if content:
+                    return content
+            return None
+        elements = self.backend.select(doc, entry.compiled)
+        if elements:
+            return '\n'.join(self.backend.get_text(element) for element in elements)
+        return None
+
+    def run(self, doc):
+        """Return the text of the first matching selector, or None."""
+        self.runs += 1
+        result = None
+        for entry in self.order:
+            start = time.perf_counter()
+            try:
+                result = self._match(entry, doc)
+            except Exception as e:
+                entry.errors += 1
+                logger.debug(f"Error with selector {entry.selector}: {str(e)}")
+                result = None
+            else:
+                if result:
+                    entry.hits += 1
+                else:
+                    entry.misses += 1
+            entry.total_time += time.perf_counter() - start
+            if result:
+                break
+        else:
+            self.empty_runs += 1
+            self._check_markup()
+
+        if self.runs % self.reorder_every == 0:
+            self.reorder()
+        return result
+
+    def _check_markup(self):
+        if (not self._warned and self.runs >= self.min_samples
+                and self.empty_runs / self.runs >= self.markup_warning_rate):
+            self._warned = True
+            logger.warning(f"Selectors for {self.name} missed on {self.empty_runs} of {self.runs} pages; "
+                           f"the site's markup may have changed")
+
+    def reorder(self):
+        for entry in self.selectors:
+            entry.demoted = entry.tries >= self.min_samples and entry.hit_rate < self.demote_below
+        by_hit_rate = sorted(self.selectors, key=lambda entry: (-entry.hit_rate, entry.position))
+        self.order = ([entry for entry in by_hit_rate if not entry.demoted]
+                      + [entry for entry in by_hit_rate if entry.demoted])
+
+    def stats(self):
+        return {
+            'runs': self.runs,
+            'empty_runs': self.empty_runs,
+            'order': [entry.selector for entry in self.order],
+            'selectors': [entry.stats() for entry in self.selectors]
+        }
+
+def merge_plan_stats(snapshots):
+    """Combine stats of the same plans collected in several processes."""
+    merged = {}
+    for snapshot in snapshots:
+        for name, stats in snapshot.items():
+            target = merged.get(name)
+            if target is None:
+                merged[name] = {**stats, 'selectors': [dict(entry) for entry in stats['selectors']]}
+                continue
+            target['runs'] += stats['runs']
+            target['empty_runs'] += stats['empty_runs']
+            by_selector = {entry['selector']: entry for entry in target['selectors']}
+            for entry in stats['selectors']:
+                total = by_selector.get(entry['selector'])
+                if total is None:
+                    target['selectors'].append(dict(entry))
+                    continue
+                total_tries = total['hits'] + total['misses'] + total['errors']
+                entry_tries = entry['hits'] + entry['misses'] + entry['errors']
+                tries = total_tries + entry_tries
+                for key in ('hits', 'misses', 'errors'):
+                    total[key] += entry[key]
+                if tries:
+                    total['hit_rate'] = round(total['hits'] / tries, 4)
+                    total['avg_ms'] = round((total['avg_ms'] * total_tries
+                                             + entry['avg_ms'] * entry_tries) / tries, 4)
+                total['demoted'] = total['demoted'] and entry['demoted']
+    return merged
+
+def write_stats(stats, path):
+    """Write selector stats, as returned by SelectorPlan.stats per plan, to a JSON file."""
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, indent=2)
+        logger.info(f"Wrote selector stats to {path}")
+    except Exception as e:
+        logger.error(f"Failed to write selector stats to {path}: {e}")
+        return False
+    return True
+
+def dump_plan_stats(plans, path):
+    """Write the stats of a {name: SelectorPlan} mapping to a JSON file."""
+    return write_stats({name: plan.stats() for name, plan in plans.items()}, path)
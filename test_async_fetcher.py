@@ -0,0 +1,75 @@
+import unittest
+import asyncio
+import threading
+import time
+from unittest.mock import MagicMock
+from async_fetcher import AsyncFetcher
+
+class TrackingRequest:
+    """Stand-in for HTTPRequest that records peak concurrency."""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.active_by_domain = {}
+        self.peak_by_domain = {}
+
+    def get(self, url, render_js=False):
+        domain = url.split('/')[2]
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            self.active_by_domain[domain] = self.active_by_domain.get(domain, 0) + 1
+            self.peak_by_domain[domain] = max(self.peak_by_domain.get(domain, 0),
+                                              self.active_by_domain[domain])
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+            self.active_by_domain[domain] -= 1
+        return f"<html>{url}</html>"
+
+class TestAsyncFetcher(unittest.TestCase):
+    def _collect(self, fetcher, urls):
+        async def run():
+            return [pair async for pair in fetcher.fetch_all(urls)]
+        return asyncio.run(run())
+
+    def test_fetch_all_returns_every_url(self):
+        http_request = TrackingRequest(delay=0)
+        fetcher = AsyncFetcher(http_request, {'max_concurrency': 4})
+        urls = [f"http://site{i}.com/song" for i in range(10)]
+        results = dict(self._collect(fetcher, urls))
+        fetcher.close()
+        self.assertEqual(set(results), set(urls))
+        self.assertEqual(results[urls[0]], f"<html>{urls[0]}</html>")
+
+    def test_global_and_per_domain_limits(self):
+        http_request = TrackingRequest()
+        fetcher = AsyncFetcher(http_request, {'max_concurrency': 3, 'per_domain_concurrency': 1})
+        urls = [f"http://site{i % 4}.com/song{i}" for i in range(12)]
+        self._collect(fetcher, urls)
+        fetcher.close()
+        self.assertLessEqual(http_request.peak, 3)
+        self.assertGreater(http_request.peak, 1)
+        self.assertTrue(all(peak == 1 for peak in http_request.peak_by_domain.values()))
+
+    def test_failed_request_yields_none(self):
+        http_request = MagicMock()
+        http_request.get.side_effect = Exception("boom")
+        fetcher = AsyncFetcher(http_request, {})
+        results = self._collect(fetcher, ["http://example.com/a"])
+        fetcher.close()
+        self.assertEqual(results, [("http://example.com/a", None)])
+
+    def test_reusable_across_event_loops(self):
+        http_request = TrackingRequest(delay=0)
+        fetcher = AsyncFetcher(http_request, {})
+        self._collect(fetcher, ["http://example.com/a"])
+        results = self._collect(fetcher, ["http://example.com/b"])
+        fetcher.close()
+        self.assertEqual(results[0][0], "http://example.com/b")
+
+if __name__ == '__main__':
+    unittest.main()
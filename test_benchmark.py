@@ -0,0 +1,51 @@
+import unittest
+from benchmark import compare, import_time_ms, percentiles, run_scenario
+from config_manager import ConfigManager
+from fixture_site import FixtureSite
+
+class TestBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.settings = {'config': ConfigManager('config.json').config, 'pages': 2, 'page_kb': 10,
+                         'iterations': 2, 'records': 20, 'saves': 3, 'log_level': 'WARNING'}
+
+    def test_parser_scenario(self):
+        stats = run_scenario('parser', self.settings)
+        self.assertEqual(stats['count'], 8)
+        self.assertEqual(stats['lyrics_found'], 8)
+        self.assertEqual(stats['unit'], 'pages')
+        self.assertGreater(stats['per_second'], 0)
+
+    def test_save_data_scenario(self):
+        stats = run_scenario('save_data', self.settings)
+        self.assertEqual(stats['count'], 60)
+        self.assertEqual(stats['saves'], 3)
+        self.assertGreater(stats['file_bytes'], 0)
+
+    def test_startup_scenario(self):
+        with FixtureSite('default', pages=1, page_kb=5) as site:
+            settings = {**self.settings, 'iterations': 1, 'urls': site.urls(), 'concurrency': 2,
+                        'parse_workers': 0, 'sites': {'genius': site.netloc, 'default': site.netloc}}
+            stats = run_scenario('startup', settings)
+        self.assertEqual((stats['count'], stats['unit']), (1, 'runs'))
+        self.assertEqual(set(stats['imports_ms']), {'main', 'crawl_lyrics', 'crawler_service'})
+        self.assertTrue(all(ms > 0 for ms in stats['imports_ms'].values()))
+        # Only the first run crawled the page
+        self.assertEqual(site.requests, 1)
+
+    def test_import_time(self):
+        self.assertGreater(import_time_ms('config_manager'), 0)
+
+    def test_percentiles(self):
+        self.assertEqual(percentiles([0.001 * i for i in range(1, 101)]),
+                         {'p50': 51.0, 'p95': 96.0, 'max': 100.0})
+        self.assertIsNone(percentiles([]))
+
+    def test_compare(self):
+        before = {'scenarios': {'parser': {'per_second': 100, 'latency_ms': {'p50': 2.0}}}}
+        after = {'scenarios': {'parser': {'per_second': 150, 'latency_ms': {'p50': 1.0}},
+                               'save_data': {'per_second': 10, 'latency_ms': None}}}
+        self.assertEqual(compare(after, before),
+                         {'parser': {'throughput_ratio': 1.5, 'latency_p50_ratio': 0.5}})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from connection_pool import PooledHTTPAdapter
+from http_request import HTTPRequest
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = self.headers.get('User-Agent', '').encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05},
+                         daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+        self.config = {'http_cache': False, 'max_concurrency': 4}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_pool_size_per_host(self):
+        adapter = PooledHTTPAdapter({'max_concurrency': 8,
+                                     'POOL_SIZES': {'genius.com': 2},
+                                     'proxy_pool_size': 3})
+        self.assertEqual(adapter.pool_size('genius.com'), 2)
+        self.assertEqual(adapter.pool_size('example.com'), 8)
+        self.assertEqual(adapter.pool_size('genius.com', 'http://proxy:8080'), 3)
+
+    def test_evicted_pools_are_released_but_still_counted(self):
+        request = HTTPRequest({**self.config, 'pool_connections': 1})
+        port = self.server.server_address[1]
+        for url in [self.url, f"http://localhost:{port}/", self.url]:
+            self.assertIsNotNone(request.get(url))
+        self.assertEqual(len(request.adapter._pools), 1)
+        stats = request.pool_stats()
+        self.assertEqual(stats['127.0.0.1']['requests'], 2)
+        self.assertEqual(stats['localhost']['requests'], 1)
+
+    def test_get_connection_fallback(self):
+        adapter = PooledHTTPAdapter({'POOL_SIZES': {'127.0.0.1': 2}, 'proxy_pool_size': 3})
+        pool = adapter.get_connection(self.url)
+        self.assertEqual(pool.pool.maxsize, 2)
+        proxied = adapter.get_connection(self.url, {'http': 'proxy.invalid:8080'})
+        self.assertEqual(proxied.pool.maxsize, 3)
+        self.assertEqual(set(adapter.stats()), {'127.0.0.1', 'proxy.invalid via proxy.invalid:8080'})
+
+    def test_connections_are_reused(self):
+        request = HTTPRequest(self.config)
+        for _ in range(5):
+            self.assertIsNotNone(request.get(self.url))
+        stats = request.pool_stats()['127.0.0.1']
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['new_connections'], 1)
+        self.assertEqual(stats['reused_connections'], 4)
+        self.assertEqual(stats['tls_handshakes'], 0)
+        self.assertEqual(stats['maxsize'], 4)
+
+    def test_configured_pool_size_is_used(self):
+        request = HTTPRequest({**self.config, 'POOL_SIZES': {'127.0.0.1': 2}})
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(request.get, [self.url] * 8))
+        stats = request.pool_stats()['127.0.0.1']
+        self.assertEqual(stats['maxsize'], 2)
+        self.assertEqual(stats['requests'], 8)
+
+    def test_per_request_headers_leave_session_alone(self):
+        request = HTTPRequest(self.config)
+        session_headers = dict(request.session.headers)
+        self.assertEqual(request.get(self.url, headers={'User-Agent': 'Custom/1.0'}), 'Custom/1.0')
+        self.assertEqual(dict(request.session.headers), session_headers)
+        self.assertEqual(request.get(self.url), session_headers['User-Agent'])
+
+    def test_rotate_user_agent(self):
+        request = HTTPRequest({**self.config, 'rotate_user_agent': True})
+        session_headers = dict(request.session.headers)
+        agents = {request.get(self.url) for _ in range(20)}
+        self.assertGreater(len(agents), 1)
+        self.assertEqual(dict(request.session.headers), session_headers)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+import json
+import os
+import tempfile
+import threading
+from unittest.mock import MagicMock
+import requests
+from coordinator import CoordinatorServer, LeaseManager
+from frontier import Frontier, DONE, FAILED, IN_PROGRESS, PENDING
+from link_discovery import LinkDiscovery
+from persistence import JSONLStore
+from record_index import RecordIndex
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestLeaseManager(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.frontier = Frontier(os.path.join(self.temp_dir, 'frontier.db'), retry_delay=0)
+        self.store = JSONLStore(os.path.join(self.temp_dir, 'lyrics.jsonl'), temp_dir=self.temp_dir)
+        self.index = RecordIndex(self.store)
+        self.error_logger = MagicMock()
+        self.clock = FakeClock()
+        config = {'lease_size': 2, 'lease_ttl': 30,
+                  'RATE_LIMITS': {'default': {'delay': 10}}}
+        self.manager = LeaseManager(self.frontier, self.index, config, self.error_logger, clock=self.clock)
+        self.frontier.add_urls([f"http://a.com/{i}" for i in range(3)]
+                               + [f"http://b.com/{i}" for i in range(2)], seed=True)
+
+    def tearDown(self):
+        self.frontier.close()
+        self.index.close()
+        self.store.close()
+        for file in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, file))
+        os.rmdir(self.temp_dir)
+
+    def test_one_worker_per_domain(self):
+        leases = self.manager.lease('w1', 10)
+        self.assertEqual(sorted(lease.domain for lease in leases), ['a.com', 'b.com'])
+        self.assertTrue(all(len(lease.urls) == 2 for lease in leases))
+        # a.com still has a pending URL, but it is leased to w1
+        self.assertEqual(self.manager.lease('w2', 10), [])
+        self.assertEqual(self.frontier.counts(), {IN_PROGRESS: 4, PENDING: 1})
+
+    def test_complete_stores_results_and_holds_domain_back(self):
+        lease = self.manager.lease('w1', 2)[0]
+        self.assertEqual(lease.domain, 'a.com')
+        done, unfinished = lease.urls
+        record = {'url': done, 'completion': 'lyrics', 'last_crawled': '2024-01-01T00:00:00'}
+        self.assertTrue(self.manager.complete('w1', lease.lease_id,
+                                              {done: {'status': 'done', 'record': record}},
+                                              [('ERROR', done, 'message', None)]))
+        self.assertEqual(self.index.get(done), record)
+        self.error_logger.log_to_db.assert_called_once_with('ERROR', done, 'message', None)
+        self.assertEqual(self.frontier.counts(), {DONE: 1, PENDING: 4})
+
+        # a.com waits out its rate-limit delay before it is leased again
+        self.assertEqual([lease.domain for lease in self.manager.lease('w2', 10)], ['b.com'])
+        self.clock.now += 10
+        self.assertEqual([lease.domain for lease in self.manager.lease('w2', 10)], ['a.com'])
+
+    def test_complete_queues_discovered_links(self):
+        self.manager.discovery = LinkDiscovery({}, self.frontier)
+        lease = self.manager.lease('w1', 2)[0]
+        links = ['http://a.com/songs/9', lease.urls[1], 'http://c.com/songs/1']
+        self.assertTrue(self.manager.complete('w1', lease.lease_id,
+                                              {lease.urls[0]: {'status': 'done', 'links': links}}))
+        self.assertEqual(self.frontier.counts(), {DONE: 1, PENDING: 5})
+
+    def test_expired_lease_is_requeued_and_late_results_ignored(self):
+        lease = self.manager.lease('w1', 2)[0]
+        self.clock.now += 31
+        self.assertEqual(self.manager.expire(), 1)
+        self.assertEqual(self.frontier.counts(), {PENDING: 5})
+        self.clock.now += 10
+        retaken = self.manager.lease('w2', 2)[0]
+        self.assertEqual(retaken.domain, lease.domain)
+
+        url = lease.urls[0]
+        results = {url: {'status': 'done', 'record': {'url': url, 'completion': 'stale'}}}
+        self.assertFalse(self.manager.complete('w1', lease.lease_id, results))
+        self.assertIsNone(self.index.get(url))
+        self.assertEqual(self.manager.stats['stale_results'], 1)
+
+    def test_heartbeat_keeps_lease(self):
+        lease = self.manager.lease('w1', 2)[0]
+        self.clock.now += 20
+        self.assertEqual(self.manager.heartbeat('w1', [lease.lease_id, 'unknown']),
+                         ([lease.lease_id], ['unknown']))
+        self.assertEqual(self.manager.heartbeat('w2', [lease.lease_id]), ([], [lease.lease_id]))
+        self.clock.now += 20
+        self.assertEqual(self.manager.expire(), 0)
+        self.assertIn(lease.lease_id, self.manager.leases)
+
+    def test_not_modified_without_record_fails(self):
+        lease = self.manager.lease('w1', 2)[0]
+        results = {url: {'status': 'not_modified'} for url in lease.urls}
+        self.assertTrue(self.manager.complete('w1', lease.lease_id, results))
+        self.assertEqual(self.frontier.counts()[PENDING], 5)
+        self.assertEqual(self.error_logger.log_to_db.call_count, 2)
+
+    def test_done(self):
+        self.frontier.max_attempts = 1
+        self.assertFalse(self.manager.is_done())
+        while True:
+            leases = self.manager.lease('w1', 10)
+            if not leases:
+                if self.manager.is_done():
+                    break
+                self.clock.now += 10
+                continue
+            for lease in leases:
+                self.manager.complete('w1', lease.lease_id,
+                                      {url: {'status': 'failed'} for url in lease.urls})
+        self.assertEqual(self.frontier.counts(), {FAILED: 5})
+
+class TestCoordinatorServer(unittest.TestCase):
+    def setUp(self):
+        self.manager = MagicMock(lease_size=20, lease_ttl=60)
+        self.manager.lease.return_value = []
+        self.manager.is_done.return_value = True
+        self.manager.status.return_value = {'done': True}
+        self.manager.retry_after.return_value = 5
+        self.server = CoordinatorServer(('127.0.0.1', 0), self.manager, token='secret')
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05},
+                         daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.auth = {'Authorization': 'Bearer secret'}
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_requires_token(self):
+        response = requests.post(f"{self.url}/lease", json={'worker': 'w1'})
+        self.assertEqual(response.status_code, 401)
+        self.manager.lease.assert_not_called()
+
+    def test_lease_and_complete(self):
+        response = requests.post(f"{self.url}/lease", json={'worker': 'w1', 'max_urls': 5},
+                                 headers=self.auth)
+        self.assertEqual(response.json(), {'leases': [], 'lease_ttl': 60,
+                                           'retry_after': 5,
+                                           'done': True})
+        self.manager.lease.assert_called_once_with('w1', 5)
+
+        self.manager.complete.return_value = True
+        results = {'http://a.com/1': {'status': 'failed'}}
+        response = requests.post(f"{self.url}/complete", headers=self.auth,
+                                 data=json.dumps({'worker': 'w1', 'lease_id': 'l1', 'results': results}))
+        self.assertEqual(response.json(), {'accepted': True})
+        self.manager.complete.assert_called_once_with('w1', 'l1', results, [])
+
+    def test_bad_request(self):
+        response = requests.post(f"{self.url}/lease", json={}, headers=self.auth)
+        self.assertEqual(response.status_code, 400)
+        response = requests.get(f"{self.url}/status", headers=self.auth)
+        self.assertEqual(response.json(), {'done': True})
+
+if __name__ == '__main__':
+    unittest.main()
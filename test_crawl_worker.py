@@ -0,0 +1,150 @@
+import unittest
+import json
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from crawl_worker import LeaseResults
+from link_discovery import LinkExtractor
+from persistence import JSONLStore
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+SELECTORS = {'default': {'title': ['title'], 'artist': ['h2.artist-name'], 'lyrics': ['div.lyrics']}}
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def make_site(log):
+    """Local lyrics site recording the time of every request it serves."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            log[self.server.server_address[1]].append(time.monotonic())
+            body = (f"<html><head><title>Song {self.path}</title></head><body>"
+                    f"<h2 class='artist-name'>Artist</h2><div class='lyrics'>La la {self.path}</div>"
+                    f"</body></html>").encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    return server
+
+class TestLeaseResults(unittest.TestCase):
+    def test_collects_persist_page_calls(self):
+        results = LeaseResults()
+        record = {'url': 'http://a.com/1', 'completion': 'lyrics'}
+        results.mark_done('http://a.com/1')
+        results.append(record)
+        self.assertTrue(results.touch('http://a.com/2'))
+        results.mark_done('http://a.com/2')
+        results.mark_failed('http://a.com/3')
+        results.log_to_db('ERROR', 'http://a.com/3', 'Failed', None)
+
+        taken, errors = results.take(['http://a.com/1', 'http://a.com/2', 'http://a.com/4'])
+        self.assertEqual(taken, {'http://a.com/1': {'status': 'done', 'record': record},
+                                 'http://a.com/2': {'status': 'not_modified'}})
+        self.assertEqual(errors, [('ERROR', 'http://a.com/3', 'Failed', None)])
+        self.assertEqual(results.take(['http://a.com/3']), ({'http://a.com/3': {'status': 'failed'}}, []))
+
+    def test_reports_discovered_links(self):
+        results = LeaseResults(LinkExtractor({'LINK_PATTERNS': {'default': ['^/songs/']}}))
+        results.mark_done('http://a.com/artist')
+        results.discover('http://a.com/artist', '<a href="/songs/1">1</a><a href="/about">About</a>')
+        self.assertEqual(results.take(['http://a.com/artist'])[0],
+                         {'http://a.com/artist': {'status': 'done', 'links': ['http://a.com/songs/1']}})
+        self.assertEqual(LeaseResults().discover('http://a.com/artist', '<a href="/songs/1">1</a>'), 0)
+
+class TestDistributedCrawl(unittest.TestCase):
+    """A coordinator and several workers, each in its own process."""
+
+    delay = 0.2
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.requests = defaultdict(list)
+        self.sites = [make_site(self.requests) for _ in range(3)]
+        self.urls = [f"http://127.0.0.1:{site.server_address[1]}/song{i}"
+                     for site in self.sites for i in range(5)]
+        self.config_path = os.path.join(self.temp_dir, 'config.json')
+        with open(self.config_path, 'w') as f:
+            json.dump({
+                'SELECTORS': SELECTORS,
+                'RATE_LIMITS': {'default': {'delay': self.delay, 'burst': 1}},
+                'http_cache': False,
+                'parse_workers': 0,
+                'lease_size': 2,
+                'lease_ttl': 5,
+                'batch_size': 4,
+                'worker_poll_interval': 0.1,
+                'temp_dir': os.path.join(self.temp_dir, 'temp')
+            }, f)
+        self.processes = []
+
+    def tearDown(self):
+        for process in self.processes:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+        for site in self.sites:
+            site.shutdown()
+            site.server_close()
+        shutil.rmtree(self.temp_dir)
+
+    def _start(self, *args):
+        process = subprocess.Popen([sys.executable, MAIN, '--config', self.config_path, *args],
+                                   cwd=self.temp_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.processes.append(process)
+        return process
+
+    def _wait_for_status(self, url, deadline):
+        while time.monotonic() < deadline:
+            try:
+                return requests.get(f"{url}/status", timeout=1).json()
+            except requests.RequestException:
+                time.sleep(0.1)
+        self.fail("Coordinator did not start")
+
+    def test_workers_share_the_crawl(self):
+        port = unused_port()
+        coordinator_url = f"http://127.0.0.1:{port}"
+        coordinator = self._start('--serve', f"127.0.0.1:{port}", *self.urls)
+        deadline = time.monotonic() + 60
+        self._wait_for_status(coordinator_url, deadline)
+        workers = [self._start('--coordinator', coordinator_url, '--worker-id', f"worker{i}",
+                               '--exit-when-done') for i in range(3)]
+        for worker in workers:
+            worker.wait(timeout=max(1, deadline - time.monotonic()))
+            self.assertEqual(worker.returncode, 0)
+
+        status = self._wait_for_status(coordinator_url, deadline)
+        self.assertEqual(status['frontier'], {'done': len(self.urls)})
+        self.assertEqual(status['stats']['expired'], 0)
+        coordinator.send_signal(signal.SIGINT)
+        coordinator.wait(timeout=30)
+
+        store = JSONLStore(os.path.join(self.temp_dir, 'song_lyrics.jsonl'))
+        self.assertEqual({record['url'] for record in store.iter_records()}, set(self.urls))
+        # Each site was crawled by one worker at a time, at its rate limit
+        for times in self.requests.values():
+            self.assertEqual(len(times), 5)
+            gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+            self.assertGreaterEqual(min(gaps), self.delay * 0.9)
+
+if __name__ == '__main__':
+    unittest.main()
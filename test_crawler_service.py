@@ -0,0 +1,167 @@
+import unittest
+import io
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from datetime import datetime
+from crawler_service import CrawlerService, EventWriter, ServiceServer, read_requests
+from fixture_site import FixtureSite
+from persistence import JSONLStore
+
+FINAL = ('complete', 'cancelled', 'failed', 'exported')
+
+class EventLog:
+    """Collects emitted events and waits for a job to finish."""
+
+    def __init__(self):
+        self.events = []
+        self.condition = threading.Condition()
+
+    def __call__(self, event):
+        with self.condition:
+            self.events.append(event)
+            self.condition.notify_all()
+
+    def statuses(self, job):
+        return [event['status'] for event in self.events if event.get('job') == job]
+
+    def wait_for(self, predicate, timeout=30):
+        with self.condition:
+            if not self.condition.wait_for(lambda: predicate(self.events), timeout):
+                raise AssertionError(f"Timed out, events: {self.events}")
+
+    def wait_done(self, job, timeout=30):
+        self.wait_for(lambda events: any(event.get('job') == job and event['status'] in FINAL
+                                         for event in events), timeout)
+
+class TestCrawlerService(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.sites = [FixtureSite('default', pages=4, page_kb=5).start() for _ in range(2)]
+        self.output_file = os.path.join(self.temp_dir, 'song_lyrics.jsonl')
+        self.legacy_file = os.path.join(self.temp_dir, 'song_lyrics.json')
+        self.service = CrawlerService({
+            'http_cache': False,
+            'rate_limit': 0.01,
+            'output_file': self.output_file,
+            'legacy_output_file': self.legacy_file,
+            'temp_dir': os.path.join(self.temp_dir, 'temp'),
+            'recrawl_db': os.path.join(self.temp_dir, 'frontier.db'),
+            'export_dir': os.path.join(self.temp_dir, 'exports'),
+            'error_db': os.path.join(self.temp_dir, 'errors.db')
+        }).start()
+
+    def tearDown(self):
+        self.service.close()
+        for site in self.sites:
+            site.stop()
+        shutil.rmtree(self.temp_dir)
+
+    def test_concurrent_jobs_share_the_output(self):
+        log = EventLog()
+        for i, site in enumerate(self.sites):
+            self.service.handle({'type': 'crawl', 'id': f"job{i}", 'urls': site.urls()}, log)
+        for i in range(2):
+            log.wait_done(f"job{i}")
+
+        statuses = log.statuses('job0')
+        self.assertEqual(statuses[:2], ['queued', 'started'])
+        self.assertEqual(statuses[-1], 'complete')
+        self.assertEqual(statuses.count('crawling'), 4)
+        self.assertEqual(statuses.count('update'), 4)
+        final = [event for event in log.events if event.get('job') == 'job1'][-1]
+        self.assertEqual(final['data']['urls_crawled'], 4)
+
+        records = list(JSONLStore(self.output_file).iter_records())
+        self.assertEqual({record['url'] for record in records},
+                         set(self.sites[0].urls() + self.sites[1].urls()))
+
+    def test_cancel(self):
+        log = EventLog()
+        self.service.handle({'type': 'crawl', 'id': 'slow', 'urls': self.sites[0].urls(),
+                             'rate_limit': 0.5}, log)
+        log.wait_for(lambda events: any(event['status'] == 'crawling' for event in events))
+        self.service.handle({'type': 'cancel', 'id': 'slow'}, log)
+        log.wait_done('slow')
+        self.assertEqual(log.statuses('slow')[-1], 'cancelled')
+        self.assertLess(len(list(JSONLStore(self.output_file).iter_records())), 4)
+
+    def test_update_check_merges_legacy_output(self):
+        url = self.sites[0].urls()[0]
+        with open(self.legacy_file, 'w', encoding='utf-8') as f:
+            json.dump([{'url': url, 'completion': 'old', 'last_crawled': datetime.now().isoformat()}], f)
+        log = EventLog()
+        self.service.handle({'type': 'crawl', 'id': 'update', 'urls': self.sites[0].urls()[:2],
+                             'check_updates': True}, log)
+        log.wait_done('update')
+        # The URL crawled before the store existed is not fetched again
+        final = [event for event in log.events if event.get('job') == 'update'][-1]
+        self.assertEqual(final['data']['urls_updated'], 1)
+        records = {record['url']: record for record in JSONLStore(self.output_file).iter_records()}
+        self.assertEqual(records[url]['completion'], 'old')
+        self.assertEqual(len(records), 2)
+
+    def test_export(self):
+        log = EventLog()
+        self.service.handle({'type': 'crawl', 'id': 'crawl', 'urls': self.sites[0].urls()[:2]}, log)
+        log.wait_done('crawl')
+        output = os.path.join(self.temp_dir, 'song_lyrics.csv')
+        self.service.handle({'type': 'export', 'id': 'export', 'output': output}, log)
+        log.wait_done('export')
+        self.service.handle({'type': 'export', 'id': 'xml', 'format': 'xml'}, log)
+
+        exported = log.events[-2]
+        self.assertEqual(exported['status'], 'exported')
+        self.assertEqual(exported['data']['records'], 2)
+        with open(output, newline='', encoding='utf-8') as f:
+            self.assertTrue(f.readline().startswith('title,artist,prompt,completion'))
+        self.assertEqual(log.statuses('xml'), ['rejected'])
+
+    def test_bad_requests_are_rejected(self):
+        log = EventLog()
+        lines = ['not json', '[1]', '{"type": "crawl", "id": "a", "urls": []}',
+                 '{"type": "crawl", "id": "b", "urls": ["http://a.com/"], "rate_limit": "fast"}',
+                 '{"type": "cancel", "id": "missing"}', '{"type": "dance"}', '',
+                 '{"type": "ping"}', '{"type": "shutdown"}', '{"type": "ping"}']
+        self.assertFalse(read_requests(lines, self.service, log))
+        self.assertEqual([event['status'] for event in log.events], ['rejected'] * 6 + ['pong'])
+
+    def test_event_writer_frames_lines(self):
+        stream = io.StringIO()
+        writer = EventWriter(stream)
+        threads = [threading.Thread(target=lambda n=n: [writer({'n': n, 'text': 'x\ny' * 100})
+                                                        for _ in range(50)])
+                   for n in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 200)
+        self.assertTrue(all(json.loads(line)['text'] == 'x\ny' * 100 for line in lines))
+
+    def test_socket_server(self):
+        server = ServiceServer(('127.0.0.1', 0), self.service)
+        threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+        try:
+            with socket.create_connection(server.server_address, timeout=30) as conn:
+                reader = conn.makefile('r', encoding='utf-8')
+                self.assertEqual(json.loads(reader.readline()), {'status': 'ready'})
+                request = {'type': 'crawl', 'id': 'tcp', 'urls': self.sites[1].urls()[:2]}
+                conn.sendall(json.dumps(request).encode() + b'\n')
+                deadline = time.monotonic() + 30
+                statuses = []
+                while time.monotonic() < deadline and not statuses[-1:] == ['complete']:
+                    statuses.append(json.loads(reader.readline())['status'])
+                self.assertEqual(statuses[-1], 'complete')
+                self.assertEqual(statuses.count('update'), 2)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import unittest
+import os
+import random
+import shutil
+import tempfile
+from dedup import DedupIndex, MinHasher, choose_bands, shingles, similarity
+from exporter import Exporter
+from persistence import JSONLStore
+from record_index import RecordIndex
+
+WORDS = ['love', 'night', 'baby', 'heart', 'fire', 'rain', 'sky', 'dance', 'road', 'home',
+         'light', 'dream', 'cold', 'gold', 'river', 'stone', 'wind', 'shadow', 'morning', 'city']
+
+def lyrics(seed, lines=24):
+    rng = random.Random(seed)
+    return '\n'.join(' '.join(rng.choice(WORDS) + str(rng.randint(0, 9)) for _ in range(8))
+                     for _ in range(lines))
+
+def variant(text, seed, changes=3):
+    """The same lyrics with a few words changed and different punctuation, as another site would have them."""
+    rng = random.Random(seed)
+    words = text.split(' ')
+    for _ in range(changes):
+        words[rng.randrange(len(words))] = 'yeah'
+    return ' '.join(words).upper().replace('\n', ',\n')
+
+class TestMinHash(unittest.TestCase):
+    def test_shingles_ignore_case_and_punctuation(self):
+        self.assertEqual(shingles("Hello, hello! Don't go", 2), {'hello hello', "hello don't", "don't go"})
+        self.assertEqual(shingles("Hi", 3), {'hi'})
+        self.assertEqual(shingles("...", 3), set())
+
+    def test_signatures_estimate_jaccard(self):
+        hasher = MinHasher()
+        text = lyrics(1)
+        self.assertEqual(len(hasher.signature(text)), 128)
+        self.assertEqual(hasher.signature(text), hasher.signature(text.upper()))
+        self.assertGreater(similarity(hasher.signature(text), hasher.signature(variant(text, 1))), 0.8)
+        self.assertLess(similarity(hasher.signature(text), hasher.signature(lyrics(2))), 0.2)
+        self.assertIsNone(hasher.signature(''))
+
+    def test_pure_python_signatures_match_numpy(self):
+        text = lyrics(3)
+        self.assertEqual(MinHasher(use_numpy=False).signature(text), MinHasher().signature(text))
+
+    def test_choose_bands(self):
+        bands, rows = choose_bands(128, 0.8)
+        self.assertLessEqual(bands * rows, 128)
+        # The S-curve's steepest point sits near the threshold
+        self.assertAlmostEqual((1 / bands) ** (1 / rows), 0.8, delta=0.1)
+
+class TestDedupIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'lyrics.dedup')
+        self.dedup = DedupIndex({}, self.db_path)
+
+    def tearDown(self):
+        self.dedup.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _record(self, url, text, last_crawled='2024-01-01T00:00:00'):
+        return {'url': url, 'completion': text, 'last_crawled': last_crawled}
+
+    def test_flags_near_duplicates(self):
+        text = lyrics(1)
+        self.assertIsNone(self.dedup.add(self._record('https://a.com/1', text)))
+        self.assertIsNone(self.dedup.add(self._record('https://b.com/1', lyrics(2))))
+        # Longer copies are kept by default, so the shorter first copy becomes the duplicate
+        self.assertIsNone(self.dedup.add(self._record('https://c.com/1', variant(text, 1))))
+        self.assertEqual(self.dedup.add(self._record('https://d.com/1', variant(text, 2, changes=1)[:-10])),
+                         'https://c.com/1')
+
+        self.assertTrue(self.dedup.is_duplicate('https://a.com/1'))
+        self.assertFalse(self.dedup.is_duplicate('https://b.com/1'))
+        self.assertFalse(self.dedup.is_duplicate('https://unknown.com/1'))
+        self.assertEqual(sorted(self.dedup.duplicates()), [('https://a.com/1', 'https://c.com/1'),
+                                                           ('https://d.com/1', 'https://c.com/1')])
+        self.assertEqual(self.dedup.stats(), {'records': 4, 'clusters': 1, 'duplicates': 2})
+
+    def test_changed_lyrics_leave_the_cluster(self):
+        text = lyrics(1)
+        self.dedup.add(self._record('https://a.com/1', text))
+        self.assertEqual(self.dedup.add(self._record('https://b.com/1', text)), 'https://a.com/1')
+        self.assertIsNone(self.dedup.add(self._record('https://b.com/1', lyrics(5), '2024-01-02T00:00:00')))
+        self.assertEqual(self.dedup.stats(), {'records': 2, 'clusters': 0, 'duplicates': 0})
+
+    def test_founder_leaving_does_not_keep_stale_matches(self):
+        text = lyrics(1)
+        self.dedup.add(self._record('https://a.com/1', text))
+        self.assertEqual(self.dedup.add(self._record('https://b.com/1', text)), 'https://a.com/1')
+        self.assertIsNone(self.dedup.add(self._record('https://a.com/1', lyrics(5), '2024-01-02T00:00:00')))
+        self.assertFalse(self.dedup.is_duplicate('https://a.com/1'))
+        self.assertFalse(self.dedup.is_duplicate('https://b.com/1'))
+
+    def test_cluster_splits_when_the_linking_member_changes(self):
+        self.dedup.close()
+        self.dedup = DedupIndex({'dedup_threshold': 0.5}, self.db_path)
+        lines = lyrics(1).split('\n')
+        # b and c each share most of a's lyrics but little with each other
+        self.dedup.add(self._record('https://a.com/1', '\n'.join(lines)))
+        self.dedup.add(self._record('https://b.com/1', '\n'.join(lines[:17])))
+        self.dedup.add(self._record('https://c.com/1', '\n'.join(lines[7:])))
+        self.assertEqual(self.dedup.stats(), {'records': 3, 'clusters': 1, 'duplicates': 2})
+        self.dedup.add(self._record('https://a.com/1', lyrics(5), '2024-01-02T00:00:00'))
+        self.assertEqual(self.dedup.stats(), {'records': 3, 'clusters': 0, 'duplicates': 0})
+
+    def test_keep_rules_and_site_priority(self):
+        self.dedup.close()
+        config = {'dedup_keep': ['site_priority', 'latest', 'bogus'], 'dedup_site_priority': ['genius.com']}
+        self.dedup = DedupIndex(config, self.db_path)
+        text = lyrics(1)
+        self.dedup.add(self._record('https://lyrics.com/1', text, '2024-01-01T00:00:00'))
+        self.dedup.add(self._record('https://www.genius.com/1', text, '2024-01-02T00:00:00'))
+        self.dedup.add(self._record('https://azlyrics.com/1', text, '2024-01-03T00:00:00'))
+        self.dedup.add(self._record('https://songs.com/1', text, '2024-01-04T00:00:00'))
+        self.assertEqual(self.dedup.keep_url('https://songs.com/1'), 'https://www.genius.com/1')
+        self.assertEqual(self.dedup.keep_rules, ['site_priority', 'latest'])
+
+        # Changing the rules picks the kept copies again when the index is reopened
+        self.dedup.close()
+        self.dedup = DedupIndex({'dedup_keep': ['first']}, self.db_path)
+        self.assertEqual(self.dedup.keep_url('https://songs.com/1'), 'https://lyrics.com/1')
+
+    def test_settings_change_clears_the_index(self):
+        self.dedup.add(self._record('https://a.com/1', lyrics(1)))
+        self.dedup.close()
+        self.dedup = DedupIndex({'dedup_num_perm': 64}, self.db_path)
+        self.assertEqual(self.dedup.stats()['records'], 0)
+
+class TestDedupBatch(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.temp_dir, 'song_lyrics.jsonl')
+        self.config = {'output_file': self.source, 'export_dir': os.path.join(self.temp_dir, 'exports')}
+        store = JSONLStore(self.source, compact_min_bytes=10 ** 9, temp_dir=self.temp_dir)
+        index = RecordIndex(store)
+        for n in range(10):
+            index.append({'url': f"https://a.com/{n}", 'title': f"Song {n}", 'completion': lyrics(n)})
+        for n in range(3):
+            index.append({'url': f"https://b.com/{n}", 'title': f"Song {n}",
+                          'completion': variant(lyrics(n), n, changes=1)})
+        index.close()
+        store.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_batch_pass_and_export(self):
+        dedup = DedupIndex(self.config)
+        try:
+            self.assertEqual(dedup.index_store(JSONLStore(self.source)), 13)
+            self.assertEqual(dedup.index_store(JSONLStore(self.source)), 13)
+            self.assertEqual(dedup.stats(), {'records': 13, 'clusters': 3, 'duplicates': 3})
+        finally:
+            dedup.close()
+
+        manifest = Exporter(self.config).export(self.source, 'jsonl')
+        self.assertEqual((manifest['records'], manifest['duplicates']), (10, 3))
+        manifest = Exporter({**self.config, 'export_dedup': False}).export(self.source, 'jsonl')
+        self.assertEqual((manifest['records'], manifest['duplicates']), (13, 0))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,19 +1,25 @@
 import unittest
 import sqlite3
 import os
+import tempfile
+import time
 from error_logger import ErrorLogger
 from pathlib import Path
 
 class TestErrorLogger(unittest.TestCase):
     def setUp(self):
-        self.config = {}
+        self.temp_dir = tempfile.mkdtemp()
+        self.config = {'error_db': os.path.join(self.temp_dir, 'crawler_errors.db')}
         self.error_logger = ErrorLogger(self.config)
         self.db_path = self.error_logger.db_path
 
     def tearDown(self):
+        self.error_logger.close()
         # Clean up the database file
-        if os.path.exists(self.db_path):
-            os.remove(self.db_path)
+        for path in (self.db_path, f"{self.db_path}-wal", f"{self.db_path}-shm"):
+            if os.path.exists(path):
+                os.remove(path)
+        os.rmdir(self.temp_dir)
 
     def test_init_error_db(self):
         # Check if the database file is created
@@ -34,6 +40,7 @@ class TestErrorLogger(unittest.TestCase):
         details = "Test details"
 
         self.error_logger.log_to_db(error_type, url, message, details)
+        self.error_logger.flush()
 
         # Verify that the error was logged to the database
         conn = sqlite3.connect(self.db_path)
@@ -48,5 +55,36 @@ class TestErrorLogger(unittest.TestCase):
         self.assertEqual(log[5], details)
         conn.close()
 
+    def test_batched_writes(self):
+        for i in range(250):
+            self.error_logger.log_to_db('ERROR', f"http://example.com/{i}", "Failed")
+        self.error_logger.flush()
+
+        conn = sqlite3.connect(self.db_path)
+        count = conn.execute("SELECT COUNT(*) FROM error_logs").fetchone()[0]
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        conn.close()
+        self.assertEqual(count, 250)
+        self.assertTrue({'idx_error_logs_url', 'idx_error_logs_error_type',
+                         'idx_error_logs_timestamp'} <= indexes)
+
+    def test_rows_are_written_after_flush_interval(self):
+        self.error_logger.close()
+        self.error_logger = ErrorLogger({**self.config, 'error_flush_interval': 0.05})
+        self.error_logger.log_to_db('WARNING', "http://example.com", "Slow")
+        time.sleep(0.3)
+        conn = sqlite3.connect(self.db_path)
+        count = conn.execute("SELECT COUNT(*) FROM error_logs").fetchone()[0]
+        conn.close()
+        self.assertEqual(count, 1)
+
+    def test_close_writes_pending_rows(self):
+        self.error_logger.log_to_db('ERROR', "http://example.com", "Pending")
+        self.error_logger.close()
+        conn = sqlite3.connect(self.db_path)
+        count = conn.execute("SELECT COUNT(*) FROM error_logs").fetchone()[0]
+        conn.close()
+        self.assertEqual(count, 1)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
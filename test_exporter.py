@@ -0,0 +1,184 @@
+import unittest
+import csv
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from exporter import Exporter
+from persistence import JSONLStore
+from record_index import RecordIndex
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+
+class TestExporter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.source = os.path.join(self.temp_dir, 'song_lyrics.jsonl')
+        self.export_dir = os.path.join(self.temp_dir, 'exports')
+        self.store = JSONLStore(self.source, compact_min_bytes=10 ** 9, temp_dir=self.temp_dir)
+        self.index = RecordIndex(self.store)
+        self.now = datetime(2024, 1, 2, 12, 0, 0)
+        self.exporter = Exporter({'export_dir': self.export_dir})
+
+    def tearDown(self):
+        self.index.close()
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _append(self, n, hours_ago=0, completion=None, flush=True):
+        self.index.append({
+            'url': f"http://example.com/{n}",
+            'title': f"Song {n}",
+            'artist': 'Artist, "The"',
+            'prompt': f"Write lyrics for Song {n}",
+            'completion': f"line one\nline two {n}" if completion is None else completion,
+            'last_crawled': (self.now - timedelta(hours=hours_ago)).isoformat()
+        })
+        if flush:
+            self.index.flush()
+
+    def _read_csv(self, files):
+        rows = []
+        for file in files:
+            with open(file, newline='', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                self.assertEqual(next(reader), ['title', 'artist', 'prompt', 'completion'])
+                rows.extend(reader)
+        return rows
+
+    def test_csv_exports_latest_record_per_url(self):
+        self._append(1, 5, completion="old")
+        self._append(2, 4)
+        self._append(3, 3, completion="")
+        self._append(1, 1)
+
+        manifest = self.exporter.export(self.source, 'csv')
+        self.assertEqual((manifest['records'], manifest['skipped']), (2, 1))
+        rows = self._read_csv(manifest['files'])
+        self.assertEqual(rows, [
+            ['Song 2', 'Artist, "The"', 'Write lyrics for Song 2', 'line one\nline two 2'],
+            ['Song 1', 'Artist, "The"', 'Write lyrics for Song 1', 'line one\nline two 1'],
+        ])
+        self.assertTrue(os.path.exists(manifest['files'][0].rsplit('-', 1)[0] + '.manifest.json'))
+
+    def test_jsonl_single_output_file(self):
+        for n in range(3):
+            self._append(n)
+        output = os.path.join(self.temp_dir, 'dataset.jsonl')
+        manifest = Exporter({'export_dir': self.export_dir,
+                             'export_fields': ['prompt', 'completion']}).export(self.source, 'jsonl',
+                                                                                output=output)
+        self.assertEqual(manifest['files'], [output])
+        with open(output, encoding='utf-8') as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual(lines[0], {'prompt': 'Write lyrics for Song 0', 'completion': 'line one\nline two 0'})
+        self.assertEqual(len(lines), 3)
+
+    def test_single_output_file_is_replaced_whole(self):
+        output = os.path.join(self.temp_dir, 'dataset.csv')
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write('previous export\n')
+
+        def failing():
+            yield {'url': 'a', 'title': 'A', 'completion': 'a'}
+            raise OSError('disk full')
+
+        with self.assertRaises(OSError):
+            self.exporter.export(self.source, 'csv', output=output, records=failing())
+        with open(output, encoding='utf-8') as f:
+            self.assertEqual(f.read(), 'previous export\n')
+
+        self._append(1)
+        manifest = self.exporter.export(self.source, 'csv', output=output)
+        self.assertEqual(manifest['files'], [output])
+        self.assertEqual(len(self._read_csv([output])), 1)
+        self.assertEqual(os.listdir(self.temp_dir).count('dataset.csv.tmp'), 0)
+
+    def test_shards_are_size_capped(self):
+        for n in range(20):
+            self._append(n, completion='x' * 500)
+        exporter = Exporter({'export_dir': self.export_dir, 'export_shard_mb': 2000 / (1024 * 1024)})
+        manifest = exporter.export(self.source, 'csv')
+
+        self.assertGreater(len(manifest['files']), 1)
+        for file in manifest['files'][:-1]:
+            size = os.path.getsize(file)
+            self.assertGreaterEqual(size, 2000)
+            self.assertLess(size, 2000 + 600)
+        self.assertTrue(manifest['files'][0].endswith('-00000.csv'))
+        self.assertEqual(len(self._read_csv(manifest['files'])), 20)
+
+    def test_incremental_export(self):
+        self._append(1, 3)
+        self._append(2, 2)
+        first = self.exporter.export(self.source, 'csv', incremental=True)
+        self.assertEqual(first['records'], 2)
+        self.assertIsNone(first['since'])
+
+        nothing = self.exporter.export(self.source, 'csv', incremental=True)
+        self.assertEqual(nothing['records'], 0)
+        self.assertEqual(self._read_csv(nothing['files']), [])
+
+        self._append(3, 1)
+        self._append(1, 0, completion="updated")
+        changed = self.exporter.export(self.source, 'csv', incremental=True)
+        self.assertEqual(changed['since'], (self.now - timedelta(hours=2)).isoformat())
+        self.assertEqual([row[0] for row in self._read_csv(changed['files'])], ['Song 3', 'Song 1'])
+
+        # The watermark is kept per format
+        self.assertEqual(self.exporter.export(self.source, 'jsonl', incremental=True)['records'], 3)
+
+    def test_export_while_store_is_written(self):
+        self._append(1, 3)
+        self._append(2, 2)
+        # Uncommitted index changes lock the index, as during a crawl
+        self._append(3, 1, flush=False)
+        self._append(1, 0, completion="updated", flush=False)
+
+        manifest = self.exporter.export(self.source, 'csv')
+        rows = self._read_csv(manifest['files'])
+        self.assertEqual([row[0] for row in rows], ['Song 2', 'Song 3', 'Song 1'])
+        self.assertEqual(rows[2][3], 'updated')
+
+        since = (self.now - timedelta(hours=2)).isoformat()
+        view = RecordIndex(self.store, read_only=True)
+        try:
+            self.assertEqual([record['title'] for record in view.iter_records(since)], ['Song 3', 'Song 1'])
+        finally:
+            view.close()
+
+    def test_legacy_json_source(self):
+        source = os.path.join(self.temp_dir, 'song_lyrics.json')
+        with open(source, 'w', encoding='utf-8') as f:
+            json.dump([{'url': 'a', 'title': 'A', 'completion': 'old'},
+                       {'url': 'b', 'title': 'B', 'completion': 'b'},
+                       {'url': 'a', 'title': 'A', 'completion': 'new'}], f)
+        manifest = self.exporter.export(source, 'csv', output=os.path.join(self.temp_dir, 'song_lyrics.csv'))
+        self.assertEqual([row[3] for row in self._read_csv(manifest['files'])], ['new', 'b'])
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            self.exporter.export(self.source, 'xml')
+
+    @unittest.skipUnless(HAS_PYARROW, 'pyarrow is not installed')
+    def test_parquet_row_groups(self):
+        import pyarrow.parquet as pq
+        for n in range(25):
+            self._append(n)
+        exporter = Exporter({'export_dir': self.export_dir, 'export_row_group_size': 10})
+        manifest = exporter.export(self.source, 'parquet')
+        parquet_file = pq.ParquetFile(manifest['files'][0])
+        self.assertEqual(parquet_file.metadata.num_rows, 25)
+        self.assertEqual(parquet_file.metadata.num_row_groups, 3)
+        self.assertEqual(parquet_file.read().column('title')[0].as_py(), 'Song 0')
+
+    @unittest.skipIf(HAS_PYARROW, 'pyarrow is installed')
+    def test_parquet_requires_pyarrow(self):
+        self._append(1)
+        with self.assertRaisesRegex(ImportError, 'pyarrow'):
+            self.exporter.export(self.source, 'parquet')
+
+if __name__ == '__main__':
+    unittest.main()
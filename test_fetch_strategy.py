@@ -0,0 +1,100 @@
+import unittest
+from unittest.mock import MagicMock
+from fetch_strategy import FetchStrategy
+from http_request import FetchResult
+from js_renderer import JSRenderer
+
+STATIC_PAGE = '<html><body><div class="lyrics">static lyrics</div></body></html>'
+SHELL_PAGE = '<html><body><div id="app"></div></body></html>'
+RENDERED_PAGE = '<html><body><div class="lyrics">rendered lyrics</div></body></html>'
+
+def extract(html, url):
+    return 'lyrics' if 'class="lyrics"' in html else None
+
+class FakeRequest:
+    def __init__(self, pages):
+        self.pages = pages
+        self.calls = []
+
+    def fetch(self, url, render_js=False):
+        self.calls.append(url)
+        return FetchResult(self.pages.get(url), False)
+
+class FakeRenderer:
+    def __init__(self, html=RENDERED_PAGE):
+        self.html = html
+        self.calls = []
+
+    def render(self, url):
+        self.calls.append(url)
+        return self.html
+
+class TestFetchStrategy(unittest.TestCase):
+    def test_static_page_is_never_rendered(self):
+        http_request = FakeRequest({"http://static.com/1": STATIC_PAGE})
+        renderer = FakeRenderer()
+        strategy = FetchStrategy(http_request, extract, renderer)
+        result = strategy.fetch("http://static.com/1")
+        self.assertEqual((result.html, result.extracted, result.rendered), (STATIC_PAGE, 'lyrics', False))
+        self.assertEqual(renderer.calls, [])
+
+    def test_escalates_when_selectors_miss(self):
+        http_request = FakeRequest({"http://js.com/1": SHELL_PAGE})
+        strategy = FetchStrategy(http_request, extract, FakeRenderer())
+        result = strategy.fetch("http://js.com/1")
+        self.assertEqual((result.html, result.rendered), (RENDERED_PAGE, True))
+        self.assertFalse(strategy.needs_js("js.com"))
+
+    def test_js_domain_is_rendered_directly(self):
+        urls = [f"http://js.com/{i}" for i in range(5)]
+        http_request = FakeRequest({url: SHELL_PAGE for url in urls})
+        renderer = FakeRenderer()
+        strategy = FetchStrategy(http_request, extract, renderer, {'js_escalation_threshold': 2})
+        for url in urls:
+            self.assertTrue(strategy.fetch(url).rendered)
+        self.assertTrue(strategy.needs_js("js.com"))
+        # Only the two escalations paid for a static fetch
+        self.assertEqual(http_request.calls, urls[:2])
+        self.assertEqual(renderer.calls, urls)
+
+    def test_js_domain_is_rechecked_statically(self):
+        http_request = FakeRequest({})
+        strategy = FetchStrategy(http_request, extract, FakeRenderer(),
+                                 {'js_escalation_threshold': 1, 'js_recheck_every': 3})
+        http_request.pages["http://js.com/0"] = SHELL_PAGE
+        strategy.fetch("http://js.com/0")
+        self.assertTrue(strategy.needs_js("js.com"))
+        # The site now serves lyrics statically; the periodic probe notices
+        for i in range(1, 4):
+            http_request.pages[f"http://js.com/{i}"] = STATIC_PAGE
+            strategy.fetch(f"http://js.com/{i}")
+        self.assertFalse(strategy.needs_js("js.com"))
+        self.assertEqual(http_request.calls, ["http://js.com/0", "http://js.com/3"])
+
+    def test_missing_renderer_returns_static_page(self):
+        http_request = FakeRequest({"http://js.com/1": SHELL_PAGE})
+        strategy = FetchStrategy(http_request, extract)
+        result = strategy.fetch("http://js.com/1")
+        self.assertEqual((result.html, result.extracted, result.rendered), (SHELL_PAGE, None, False))
+
+    def test_failed_render_falls_back_to_static_page(self):
+        http_request = FakeRequest({"http://js.com/1": SHELL_PAGE})
+        strategy = FetchStrategy(http_request, extract, FakeRenderer(html=None))
+        self.assertEqual(strategy.fetch("http://js.com/1").html, SHELL_PAGE)
+
+    def test_not_modified_is_not_extracted(self):
+        http_request = MagicMock()
+        http_request.fetch.return_value = FetchResult(STATIC_PAGE, True)
+        extract_mock = MagicMock()
+        strategy = FetchStrategy(http_request, extract_mock, FakeRenderer())
+        self.assertTrue(strategy.fetch("http://static.com/1").not_modified)
+        extract_mock.assert_not_called()
+
+    def test_renderer_without_requests_html(self):
+        renderer = JSRenderer()
+        renderer.available = False
+        self.assertIsNone(renderer.render("http://js.com/1"))
+        renderer.close()
+
+if __name__ == '__main__':
+    unittest.main()
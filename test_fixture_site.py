@@ -0,0 +1,37 @@
+import unittest
+import requests
+from fixture_site import FixtureSite, build_page, song
+from html_parser import HTMLParser
+from config_manager import ConfigManager
+
+class TestFixtureSite(unittest.TestCase):
+    def test_pages_are_deterministic_and_sized(self):
+        for layout in ('genius', 'default'):
+            page = build_page(layout, 7, page_kb=40)
+            self.assertEqual(page, build_page(layout, 7, page_kb=40))
+            self.assertGreaterEqual(len(page), 40 * 1024)
+            self.assertLess(len(page), 44 * 1024)
+        self.assertNotEqual(build_page('default', 1), build_page('default', 2))
+
+    def test_layouts_match_configured_selectors(self):
+        parser = HTMLParser(ConfigManager('config.json').config)
+        title, artist, lines = song(3)
+        for layout, host in (('genius', 'genius.com'), ('default', 'example.com')):
+            extracted = parser.extract(build_page(layout, 3, page_kb=20), f"http://{host}/songs/3")
+            self.assertEqual(extracted[:2], (title, artist))
+            self.assertIn(lines[-1], extracted[2])
+
+    def test_serves_pages_with_etags(self):
+        with FixtureSite('genius', pages=3, page_kb=10, latency=0.01) as site:
+            response = requests.get(site.url(1), timeout=5)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, site.page(1))
+            etag = response.headers['ETag']
+            response = requests.get(site.url(1), headers={'If-None-Match': etag}, timeout=5)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(requests.get(site.url(3), timeout=5).status_code, 404)
+            self.assertEqual(len(site.urls()), 3)
+            self.assertEqual((site.requests, site.not_modified), (3, 1))
+
+if __name__ == '__main__':
+    unittest.main()
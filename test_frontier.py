@@ -0,0 +1,122 @@
+import unittest
+import os
+import tempfile
+from frontier import Frontier, PENDING, IN_PROGRESS, DONE, FAILED
+
+class TestFrontier(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'frontier.db')
+        self.frontier = Frontier(self.db_path, max_attempts=2, retry_delay=0)
+        self.urls = [
+            "http://example.com/lyrics1",
+            "https://example.com/lyrics2",
+            "invalid-url"
+        ]
+
+    def tearDown(self):
+        self.frontier.close()
+        for file in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, file))
+        os.rmdir(self.temp_dir)
+
+    def test_add_urls_skips_invalid_and_duplicates(self):
+        self.assertEqual(self.frontier.add_urls(self.urls, seed=True), 2)
+        self.assertEqual(self.frontier.add_urls(self.urls, seed=True), 0)
+        self.assertEqual(self.frontier.allowed_domains, {"example.com"})
+        self.assertEqual(self.frontier.counts(), {PENDING: 2})
+
+    def test_non_seed_urls_must_be_allowed(self):
+        self.frontier.add_urls(self.urls, seed=True)
+        self.assertEqual(self.frontier.add_urls(["http://other.com/song"]), 0)
+        self.assertEqual(self.frontier.add_urls(["http://example.com/song3"]), 1)
+        self.assertFalse(self.frontier.is_allowed_domain("http://other.com/song"))
+
+    def test_dequeue_orders_by_priority(self):
+        self.frontier.add_urls(self.urls, seed=True)
+        self.frontier.add_urls(["http://example.com/urgent"], priority=10)
+        self.assertEqual(self.frontier.dequeue(2),
+                         ["http://example.com/urgent", "http://example.com/lyrics1"])
+        self.assertEqual(self.frontier.dequeue(5), ["https://example.com/lyrics2"])
+        self.assertEqual(self.frontier.dequeue(5), [])
+        self.assertEqual(self.frontier.counts(), {IN_PROGRESS: 3})
+
+    def test_mark_done_and_failed(self):
+        self.frontier.add_urls(self.urls, seed=True)
+        first, second = self.frontier.dequeue(2)
+        self.frontier.mark_done(first)
+        self.frontier.mark_failed(second)
+        self.assertEqual(self.frontier.counts(), {DONE: 1, PENDING: 1})
+        self.assertEqual((self.frontier.count(PENDING), self.frontier.count(IN_PROGRESS)), (1, 0))
+        self.assertEqual(self.frontier.dequeue(5), [second])
+        self.frontier.mark_failed(second)
+        self.assertEqual(self.frontier.counts(), {DONE: 1, FAILED: 1})
+
+    def test_next_eligible_respected(self):
+        self.frontier.add_urls(self.urls, seed=True)
+        url = self.frontier.get_next_url()
+        self.frontier.mark_failed(url, retry_delay=3600)
+        self.assertEqual(self.frontier.dequeue(5), ["https://example.com/lyrics2"])
+        self.assertEqual(self.frontier.dequeue(5), [])
+        self.assertGreater(self.frontier.next_eligible_time(), 0)
+
+    def test_resume_after_crash(self):
+        self.frontier.add_urls(self.urls, seed=True)
+        claimed = self.frontier.dequeue(1)
+        self.frontier.mark_done(self.frontier.dequeue(1)[0])
+        self.frontier.close()
+
+        self.frontier = Frontier(self.db_path)
+        self.assertEqual(self.frontier.allowed_domains, {"example.com"})
+        self.assertEqual(self.frontier.recover(), 1)
+        self.assertEqual(self.frontier.dequeue(5), claimed)
+
+    def test_requeue(self):
+        self.frontier.add_urls(self.urls, seed=True)
+        for url in self.frontier.dequeue(2):
+            self.frontier.mark_done(url)
+        self.assertEqual(self.frontier.requeue(["http://example.com/lyrics1"]), 1)
+        self.assertEqual(self.frontier.counts(), {DONE: 1, PENDING: 1})
+        self.assertEqual(self.frontier.requeue(), 1)
+        self.assertEqual(self.frontier.counts(), {PENDING: 2})
+
+    def test_mark_done_many(self):
+        self.frontier.add_urls(self.urls, seed=True)
+        self.frontier.mark_done_many(["http://example.com/lyrics1", "https://example.com/lyrics2"])
+        self.assertEqual(self.frontier.counts(), {DONE: 2})
+
+    def test_requeue_due(self):
+        self.frontier.add_urls(self.urls, seed=True)
+        first, second = self.frontier.dequeue(2)
+        self.frontier.mark_done(first, next_eligible=1000)
+        self.frontier.schedule_many([(second, 2000)])
+        self.assertEqual(self.frontier.next_revisit_time(), 1000)
+        self.assertEqual(self.frontier.requeue_due(now=999), 0)
+        self.assertEqual(self.frontier.requeue_due(now=1500), 1)
+        self.assertEqual(self.frontier.dequeue(5, now=1500), [first])
+
+        self.frontier.mark_failed(first)
+        self.frontier.mark_failed(self.frontier.dequeue(1, now=10 ** 10)[0])
+        self.assertEqual(self.frontier.counts(), {DONE: 1, FAILED: 1})
+        self.assertEqual(self.frontier.requeue_due(now=1500, failed_after=10 ** 10), 0)
+        self.assertEqual(self.frontier.requeue_due(now=10 ** 10, failed_after=60), 2)
+        self.assertEqual(self.frontier.counts(), {PENDING: 2})
+
+    def test_dequeue_domain(self):
+        self.frontier.add_urls(self.urls, seed=True)
+        self.frontier.add_urls(["http://other.com/a", "http://other.com/b"], priority=5, seed=True)
+        self.assertEqual(self.frontier.dequeue_domain(5),
+                         ("other.com", ["http://other.com/a", "http://other.com/b"]))
+        self.assertEqual(self.frontier.dequeue_domain(1, exclude=["other.com"]),
+                         ("example.com", ["http://example.com/lyrics1"]))
+        self.assertEqual(self.frontier.dequeue_domain(5, exclude=["example.com"]), (None, []))
+        self.assertEqual(self.frontier.counts(), {IN_PROGRESS: 3, PENDING: 1})
+
+    def test_add_seed_file(self):
+        seed_file = os.path.join(self.temp_dir, 'seeds.txt')
+        with open(seed_file, 'w') as f:
+            f.write("\n".join(f"http://example.com/song{i}" for i in range(25)))
+        self.assertEqual(self.frontier.add_seed_file(seed_file), 25)
+
+if __name__ == '__main__':
+    unittest.main()
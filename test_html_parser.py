@@ -1,5 +1,5 @@
 import unittest
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from bs4 import BeautifulSoup
 from html_parser import HTMLParser
 
@@ -62,5 +62,39 @@ class TestHTMLParser(unittest.TestCase):
         lyrics = self.html_parser.extract_lyrics(html, "http://another-example.com")
         self.assertEqual(lyrics, "Test lyrics")
 
+    def test_extract_parses_once(self):
+        html = """
+        <html>
+        <head>
+            <title>Test Title</title>
+            <meta name="artist" content="Test Artist">
+        </head>
+        <body>
+            <h1>Main Title</h1>
+            <div class="artist">Artist Name</div>
+            <div class="lyrics">Example lyrics</div>
+            <div id="lyrics">Test lyrics</div>
+        </body>
+        </html>
+        """
+        for url in ("http://example.com", "http://another-example.com"):
+            expected = self.html_parser.extract_metadata(html, url) + (
+                self.html_parser.extract_lyrics(html, url),)
+            backend = self.html_parser.backend
+            with patch.object(backend, 'parse', wraps=backend.parse) as mock_parse:
+                result = self.html_parser.extract(html, url)
+            self.assertEqual(mock_parse.call_count, 1)
+            self.assertEqual(result, expected)
+
+        self.assertEqual(self.html_parser.extract(html, "http://example.com"),
+                         ("Main Title", "Artist Name", "Example lyrics"))
+        self.assertEqual(self.html_parser.extract(html, "http://another-example.com"),
+                         ("Test Title", "Test Artist", "Test lyrics"))
+
+    def test_extract_missing_lyrics(self):
+        html = "<html><head><title>Only Title</title></head><body></body></html>"
+        title, artist, lyrics = self.html_parser.extract(html, "http://example.com")
+        self.assertIsNone(lyrics)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,79 @@
+import unittest
+from crawl_lyrics import LyricsCrawler
+from html_parser import HTMLParser
+from html_prefilter import HTMLPrefilter, referenced_tags
+from parser_backends import available_backends
+from parser_fixtures import FIXTURES, SELECTORS
+
+class TestHTMLPrefilter(unittest.TestCase):
+    def test_referenced_tags(self):
+        self.assertEqual(referenced_tags(['div[class*="Lyrics__Container"]', '.song-header h1',
+                                          'meta[property="og:title"]', 'a[href*="/artists/"]',
+                                          '.song_body-lyrics']),
+                         {'div', 'h1', 'meta', 'a'})
+
+    def test_hollows_scripts_styles_and_comments(self):
+        prefilter = HTMLPrefilter({'lyrics': ['div.lyrics']})
+        html = ('<div class="lyrics">a<script type="text/javascript">var s = "<div>";</script>b'
+                '<!-- <div class="lyrics">hidden</div> -->c<STYLE>.x{}</STYLE></div>')
+        self.assertEqual(prefilter.apply(html),
+                         '<div class="lyrics">a<script type="text/javascript"></script>b'
+                         '<!---->c<STYLE></STYLE></div>')
+
+    def test_referenced_tags_are_kept(self):
+        prefilter = HTMLPrefilter({'title': ['script[type="application/ld+json"]']})
+        html = '<script type="application/ld+json">{"name": "x"}</script><style>.x{}</style>'
+        self.assertEqual(prefilter.apply(html),
+                         '<script type="application/ld+json">{"name": "x"}</script><style></style>')
+
+    def test_unclosed_script_is_left_alone(self):
+        prefilter = HTMLPrefilter({'lyrics': ['div']})
+        html = '<div>text</div><script>never closed'
+        self.assertEqual(prefilter.apply(html), html)
+
+    def test_extraction_unchanged(self):
+        for name in available_backends():
+            with self.subTest(backend=name):
+                plain = HTMLParser({'SELECTORS': SELECTORS, 'parser_backend': name, 'prefilter': False})
+                filtered = HTMLParser({'SELECTORS': SELECTORS, 'parser_backend': name, 'prefilter': True})
+                for html, url in FIXTURES:
+                    self.assertEqual(filtered.extract(html, url), plain.extract(html, url))
+
+    def test_selector_fallbacks_still_work(self):
+        config = {
+            'SELECTORS': {
+                'default': {
+                    'title': ['h1.missing', 'meta[property="og:title"]', 'title'],
+                    'artist': ['h2.missing', 'meta[name="artist"]'],
+                    'lyrics': ['div.missing', '.song-lyrics']
+                }
+            },
+            'prefilter': True
+        }
+        html = """
+        <html><head>
+            <title>Fallback Title</title>
+            <!-- <meta property="og:title" content="Commented Out"> -->
+            <meta name="artist" content="Meta Artist">
+            <script>document.write('<div class="missing">injected</div>');</script>
+        </head>
+        <body><div class="song-lyrics">Real lyrics</div></body></html>
+        """
+        self.assertEqual(HTMLParser(config).extract(html, "http://lyrics.example.org/song"),
+                         ("Fallback Title", "Meta Artist", "Real lyrics"))
+
+    def test_auto_follows_backend(self):
+        parser = HTMLParser({'SELECTORS': SELECTORS, 'parser_backend': 'html.parser'})
+        self.assertTrue(parser.prefilter_enabled)
+
+    def test_lyrics_crawler_follows_the_config(self):
+        html = '<html><body><script>var a;</script><style>p {}</style><p>Hi</p></body></html>'
+        url = "http://lyrics.example.org/song"
+        for config, expected in [({}, '<script></script><style></style>'),
+                                 ({'prefilter': False}, '<script>var a;</script><style>p {}</style>'),
+                                 ({'prefilter_hollow_tags': ['style']}, '<script>var a;</script><style></style>')]:
+            with LyricsCrawler([url], {'http_cache': False, **config}, report=lambda event: None) as crawler:
+                self.assertIn(expected, str(crawler._parse(url, html)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import os
+import tempfile
+from unittest.mock import patch, MagicMock
+from http_cache import HTTPCache, open_cache
+from http_request import HTTPRequest
+from persistence import JSONLStore
+from record_index import RecordIndex
+
+def make_response(status_code, text="", headers=None):
+    response = MagicMock()
+    response.status_code = status_code
+    response.text = text
+    response.headers = headers or {}
+    return response
+
+class TestHTTPCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = HTTPCache(os.path.join(self.temp_dir, 'cache.db'))
+
+    def tearDown(self):
+        self.cache.close()
+        for file in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, file))
+        os.rmdir(self.temp_dir)
+
+    def test_store_and_get(self):
+        self.assertTrue(self.cache.store("http://example.com/1", "<html>é</html>", etag='"abc"'))
+        cached = self.cache.get("http://example.com/1")
+        self.assertEqual(cached.body, "<html>é</html>")
+        self.assertEqual(cached.conditional_headers(), {'If-None-Match': '"abc"'})
+        self.assertIn("http://example.com/1", self.cache)
+        self.assertIsNone(self.cache.get("http://example.com/missing"))
+
+    def test_responses_without_validators_are_not_stored(self):
+        self.assertFalse(self.cache.store("http://example.com/1", "<html></html>"))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_touch_updates_validators(self):
+        self.cache.store("http://example.com/1", "body", etag='"v1"',
+                         last_modified="Mon, 01 Jan 2024 00:00:00 GMT")
+        self.cache.touch("http://example.com/1", etag='"v2"')
+        self.assertEqual(self.cache.get("http://example.com/1").conditional_headers(), {
+            'If-None-Match': '"v2"',
+            'If-Modified-Since': "Mon, 01 Jan 2024 00:00:00 GMT"
+        })
+
+    def test_open_cache_can_be_disabled(self):
+        self.assertIsNone(open_cache({'http_cache': False}))
+
+    @patch('http_request.requests.Session')
+    def test_conditional_fetch(self, MockSession):
+        session = MockSession.return_value
+        http_request = HTTPRequest({}, cache=self.cache)
+        http_request.session = session
+        url = "http://example.com/song"
+
+        session.get.return_value = make_response(200, "<html>v1</html>", {'ETag': '"v1"'})
+        self.assertEqual(http_request.fetch(url)[:2], ("<html>v1</html>", False))
+        self.assertIsNone(session.get.call_args.kwargs['headers'])
+
+        session.get.return_value = make_response(304)
+        self.assertEqual(http_request.fetch(url)[:2], ("<html>v1</html>", True))
+        self.assertEqual(session.get.call_args.kwargs['headers'], {'If-None-Match': '"v1"'})
+
+        session.get.return_value = make_response(200, "<html>v2</html>", {'ETag': '"v2"'})
+        self.assertEqual(http_request.get(url), "<html>v2</html>")
+        self.assertEqual(self.cache.get(url).etag, '"v2"')
+
+    def test_not_modified_bumps_last_crawled(self):
+        store = JSONLStore(os.path.join(self.temp_dir, 'lyrics.jsonl'), temp_dir=self.temp_dir)
+        index = RecordIndex(store)
+        try:
+            url = "http://example.com/song"
+            index.append({'url': url, 'completion': "lyrics", 'last_crawled': "2024-01-01T00:00:00"})
+            self.assertTrue(index.touch(url))
+            self.assertFalse(index.touch("http://example.com/missing"))
+            self.assertEqual(index.get(url)['completion'], "lyrics")
+            self.assertGreater(index.last_crawled(url), "2024-01-01T00:00:00")
+        finally:
+            index.close()
+            store.close()
+
+if __name__ == '__main__':
+    unittest.main()
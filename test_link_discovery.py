@@ -0,0 +1,117 @@
+import unittest
+import os
+import shutil
+import tempfile
+from frontier import Frontier, PENDING
+from link_discovery import BloomFilter, LinkDiscovery, LinkExtractor, normalize_url
+
+PATTERNS = {'LINK_PATTERNS': {'genius.com': ['-lyrics$', '^/artists/'], 'default': ['^/songs/']}}
+
+class TestNormalizeUrl(unittest.TestCase):
+    def test_normalize(self):
+        base = 'https://genius.com/artists/Adele'
+        self.assertEqual(normalize_url('/Adele-hello-lyrics#verse', base), 'https://genius.com/Adele-hello-lyrics')
+        self.assertEqual(normalize_url('HTTPS://Genius.COM:443', base), 'https://genius.com/')
+        self.assertEqual(normalize_url('http://a.com:8080/x/./y/../z?b=1&utm_source=x&a=2'),
+                         'http://a.com:8080/x/z?b=1&a=2')
+        self.assertEqual(normalize_url('songs?id=1&amp;ref=home', 'http://a.com/'), 'http://a.com/songs?id=1')
+        self.assertEqual(normalize_url('//b.com/songs/1', 'https://a.com/'), 'https://b.com/songs/1')
+        for href in ['mailto:me@a.com', 'javascript:void(0)', 'http://a.com:port/', 'ftp://a.com/']:
+            self.assertIsNone(normalize_url(href, base))
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives_and_bounded_false_positives(self):
+        bloom = BloomFilter(10000, 0.01)
+        self.assertLess(len(bloom.bits) / 10000, 1.3)
+        # A few new items already look present as the filter fills up
+        self.assertGreater(sum(bloom.add(f"http://a.com/songs/{n}") for n in range(10000)), 9900)
+        self.assertTrue(all(f"http://a.com/songs/{n}" in bloom for n in range(10000)))
+        self.assertFalse(bloom.add('http://a.com/songs/1'))
+        false_positives = sum(f"http://b.com/songs/{n}" in bloom for n in range(10000))
+        self.assertLess(false_positives, 200)
+        self.assertLessEqual(len(bloom), 10000)
+
+    def test_save_and_load(self):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(temp_dir, 'seen.bloom')
+            bloom = BloomFilter(1000)
+            bloom.add('http://a.com/1')
+            bloom.save(path)
+            loaded = BloomFilter.load(path)
+            self.assertIn('http://a.com/1', loaded)
+            self.assertNotIn('http://a.com/2', loaded)
+            self.assertEqual((loaded.count, loaded.num_bits, loaded.num_hashes),
+                             (1, bloom.num_bits, bloom.num_hashes))
+            with open(path, 'r+b') as f:
+                f.truncate(100)
+            with self.assertRaises(ValueError):
+                BloomFilter.load(path)
+        finally:
+            shutil.rmtree(temp_dir)
+
+class TestLinkExtractor(unittest.TestCase):
+    def test_extracts_matching_links(self):
+        html = ('<html><body>'
+                '<a href="/Adele-hello-lyrics">Hello</a>'
+                '<a class="x" href=\'/Adele-hello-lyrics#top\'>Hello again</a>'
+                '<a href=/artists/Adele>Adele</a>'
+                '<a href="/about">About</a>'
+                '<link href="/artists/style.css">'
+                '<a href="https://other.com/songs/1">Elsewhere</a>'
+                '<a href="https://other.com/news/1">News</a>'
+                '</body></html>')
+        links = LinkExtractor(PATTERNS).extract(html, 'https://genius.com/albums/Adele/25')
+        self.assertEqual(links, ['https://genius.com/Adele-hello-lyrics', 'https://genius.com/artists/Adele',
+                                 'https://other.com/songs/1'])
+
+    def test_base_href_and_no_patterns(self):
+        html = '<head><base href="/lyrics/"></head><a href="songs/1">1</a>'
+        self.assertEqual(LinkExtractor({'LINK_PATTERNS': {'default': ['songs']}}).extract(html, 'http://a.com/x'),
+                         ['http://a.com/lyrics/songs/1'])
+        self.assertEqual(LinkExtractor({}).extract(html, 'http://a.com/x'), [])
+
+class TestLinkDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.frontier = Frontier(os.path.join(self.temp_dir, 'frontier.db'))
+        self.frontier.add_urls(['http://a.com/songs/1'], seed=True)
+        self.config = {**PATTERNS, 'discovery_capacity': 1000}
+
+    def tearDown(self):
+        self.frontier.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_queues_new_links_of_allowed_domains(self):
+        discovery = LinkDiscovery(self.config, self.frontier)
+        html = ''.join(f'<a href="/songs/{n}">{n}</a>' for n in range(1, 4)) + '<a href="http://b.com/songs/9">b</a>'
+        self.assertEqual(discovery.discover('http://a.com/songs/1', html), 2)
+        self.assertEqual(discovery.discover('http://a.com/songs/2', html), 0)
+        self.assertEqual(self.frontier.counts(), {PENDING: 3})
+        self.assertEqual(discovery.stats, {'pages': 2, 'links': 8, 'queued': 2})
+        # Links of domains added later are not taken as seen
+        self.frontier.add_domains(['b.com'])
+        self.assertEqual(discovery.add_links(['http://b.com/songs/9']), 1)
+
+    def test_filter_is_saved_and_rebuilt(self):
+        discovery = LinkDiscovery(self.config, self.frontier)
+        discovery.add_links(['http://a.com/songs/2'])
+        discovery.close()
+        path = os.path.join(self.temp_dir, 'frontier.db.bloom')
+        self.assertTrue(os.path.exists(path))
+
+        reopened = LinkDiscovery(self.config, self.frontier)
+        # Built from the seed URL, then saved with the discovered one
+        self.assertEqual(len(reopened.seen), 2)
+        self.assertIn('http://a.com/songs/2', reopened.seen)
+
+        # A filter holding more URLs than the frontier is from another crawl
+        other = Frontier(os.path.join(self.temp_dir, 'other.db'))
+        try:
+            rebuilt = LinkDiscovery({**self.config, 'discovery_filter': path}, other)
+            self.assertEqual(len(rebuilt.seen), 0)
+        finally:
+            other.close()
+
+if __name__ == '__main__':
+    unittest.main()
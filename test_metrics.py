@@ -0,0 +1,138 @@
+import unittest
+import json
+import os
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from http_request import HTTPRequest
+from metrics import MetricsExporter, MetricsRegistry, REQUESTS, STAGE_SECONDS, start_exporter
+
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'<html><body>page</body></html>'
+        self.send_response(404 if self.path == '/missing' else 200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_render_prometheus_text(self):
+        pages = self.registry.counter('pages_total', 'Pages by result', ['result'])
+        pages.labels(result='lyrics').inc()
+        pages.labels(result='lyrics').inc(2)
+        pages.labels(result='say "hi"').inc()
+        self.registry.gauge('in_flight', 'In flight').set(3)
+
+        text = self.registry.render()
+        self.assertIn('# HELP pages_total Pages by result\n# TYPE pages_total counter\n', text)
+        self.assertIn('pages_total{result="lyrics"} 3\n', text)
+        self.assertIn('pages_total{result="say \\"hi\\""} 1\n', text)
+        self.assertIn('# TYPE in_flight gauge\nin_flight 3\n', text)
+
+    def test_histogram_buckets_and_quantiles(self):
+        stages = self.registry.histogram('stage_seconds', 'Stage time', ['stage'], buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 2.0):
+            stages.labels(stage='network').observe(value)
+
+        text = self.registry.render()
+        self.assertIn('stage_seconds_bucket{stage="network",le="0.1"} 2\n', text)
+        self.assertIn('stage_seconds_bucket{stage="network",le="1"} 3\n', text)
+        self.assertIn('stage_seconds_bucket{stage="network",le="+Inf"} 4\n', text)
+        self.assertIn('stage_seconds_count{stage="network"} 4\n', text)
+        self.assertIn('stage_seconds_sum{stage="network"} 2.65\n', text)
+
+        child = stages.labels(stage='network')
+        self.assertAlmostEqual(child.quantile(0.5), 0.1)
+        self.assertAlmostEqual(child.quantile(0.625), 0.55)
+        self.assertEqual(child.quantile(0.99), 1.0)
+
+    def test_same_metric_registered_twice(self):
+        counter = self.registry.counter('requests_total', 'Requests')
+        self.assertIs(self.registry.counter('requests_total', 'Requests'), counter)
+        with self.assertRaises(ValueError):
+            self.registry.gauge('requests_total', 'Requests')
+
+    def test_gauge_track_and_histogram_time(self):
+        gauge = self.registry.gauge('busy', 'Busy')
+        stages = self.registry.histogram('stage_seconds', 'Stage time', ['stage'])
+        with gauge.track():
+            self.assertEqual(gauge.labels().value, 1)
+            with stages.time(stage='parse'):
+                pass
+        self.assertEqual(gauge.labels().value, 0)
+        self.assertEqual(stages.labels(stage='parse').count, 1)
+
+class TestMetricsExporter(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.registry = MetricsRegistry()
+        self.registry.counter('pages_total', 'Pages').inc(5)
+        self.registry.histogram('stage_seconds', 'Stage time', ['stage']).labels(stage='parse').observe(0.02)
+
+    def tearDown(self):
+        for file in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, file))
+        os.rmdir(self.temp_dir)
+
+    def test_not_started_without_config(self):
+        self.assertIsNone(start_exporter({}))
+
+    def test_serves_metrics_and_writes_snapshot(self):
+        snapshot_file = os.path.join(self.temp_dir, 'metrics.json')
+        exporter = MetricsExporter({'metrics_port': 0, 'metrics_snapshot_file': snapshot_file,
+                                    'metrics_snapshot_interval': 0.05}, self.registry).start()
+        try:
+            url = f"http://127.0.0.1:{exporter.server.server_address[1]}"
+            response = requests.get(f"{url}/metrics", timeout=5)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+            self.assertIn('pages_total 5\n', response.text)
+            self.assertEqual(requests.get(f"{url}/other", timeout=5).status_code, 404)
+        finally:
+            exporter.close()
+
+        with open(snapshot_file) as f:
+            snapshot = json.load(f)['metrics']
+        self.assertEqual(snapshot['pages_total']['values'], [{'labels': {}, 'value': 5}])
+        parse = snapshot['stage_seconds']['values'][0]
+        self.assertEqual(parse['labels'], {'stage': 'parse'})
+        self.assertEqual(parse['count'], 1)
+        self.assertEqual(parse['mean'], 0.02)
+        self.assertFalse(os.path.exists(f"{snapshot_file}.tmp"))
+
+class TestRequestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, kwargs={'poll_interval': 0.05},
+                         daemon=True).start()
+        self.port = self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fetch_records_network_time_and_outcome(self):
+        network = STAGE_SECONDS.labels(stage='network')
+        ok = REQUESTS.labels(outcome='ok')
+        errors = REQUESTS.labels(outcome='error')
+        before = network.count, ok.value, errors.value
+
+        request = HTTPRequest({'http_cache': False})
+        self.assertIsNotNone(request.get(f"http://127.0.0.1:{self.port}/"))
+        self.assertEqual((network.count, ok.value, errors.value), (before[0] + 1, before[1] + 1, before[2]))
+
+        self.assertIsNone(request.get(f"http://127.0.0.1:{self.port}/missing"))
+        self.assertEqual(errors.value, before[2] + 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+from html_parser import HTMLParser
+from parser_backends import get_backend, available_backends, BeautifulSoupBackend
+from parser_fixtures import FIXTURES, SELECTORS
+
+class TestParserBackends(unittest.TestCase):
+    def test_unknown_backend_falls_back(self):
+        self.assertIsInstance(get_backend('no-such-backend'), BeautifulSoupBackend)
+
+    def test_auto_picks_an_available_backend(self):
+        self.assertEqual(get_backend('auto').name, available_backends()[0])
+
+    def test_backends_match_html_parser(self):
+        reference = HTMLParser({'SELECTORS': SELECTORS, 'parser_backend': 'html.parser'})
+        expected = [reference.extract(html, url) for html, url in FIXTURES]
+        self.assertEqual(expected[0][2],
+                         "[Verse 1]\nFirst line & more\nSecond line\nThird line\n[Chorus]\nFourth\nline")
+
+        for name in available_backends():
+            with self.subTest(backend=name):
+                parser = HTMLParser({'SELECTORS': SELECTORS, 'parser_backend': name})
+                self.assertEqual(parser.backend.name, name)
+                self.assertEqual([parser.extract(html, url) for html, url in FIXTURES], expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,7 +2,8 @@ import unittest
 import json
 import os
 from unittest.mock import MagicMock, patch
-from persistence import Persistence
+from persistence import Persistence, JSONLStore
+from record_index import RecordIndex
 
 class TestPersistence(unittest.TestCase):
     def setUp(self):
@@ -51,5 +52,131 @@ class TestPersistence(unittest.TestCase):
             result = self.persistence.save_data(test_data, self.output_file)
             self.assertFalse(result)
 
+class TestJSONLStore(unittest.TestCase):
+    def setUp(self):
+        self.config = {"temp_dir": "test_temp"}
+        self.persistence = Persistence(self.config)
+        self.output_file = "test_output.jsonl"
+
+    def tearDown(self):
+        if os.path.exists(self.output_file):
+            os.remove(self.output_file)
+        if os.path.exists(self.persistence.temp_dir):
+            for file in os.listdir(self.persistence.temp_dir):
+                os.remove(os.path.join(self.persistence.temp_dir, file))
+            os.rmdir(self.persistence.temp_dir)
+
+    def test_append_and_stream_read(self):
+        with self.persistence.open_store(self.output_file) as store:
+            offset, length = store.append({"url": "http://example.com/1", "completion": "a"})
+            store.append({"url": "http://example.com/2", "completion": "b"})
+            self.assertEqual(offset, 0)
+            self.assertEqual(store.read_at(offset, length)["completion"], "a")
+
+        loaded_data = self.persistence.load_existing_data(self.output_file)
+        self.assertEqual([item["url"] for item in loaded_data],
+                         ["http://example.com/1", "http://example.com/2"])
+
+    def test_append_does_not_rewrite_file(self):
+        store = self.persistence.open_store(self.output_file)
+        store.append({"url": "http://example.com/1"})
+        size = store.size()
+        store.append({"url": "http://example.com/2"})
+        store.sync()
+        with open(self.output_file, 'rb') as f:
+            self.assertEqual(json.loads(f.read(size))["url"], "http://example.com/1")
+        store.close()
+
+    def test_group_commit(self):
+        store = JSONLStore(self.output_file, fsync_every=3, fsync_interval=3600)
+        with patch("persistence.os.fsync") as mock_fsync:
+            for i in range(7):
+                store.append({"url": f"http://example.com/{i}"})
+            self.assertEqual(mock_fsync.call_count, 2)
+            store.close()
+            self.assertEqual(mock_fsync.call_count, 3)
+
+    def test_compact_keeps_latest_record_per_url(self):
+        store = JSONLStore(self.output_file, compact_min_bytes=10 ** 9,
+                           temp_dir=self.persistence.temp_dir)
+        store.append({"url": "http://example.com/1", "completion": "old"})
+        store.append({"url": "http://example.com/2", "completion": "other"})
+        store.append({"url": "http://example.com/1", "completion": "new"})
+        self.assertTrue(store.compact())
+        store.append({"url": "http://example.com/3", "completion": "after"})
+        store.close()
+
+        records = list(store.iter_records())
+        self.assertEqual([(r["url"], r["completion"]) for r in records], [
+            ("http://example.com/2", "other"),
+            ("http://example.com/1", "new"),
+            ("http://example.com/3", "after"),
+        ])
+
+    def test_automatic_compaction(self):
+        store = JSONLStore(self.output_file, compact_ratio=2.0, compact_min_bytes=200,
+                           temp_dir=self.persistence.temp_dir)
+        for i in range(50):
+            store.append({"url": "http://example.com/same", "completion": str(i)})
+        store.close()
+        records = list(store.iter_records())
+        self.assertLess(len(records), 50)
+        self.assertEqual(records[-1]["completion"], "49")
+
+    def test_corrupt_trailing_line_is_skipped(self):
+        with open(self.output_file, 'w') as f:
+            f.write('{"url": "http://example.com/1"}\n{"url": "http://exa')
+        loaded_data = self.persistence.load_existing_data(self.output_file)
+        self.assertEqual(loaded_data, [{"url": "http://example.com/1"}])
+
+    def test_append_after_torn_last_line(self):
+        with open(self.output_file, 'w') as f:
+            f.write('{"url": "a"}\n{"url": "b", "x"')
+        store = JSONLStore(self.output_file, compact_min_bytes=10 ** 9, temp_dir=self.persistence.temp_dir)
+        offset, _ = store.append({"url": "c"})
+        store.close()
+        self.assertEqual(offset, len('{"url": "a"}\n'))
+        self.assertEqual([r["url"] for r in store.iter_records()], ["a", "c"])
+        self.assertTrue(store.compact())
+        self.assertEqual([r["url"] for r in store.iter_records()], ["a", "c"])
+
+    def test_import_legacy_json(self):
+        legacy_file = "test_output.json"
+        with open(legacy_file, 'w') as f:
+            json.dump([{"url": "http://example.com/1"}], f)
+        try:
+            store = self.persistence.open_store(self.output_file)
+            self.assertEqual(self.persistence.import_legacy_json(legacy_file, store), 1)
+            self.assertEqual(self.persistence.import_legacy_json(legacy_file, store), 0)
+            store.close()
+        finally:
+            os.remove(legacy_file)
+
+    def test_import_legacy_json_into_indexed_store(self):
+        legacy_file = "test_output.json"
+        store = JSONLStore(self.output_file, compact_min_bytes=10 ** 9, temp_dir=self.persistence.temp_dir)
+        index = RecordIndex(store)
+        try:
+            index.append({"url": "a", "completion": "store", "last_crawled": "2024-01-02T00:00:00"})
+            with open(legacy_file, 'w') as f:
+                json.dump([{"url": "a", "completion": "old", "last_crawled": "2024-01-01T00:00:00"},
+                           {"url": "b", "completion": "legacy", "last_crawled": "2024-01-01T00:00:00"}], f)
+            self.assertEqual(self.persistence.import_legacy_json(legacy_file, store, index), 1)
+            self.assertEqual(self.persistence.import_legacy_json(legacy_file, store, index), 0)
+            self.assertEqual(index.get("a")["completion"], "store")
+            self.assertEqual(index.get("b")["completion"], "legacy")
+
+            # Records written to the legacy file later are merged on the next import
+            with open(legacy_file, 'w') as f:
+                json.dump([{"url": "a", "completion": "new", "last_crawled": "2024-01-03T00:00:00"}], f)
+            os.utime(legacy_file, ns=(0, 10 ** 18))
+            self.assertEqual(self.persistence.import_legacy_json(legacy_file, store, index), 1)
+            self.assertEqual(index.get("a")["completion"], "new")
+        finally:
+            index.close()
+            store.close()
+            os.remove(legacy_file)
+            os.remove(self.output_file + '.idx')
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,135 @@
+import unittest
+import asyncio
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from unittest.mock import MagicMock
+from async_fetcher import AsyncFetcher
+from fetch_strategy import FetchStrategy
+from html_parser import HTMLParser
+from http_request import FetchResult
+from metrics import PAGES, STAGE_SECONDS
+from pipeline import CrawlPipeline
+from parser_fixtures import FIXTURES, SELECTORS
+
+SHELL_PAGE = '<html><head><title>Shell</title></head><body><div id="app"></div></body></html>'
+
+def has_lyrics(fields):
+    return bool(fields and fields[2])
+
+class PageRequest:
+    """Stand-in for HTTPRequest serving fixed pages."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.lock = threading.Lock()
+        self.fetched = 0
+
+    def fetch(self, url, render_js=False):
+        with self.lock:
+            self.fetched += 1
+        return FetchResult(self.pages.get(url), False)
+
+class FakeRenderer:
+    def __init__(self, html):
+        self.html = html
+
+    def render(self, url):
+        return self.html
+
+class TestCrawlPipeline(unittest.TestCase):
+    def setUp(self):
+        self.config = {'SELECTORS': SELECTORS, 'max_concurrency': 4}
+        self.pages = {url: html for html, url in FIXTURES}
+        self.persisted = {}
+
+    def persist(self, url, result):
+        self.persisted[url] = result
+
+    def _run(self, pipeline, urls):
+        asyncio.run(pipeline.run(urls))
+        pipeline.close()
+        pipeline.fetcher.close()
+
+    def test_worker_processes_match_in_process_parsing(self):
+        fetcher = AsyncFetcher(PageRequest(self.pages), self.config)
+        pipeline = CrawlPipeline(fetcher, {**self.config, 'parse_workers': 2}, self.persist)
+        pages = [PAGES.labels(result=result) for result in ('lyrics', 'no_lyrics', 'error')]
+        clean = STAGE_SECONDS.labels(stage='clean')
+        before = sum(page.value for page in pages), clean.count
+        self._run(pipeline, list(self.pages))
+        # Page metrics from the workers are recorded in this process
+        self.assertEqual(sum(page.value for page in pages), before[0] + len(self.pages))
+        self.assertEqual(clean.count, before[1] + len(self.pages))
+        parser = HTMLParser(self.config)
+        self.assertEqual(set(self.persisted), set(self.pages))
+        for url, html in self.pages.items():
+            self.assertEqual(self.persisted[url].extracted, parser.extract(html, url))
+        self.assertEqual(pipeline.stats['parsed'], len(self.pages))
+        self.assertIn('default:lyrics', pipeline.selector_stats())
+
+    def test_selector_stats_cover_every_page(self):
+        fetcher = AsyncFetcher(PageRequest(self.pages), self.config)
+        pipeline = CrawlPipeline(fetcher, {**self.config, 'parse_workers': 1}, self.persist)
+        self._run(pipeline, list(self.pages))
+        runs = sum(stats['runs'] for name, stats in pipeline.selector_stats().items() if name.endswith(':lyrics'))
+        self.assertEqual(runs, len(self.pages))
+
+    def test_broken_worker_pool_is_shut_down_and_replaced(self):
+        pipeline = CrawlPipeline(None, {**self.config, 'parse_workers': 1}, self.persist)
+        broken = MagicMock()
+        broken.submit.side_effect = BrokenProcessPool('worker died')
+        pipeline._pool = broken
+        html, url = FIXTURES[0]
+        self.assertIsNone(asyncio.run(pipeline._parse(html, url)))
+        broken.shutdown.assert_called_once_with(wait=False)
+        self.assertEqual(pipeline.stats['parse_errors'], 1)
+        try:
+            self.assertEqual(asyncio.run(pipeline._parse(html, url)), HTMLParser(self.config).extract(html, url))
+        finally:
+            pipeline.close()
+
+    def test_backpressure_bounds_pages_in_memory(self):
+        html, _ = FIXTURES[0]
+        urls = [f"http://site{i % 8}.com/song{i}" for i in range(60)]
+        http_request = PageRequest({url: html for url in urls})
+        fetcher = AsyncFetcher(http_request, {'max_concurrency': 4, 'per_domain_concurrency': 2})
+        config = {**self.config, 'parse_workers': 0, 'pipeline_queue_size': 2}
+        peak = []
+
+        def slow_persist(url, result):
+            peak.append(http_request.fetched - len(peak))
+            threading.Event().wait(0.002)
+
+        pipeline = CrawlPipeline(fetcher, config, slow_persist, html_parser=HTMLParser(self.config))
+        self._run(pipeline, urls)
+        self.assertEqual(len(peak), len(urls))
+        # Fetcher slots + both queues + the page being parsed and persisted
+        self.assertLessEqual(max(peak), 4 + 2 * 2 + 2)
+
+    def test_escalates_pages_missing_lyrics(self):
+        html, url = FIXTURES[0]
+        http_request = PageRequest({url: SHELL_PAGE, "http://static.com/song": html})
+        strategy = FetchStrategy(http_request, renderer=FakeRenderer(html),
+                                 config={'js_escalation_threshold': 1})
+        fetcher = AsyncFetcher(strategy, self.config)
+        pipeline = CrawlPipeline(fetcher, {**self.config, 'parse_workers': 0}, self.persist,
+                                 has_content=has_lyrics, strategy=strategy,
+                                 html_parser=HTMLParser(self.config))
+        self._run(pipeline, [url, "http://static.com/song"])
+        self.assertTrue(self.persisted[url].rendered)
+        self.assertTrue(has_lyrics(self.persisted[url].extracted))
+        self.assertFalse(self.persisted["http://static.com/song"].rendered)
+        self.assertTrue(strategy.needs_js(url.split('/')[2]))
+        self.assertEqual(pipeline.stats['escalated'], 1)
+
+    def test_failed_fetch_is_not_parsed(self):
+        http_request = PageRequest({})
+        fetcher = AsyncFetcher(http_request, self.config)
+        pipeline = CrawlPipeline(fetcher, {**self.config, 'parse_workers': 0}, self.persist,
+                                 html_parser=HTMLParser(self.config))
+        self._run(pipeline, ["http://missing.com/song"])
+        self.assertIsNone(self.persisted["http://missing.com/song"].html)
+        self.assertEqual(pipeline.stats['parsed'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from http_request import HTTPRequest
+from proxy_pool import ProxyPool
+
+def make_stub_proxy(delay=0.0, status=200):
+    """Local HTTP server answering every request, acting as a forward proxy."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = f"via proxy for {self.path}".encode()
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class TestProxyPool(unittest.TestCase):
+    def setUp(self):
+        self.servers = []
+        self.fast = self._stub(0.0)
+        self.slow = self._stub(0.15)
+        self.dead = f"http://127.0.0.1:{unused_port()}"
+        self.config = {'proxy_probe_url': 'http://probe.invalid/ip', 'proxy_probe_timeout': 2,
+                       'proxy_cooldown': 60}
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+
+    def _stub(self, delay, status=200):
+        server, url = make_stub_proxy(delay, status)
+        self.servers.append(server)
+        return url
+
+    def test_probe_all_is_concurrent_and_scores_by_latency(self):
+        slow = [self._stub(0.2) for _ in range(4)]
+        pool = ProxyPool([self.fast, self.dead] + slow, self.config)
+        start = time.monotonic()
+        self.assertEqual(pool.probe_all(), 5)
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertEqual(pool.best(), self.fast)
+        self.assertNotIn(self.dead, pool.available())
+
+    def test_choose_prefers_fast_proxies(self):
+        pool = ProxyPool([self.fast, self.slow], self.config)
+        pool.record_success(self.fast, 0.01)
+        pool.record_success(self.slow, 1.0)
+        picks = [pool.choose() for _ in range(500)]
+        self.assertGreater(picks.count(self.fast), 450)
+        self.assertGreater(picks.count(self.slow), 0)
+
+    def test_failed_proxy_recovers_after_cooldown(self):
+        clock = FakeClock()
+        pool = ProxyPool([self.fast, self.slow], self.config, clock=clock)
+        pool.record_failure(self.fast)
+        self.assertEqual(pool.available(), [self.slow])
+        clock.now += 61
+        self.assertEqual(set(pool.available()), {self.fast, self.slow})
+        # Consecutive failures back off exponentially
+        pool.record_failure(self.fast)
+        clock.now += 61
+        self.assertNotIn(self.fast, pool.available())
+        clock.now += 60
+        self.assertIn(self.fast, pool.available())
+
+    def test_all_cooling_down_returns_none(self):
+        clock = FakeClock()
+        pool = ProxyPool([self.fast, self.slow], self.config, clock=clock)
+        pool.record_failure(self.slow)
+        clock.now += 10
+        pool.record_failure(self.fast)
+        self.assertIsNone(pool.choose())
+        clock.now += 51
+        self.assertEqual(pool.choose(), self.slow)
+
+    @patch('http_request.get_random_user_agent', return_value='test-agent')
+    def test_http_request_retries_through_another_proxy(self, _):
+        pool = ProxyPool([self.dead, self.fast], self.config)
+        pool.record_success(self.dead, 0.001)
+        pool.record_success(self.fast, 1.0)
+        http_request = HTTPRequest({}, proxy_pool=pool)
+        with patch.object(pool, 'choose', side_effect=[self.dead, self.fast]):
+            html = http_request.get("http://lyrics.invalid/song")
+        self.assertEqual(html, "via proxy for http://lyrics.invalid/song")
+        self.assertNotIn(self.dead, pool.available())
+        self.assertEqual(pool.proxies[self.fast].successes, 2)
+
+    def test_http_request_counts_error_statuses_against_the_proxy(self):
+        blocked = self._stub(0.0, status=503)
+        pool = ProxyPool([blocked, self.fast], self.config)
+        http_request = HTTPRequest({}, proxy_pool=pool)
+        with patch.object(pool, 'choose', side_effect=[blocked, self.fast]):
+            html = http_request.get("http://lyrics.invalid/song")
+        self.assertEqual(html, "via proxy for http://lyrics.invalid/song")
+        self.assertEqual((pool.proxies[blocked].successes, pool.proxies[blocked].failures), (0, 1))
+        self.assertNotIn(blocked, pool.available())
+
+    def test_http_request_keeps_proxies_that_fail_the_probe(self):
+        http_request = HTTPRequest({**self.config, 'proxies': [self.dead], 'proxy_cooldown': 0.1})
+        pool = http_request.proxy_pool
+        self.assertIsNotNone(pool)
+        self.assertIsNone(pool.choose())
+        # Still tried once its cooldown is over instead of never again
+        time.sleep(0.15)
+        self.assertEqual(pool.choose(), self.dead)
+
+    def test_http_request_probes_proxies_on_first_use(self):
+        with patch.object(ProxyPool, 'probe_all', return_value=1) as probe_all:
+            http_request = HTTPRequest({**self.config, 'proxies': [self.fast]})
+            probe_all.assert_not_called()
+            self.assertEqual(http_request.current_proxy, {'http': self.fast, 'https': self.fast})
+            self.assertIsNotNone(http_request.proxy_pool)
+        probe_all.assert_called_once_with()
+        self.assertIsNone(HTTPRequest({}).proxy_pool)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+import asyncio
+from rate_limiter import TokenBucket, DomainRateLimiter, RateLimitedQueue
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+class TestTokenBucket(unittest.TestCase):
+    def test_burst_then_refill(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=0.5, burst=2, clock=clock)
+        self.assertTrue(bucket.try_acquire())
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+        self.assertAlmostEqual(bucket.delay(), 2.0)
+        clock.advance(2.0)
+        self.assertTrue(bucket.try_acquire())
+
+    def test_tokens_capped_at_burst(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1.0, burst=1, clock=clock)
+        clock.advance(100)
+        self.assertTrue(bucket.try_acquire())
+        self.assertFalse(bucket.try_acquire())
+
+class TestDomainRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.config = {
+            'rate_limit': 4.0,
+            'RATE_LIMITS': {
+                'genius.com': {'delay': 10.0, 'burst': 1}
+            }
+        }
+        self.limiter = DomainRateLimiter(self.config, clock=self.clock)
+
+    def test_per_domain_limits(self):
+        self.assertTrue(self.limiter.try_acquire('genius.com'))
+        self.assertFalse(self.limiter.try_acquire('genius.com'))
+        self.assertAlmostEqual(self.limiter.delay('genius.com'), 10.0)
+        # Other hosts are unaffected and fall back to the default delay
+        self.assertTrue(self.limiter.try_acquire('example.com'))
+        self.assertAlmostEqual(self.limiter.delay('example.com'), 4.0)
+
+    def test_async_wait(self):
+        limiter = DomainRateLimiter({'rate_limit': 0.01})
+
+        async def run():
+            await limiter.wait('example.com')
+            await limiter.wait('example.com')
+
+        asyncio.run(run())
+        self.assertFalse(limiter.try_acquire('example.com'))
+
+class TestRateLimitedQueue(unittest.TestCase):
+    def test_slow_domain_does_not_block_others(self):
+        clock = FakeClock()
+        limiter = DomainRateLimiter({
+            'RATE_LIMITS': {
+                'slow.com': {'delay': 10.0},
+                'default': {'delay': 1.0}
+            }
+        }, clock=clock)
+        queue = RateLimitedQueue(limiter, [
+            'http://slow.com/1', 'http://slow.com/2',
+            'http://fast.com/1', 'http://fast.com/2'
+        ])
+
+        handed_out = []
+        for _ in range(5):
+            url, wait = queue.next_ready()
+            while url is None and wait is not None:
+                clock.advance(wait)
+                url, wait = queue.next_ready()
+            if url is None:
+                break
+            handed_out.append((url, clock.now - 1000.0))
+
+        self.assertEqual(len(handed_out), 4)
+        times = dict(handed_out)
+        self.assertEqual(times['http://fast.com/2'], 1.0)
+        self.assertEqual(times['http://slow.com/2'], 10.0)
+        self.assertEqual(queue.next_ready(), (None, None))
+
+if __name__ == '__main__':
+    unittest.main()
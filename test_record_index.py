@@ -0,0 +1,67 @@
+import unittest
+import os
+import tempfile
+from datetime import datetime, timedelta
+from persistence import JSONLStore
+from record_index import RecordIndex
+
+class TestRecordIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.temp_dir, 'lyrics.jsonl')
+        self.store = JSONLStore(self.store_path, compact_min_bytes=10 ** 9, temp_dir=self.temp_dir)
+        self.index = RecordIndex(self.store)
+        self.now = datetime(2024, 1, 2, 12, 0, 0)
+
+    def tearDown(self):
+        self.index.close()
+        self.store.close()
+        for file in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, file))
+        os.rmdir(self.temp_dir)
+
+    def _record(self, url, hours_ago, completion="lyrics"):
+        return {
+            'url': url,
+            'completion': completion,
+            'last_crawled': (self.now - timedelta(hours=hours_ago)).isoformat()
+        }
+
+    def test_append_and_lookup(self):
+        self.index.append(self._record("http://example.com/1", 1, "first"))
+        self.index.append(self._record("http://example.com/1", 0, "second"))
+        self.assertIn("http://example.com/1", self.index)
+        self.assertEqual(len(self.index), 1)
+        self.assertEqual(self.index.get("http://example.com/1")['completion'], "second")
+        self.assertEqual(self.index.last_crawled("http://example.com/1"), self.now.isoformat())
+        self.assertIsNone(self.index.get("http://example.com/missing"))
+
+    def test_stale_urls(self):
+        self.index.append(self._record("http://example.com/fresh", 1))
+        self.index.append(self._record("http://example.com/old", 48))
+        self.index.append({'url': "http://example.com/bad", 'last_crawled': "not a date"})
+        urls = ["http://example.com/fresh", "http://example.com/old",
+                "http://example.com/bad", "http://example.com/new"]
+        self.assertEqual(self.index.stale_urls(urls, now=self.now), [
+            "http://example.com/old", "http://example.com/bad", "http://example.com/new"
+        ])
+
+    def test_catch_up_on_reopen(self):
+        self.index.append(self._record("http://example.com/1", 1))
+        self.index.close()
+        # Records written without the index are picked up when it reopens
+        self.store.append(self._record("http://example.com/2", 1))
+        self.index = RecordIndex(self.store)
+        self.assertEqual(len(self.index), 2)
+        self.assertEqual(self.index.get("http://example.com/2")['url'], "http://example.com/2")
+
+    def test_rebuilt_after_compaction(self):
+        self.index.append(self._record("http://example.com/1", 2, "old"))
+        self.index.append(self._record("http://example.com/2", 2))
+        self.index.append(self._record("http://example.com/1", 1, "new"))
+        self.store.compact()
+        self.assertEqual(self.index.get("http://example.com/1")['completion'], "new")
+        self.assertEqual(self.index.get("http://example.com/2")['url'], "http://example.com/2")
+
+if __name__ == '__main__':
+    unittest.main()
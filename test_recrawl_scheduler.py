@@ -0,0 +1,112 @@
+import unittest
+import os
+import random
+import shutil
+import tempfile
+from datetime import datetime
+from recrawl_scheduler import DAY, HOUR, RecrawlScheduler, content_hash, estimate_change_rate, open_scheduler
+
+class TestRecrawlScheduler(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, 'frontier.db')
+        self.now = 1_700_000_000.0
+        self.scheduler = RecrawlScheduler({'recrawl_jitter': 0}, self.db_path, clock=lambda: self.now)
+
+    def tearDown(self):
+        self.scheduler.close()
+        shutil.rmtree(self.temp_dir)
+
+    def _record(self, completion):
+        return {'title': 'Song', 'artist': 'Artist', 'completion': completion,
+                'last_crawled': datetime.fromtimestamp(self.now).isoformat()}
+
+    def _visit(self, url, completion=None):
+        next_visit = self.scheduler.record_visit(url, self._record(completion) if completion else None)
+        interval = next_visit - self.now
+        self.now = next_visit
+        return interval
+
+    def test_content_hash_ignores_crawl_time(self):
+        first = self._record('la la')
+        self.now += 100
+        self.assertEqual(content_hash(first), content_hash(self._record('la la')))
+        self.assertNotEqual(content_hash(first), content_hash(self._record('la la la')))
+
+    def test_estimate_change_rate(self):
+        self.assertIsNone(estimate_change_rate(0, 0, 0))
+        self.assertEqual(estimate_change_rate(10, 0, 10 * DAY), 0)
+        # Changes seen at every visit suggest more than one change per interval
+        self.assertGreater(estimate_change_rate(10, 10, 10 * DAY), 1 / DAY)
+        self.assertLess(estimate_change_rate(10, 2, 10 * DAY), 0.5 / DAY)
+
+    def test_unchanged_pages_back_off(self):
+        intervals = [self._visit('http://a.com/1', 'same') for _ in range(4)]
+        intervals += [self._visit('http://a.com/1') for _ in range(6)]  # 304 Not Modified
+        self.assertEqual([round(i / HOUR) for i in intervals], [24, 48, 96, 192, 384, 720, 720, 720, 720, 720])
+
+    def test_changing_pages_are_visited_more_often(self):
+        intervals = [self._visit('http://a.com/1', f"version {i}") for i in range(8)]
+        self.assertEqual(intervals[0], DAY)
+        self.assertTrue(all(later <= earlier for earlier, later in zip(intervals, intervals[1:])))
+        self.assertEqual(intervals[-1], 6 * HOUR)
+
+        # After it stops changing, the page is backed off again, cautiously at first
+        settled = [self._visit('http://a.com/1', 'final') for _ in range(12)]
+        self.assertTrue(all(later >= earlier for earlier, later in zip(settled, settled[1:])))
+        self.assertGreater(settled[-1], 5 * DAY)
+
+    def test_jitter_spreads_revisits(self):
+        self.scheduler.close()
+        self.scheduler = RecrawlScheduler({}, self.db_path, rng=random.Random(1), clock=lambda: self.now)
+        visits = [self.scheduler.record_visit(f"http://a.com/{i}", self._record('x')) - self.now
+                  for i in range(200)]
+        self.assertTrue(all(0.8 * DAY <= visit <= 1.2 * DAY for visit in visits))
+        hours = {int(visit // HOUR) for visit in visits}
+        self.assertGreaterEqual(len(hours), 9)
+
+    def test_due_urls(self):
+        self.scheduler.record_visit('http://a.com/known', self._record('x'))
+        last_crawled = {'http://a.com/fresh': datetime.fromtimestamp(self.now - HOUR).isoformat(),
+                        'http://a.com/old': datetime.fromtimestamp(self.now - 2 * DAY).isoformat(),
+                        'http://a.com/bad': 'not a date'}
+        urls = ['http://a.com/known', 'http://a.com/fresh', 'http://a.com/old', 'http://a.com/bad',
+                'http://a.com/new']
+        self.assertEqual(self.scheduler.due_urls(urls, last_crawled),
+                         ['http://a.com/old', 'http://a.com/bad', 'http://a.com/new'])
+        self.assertEqual(self.scheduler.due_urls(urls[:2], last_crawled, now=self.now + DAY + 1), urls[:2])
+        self.assertEqual(self.scheduler.next_visit_time(), self.now + DAY)
+        self.assertEqual(self.scheduler.stats(), {'urls': 1, 'changing': 0, 'mean_interval_hours': 24.0})
+
+    def test_failed_visits_back_off(self):
+        url = 'http://a.com/gone'
+        last_crawled = {url: datetime.fromtimestamp(self.now - 2 * DAY).isoformat()}
+        self.assertEqual(self.scheduler.next_visit_time([url], last_crawled), self.now - DAY)
+        self.assertEqual(self.scheduler.record_failure(url), self.now + 6 * HOUR)
+        self.assertEqual(self.scheduler.record_failure(url), self.now + 12 * HOUR)
+        self.assertEqual(self.scheduler.due_urls([url], last_crawled), [])
+        self.assertEqual(self.scheduler.next_visit_time([url], last_crawled), self.now + 12 * HOUR)
+        self.assertEqual(self.scheduler.next_visit_time(), self.now + 12 * HOUR)
+        # A successful visit ends the streak
+        self.scheduler.record_visit(url, self._record('x'))
+        self.assertEqual(self.scheduler.next_visit(url), self.now + DAY)
+        self.assertEqual(self.scheduler.record_failure(url), self.now + 6 * HOUR)
+
+    def test_fewer_requests_than_daily_recrawls(self):
+        # 100 pages over 90 days: 10 change every day, the rest never do
+        visits = {f"http://a.com/{i}": self.now for i in range(100)}
+        start, requests = self.now, 0
+        for day in range(1, 91):
+            self.now = start + day * DAY
+            for url, due in visits.items():
+                if due <= self.now:
+                    changing = int(url.rsplit('/', 1)[1]) < 10
+                    visits[url] = self.scheduler.record_visit(url, self._record(f"{day}" if changing else 'x'))
+                    requests += 1
+        self.assertLess(requests, 0.3 * 100 * 90)
+
+    def test_disabled(self):
+        self.assertIsNone(open_scheduler({'recrawl_schedule': False}))
+
+if __name__ == '__main__':
+    unittest.main()
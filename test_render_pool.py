@@ -0,0 +1,94 @@
+import unittest
+import os
+import threading
+import time
+from render_pool import RenderPool
+from js_renderer import process_tree_rss_mb
+
+class FakeRenderer:
+    instances = []
+
+    def __init__(self, delay=0.05, memory=100):
+        self.delay = delay
+        self.memory = memory
+        self.available = True
+        self.closed = False
+        self.urls = []
+        self.thread = None
+        FakeRenderer.instances.append(self)
+
+    def render(self, url, timeout=None):
+        self.thread = threading.current_thread().name
+        self.urls.append(url)
+        time.sleep(self.delay)
+        return f"<html>{url}</html>"
+
+    def memory_mb(self):
+        return self.memory
+
+    def close(self):
+        self.closed = True
+
+class TestRenderPool(unittest.TestCase):
+    def setUp(self):
+        FakeRenderer.instances = []
+
+    def test_renders_in_parallel(self):
+        pool = RenderPool({'render_workers': 3}, renderer_factory=FakeRenderer)
+        start = time.monotonic()
+        futures = [pool.submit(f"http://js.com/{i}") for i in range(6)]
+        results = [future.result() for future in futures]
+        elapsed = time.monotonic() - start
+        pool.close()
+        self.assertEqual(results, [f"<html>http://js.com/{i}</html>" for i in range(6)])
+        self.assertLess(elapsed, 0.25)
+        self.assertEqual(len(FakeRenderer.instances), 3)
+        self.assertTrue(all(renderer.closed for renderer in FakeRenderer.instances))
+
+    def test_workers_start_lazily(self):
+        pool = RenderPool({'render_workers': 2}, renderer_factory=FakeRenderer)
+        self.assertEqual(pool._workers, [])
+        pool.close()
+        self.assertEqual(FakeRenderer.instances, [])
+
+    def test_recycles_after_max_pages(self):
+        pool = RenderPool({'render_workers': 1, 'render_max_pages': 2},
+                          renderer_factory=lambda: FakeRenderer(delay=0))
+        for i in range(5):
+            pool.render(f"http://js.com/{i}")
+        pool.close()
+        self.assertEqual([len(renderer.urls) for renderer in FakeRenderer.instances], [2, 2, 1])
+        self.assertEqual(pool.stats['recycled'], 2)
+
+    def test_recycles_above_memory_threshold(self):
+        pool = RenderPool({'render_workers': 1, 'render_max_memory_mb': 500},
+                          renderer_factory=lambda: FakeRenderer(delay=0, memory=800))
+        pool.render("http://js.com/1")
+        pool.render("http://js.com/2")
+        pool.close()
+        self.assertEqual(len(FakeRenderer.instances), 2)
+
+    def test_expired_jobs_are_dropped(self):
+        pool = RenderPool({'render_workers': 1}, renderer_factory=lambda: FakeRenderer(delay=0.2))
+        first = pool.submit("http://js.com/slow")
+        late = pool.submit("http://js.com/late", deadline=0.05)
+        self.assertIsNone(late.result())
+        self.assertIsNotNone(first.result())
+        pool.close()
+        self.assertEqual(pool.stats['expired'], 1)
+        self.assertEqual(FakeRenderer.instances[0].urls, ["http://js.com/slow"])
+
+    def test_close_fails_queued_jobs(self):
+        pool = RenderPool({'render_workers': 1}, renderer_factory=lambda: FakeRenderer(delay=0.1))
+        futures = [pool.submit(f"http://js.com/{i}") for i in range(5)]
+        time.sleep(0.05)
+        pool.close()
+        self.assertEqual(sum(future.result() is None for future in futures), 4)
+        self.assertIsNone(pool.render("http://js.com/after"))
+
+    @unittest.skipUnless(os.path.exists('/proc/self/status'), "needs /proc")
+    def test_process_tree_rss(self):
+        self.assertGreater(process_tree_rss_mb(os.getpid()), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import json
+import os
+import tempfile
+from html_parser import HTMLParser
+from parser_backends import get_backend
+from selector_plan import SelectorPlan, merge_plan_stats
+
+GENIUS_HTML = """
+<html><head><meta property="og:title" content="OG Title"></head>
+<body><div class="Lyrics__Container-abc">Lyric line</div></body></html>
+"""
+
+class TestSelectorPlan(unittest.TestCase):
+    def setUp(self):
+        self.backend = get_backend('html.parser')
+        self.doc = self.backend.parse(GENIUS_HTML)
+
+    def test_first_match_wins_and_is_counted(self):
+        plan = SelectorPlan(['div.lyrics', 'div[class*="Lyrics__Container"]', 'body'], self.backend)
+        self.assertEqual(plan.run(self.doc), "Lyric line")
+        stats = plan.stats()['selectors']
+        self.assertEqual((stats[0]['hits'], stats[0]['misses']), (0, 1))
+        self.assertEqual((stats[1]['hits'], stats[1]['misses']), (1, 0))
+        self.assertEqual(stats[2]['hits'] + stats[2]['misses'], 0)
+
+    def test_meta_selectors_return_content(self):
+        plan = SelectorPlan(['h1', 'meta[property="og:title"]'], self.backend)
+        self.assertTrue(plan.selectors[1].is_meta)
+        self.assertEqual(plan.run(self.doc), "OG Title")
+
+    def test_missing_selectors_are_demoted(self):
+        plan = SelectorPlan(['div.lyrics', '.song_body-lyrics', 'div[class*="Lyrics__Container"]'],
+                            self.backend, min_samples=5, reorder_every=5)
+        for _ in range(5):
+            plan.run(self.doc)
+        self.assertEqual(plan.stats()['order'],
+                         ['div[class*="Lyrics__Container"]', 'div.lyrics', '.song_body-lyrics'])
+        for _ in range(5):
+            self.assertEqual(plan.run(self.doc), "Lyric line")
+        # Demoted selectors are no longer tried once the live one hits
+        self.assertEqual(plan.selectors[0].tries, 5)
+
+    def test_demoted_selector_is_promoted_when_it_hits_again(self):
+        plan = SelectorPlan(['div.lyrics', 'div[class*="Lyrics__Container"]'],
+                            self.backend, min_samples=2, reorder_every=2)
+        plan.run(self.doc)
+        plan.run(self.doc)
+        self.assertTrue(plan.selectors[0].demoted)
+        new_markup = self.backend.parse('<div class="lyrics">New layout</div>')
+        plan.run(new_markup)
+        plan.run(new_markup)
+        self.assertFalse(plan.selectors[0].demoted)
+        self.assertEqual(plan.stats()['order'][0], 'div.lyrics')
+
+    def test_most_hit_selector_is_promoted(self):
+        plan = SelectorPlan(['div.lyrics', 'div[class*="Lyrics__Container"]'],
+                            self.backend, min_samples=5, demote_below=0.05, reorder_every=10)
+        old_markup = self.backend.parse('<div class="lyrics">Old layout</div>')
+        # The first selector hits 10% of the time, too often to be demoted
+        for i in range(10):
+            plan.run(old_markup if i == 0 else self.doc)
+        self.assertFalse(plan.selectors[0].demoted)
+        self.assertEqual(plan.stats()['order'], ['div[class*="Lyrics__Container"]', 'div.lyrics'])
+        plan.run(self.doc)
+        self.assertEqual(plan.selectors[0].tries, 10)
+
+    def test_invalid_selector_is_skipped(self):
+        plan = SelectorPlan(['div[', 'div[class*="Lyrics__Container"]'], self.backend)
+        self.assertEqual(plan.run(self.doc), "Lyric line")
+        self.assertEqual(plan.selectors[0].errors, 1)
+
+    def test_markup_change_warning(self):
+        plan = SelectorPlan(['div.lyrics'], self.backend, min_samples=3)
+        with self.assertLogs('selector_plan', level='WARNING'):
+            for _ in range(3):
+                self.assertIsNone(plan.run(self.doc))
+
+    def test_merge_plan_stats(self):
+        first = SelectorPlan(['div.lyrics', 'div[class*="Lyrics__Container"]'], self.backend)
+        second = SelectorPlan(['div.lyrics', 'div[class*="Lyrics__Container"]'], self.backend)
+        first.run(self.doc)
+        for _ in range(3):
+            second.run(self.doc)
+        merged = merge_plan_stats([{'lyrics': first.stats()}, {'lyrics': second.stats()}])
+        self.assertEqual(merged['lyrics']['runs'], 4)
+        self.assertEqual(merged['lyrics']['selectors'][0]['misses'], 4)
+        self.assertEqual(merged['lyrics']['selectors'][1]['hits'], 4)
+        self.assertEqual(merged['lyrics']['selectors'][1]['hit_rate'], 1.0)
+        # The inputs are left untouched
+        self.assertEqual(first.stats()['runs'], 1)
+
+    def test_html_parser_stats_dump(self):
+        parser = HTMLParser({
+            'SELECTORS': {
+                'default': {
+                    'title': ['h1', 'meta[property="og:title"]'],
+                    'artist': ['.artist'],
+                    'lyrics': ['div.lyrics', 'div[class*="Lyrics__Container"]']
+                }
+            }
+        })
+        parser.extract(GENIUS_HTML, "http://genius.com/song")
+        parser.extract(GENIUS_HTML, "http://other.com/song")
+        stats = parser.selector_stats()
+        self.assertEqual(set(stats), {'default:title', 'default:artist', 'default:lyrics'})
+        self.assertEqual(stats['default:lyrics']['selectors'][1]['hits'], 2)
+
+        temp_dir = tempfile.mkdtemp()
+        path = os.path.join(temp_dir, 'stats.json')
+        try:
+            self.assertTrue(parser.dump_selector_stats(path))
+            with open(path) as f:
+                self.assertEqual(json.load(f), stats)
+        finally:
+            os.remove(path)
+            os.rmdir(temp_dir)
+
+if __name__ == '__main__':
+    unittest.main()